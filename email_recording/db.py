@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import os
+import time
 import logging
+from collections import OrderedDict
+from dataclasses import dataclass
 from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
 try:
@@ -9,6 +12,11 @@ try:
 except Exception:  # library might not be installed in some environments
     psycopg = None  # type: ignore
 
+try:
+    from psycopg_pool import AsyncConnectionPool
+except Exception:  # optional: pip install "psycopg[pool]"
+    AsyncConnectionPool = None  # type: ignore
+
 
 class DB:
     def query_value(self, sql: str, params: Optional[Sequence[Any]] = None) -> Any:  # pragma: no cover - interface
@@ -23,9 +31,65 @@ class DB:
     def execute(self, sql: str, params: Optional[Sequence[Any]] = None) -> None:  # pragma: no cover
         raise NotImplementedError
 
+    def execute_many(self, statements: Iterable[Tuple[str, Optional[Sequence[Any]]]]) -> None:
+        for sql, params in statements:
+            self.execute(sql, params)
+
+
+@dataclass
+class StatementStats:
+    calls: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.calls if self.calls else 0.0
+
+
+class StatementCache:
+    """Bounded LRU of statements keyed by SQL text, with latency counters.
+
+    Sized like the connection's ``prepared_max`` so it tracks the same set of
+    statements psycopg keeps prepared server-side.
+    """
+
+    def __init__(self, max_size: int = 128):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, StatementStats]" = OrderedDict()
+
+    def record(self, sql: str, elapsed_ms: float) -> None:
+        stats = self._entries.get(sql)
+        if stats is None:
+            stats = StatementStats()
+            self._entries[sql] = stats
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        else:
+            self._entries.move_to_end(sql)
+        stats.calls += 1
+        stats.total_ms += elapsed_ms
+        if elapsed_ms > stats.max_ms:
+            stats.max_ms = elapsed_ms
+
+    def __contains__(self, sql: str) -> bool:
+        return sql in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def snapshot(self) -> Dict[str, StatementStats]:
+        return dict(self._entries)
+
 
 class DatabaseClient(DB):
-    def __init__(self, dsn: Optional[str] = None, logger: Optional[logging.Logger] = None):
+    def __init__(
+        self,
+        dsn: Optional[str] = None,
+        logger: Optional[logging.Logger] = None,
+        prepared_max: int = 128,
+        prepare: bool = True,
+    ):
         if psycopg is None:
             raise RuntimeError("psycopg is required to use DatabaseClient")
         self.dsn = dsn or os.getenv("DATABASE_URL")
@@ -34,26 +98,60 @@ class DatabaseClient(DB):
         self.logger = logger or logging.getLogger(self.__class__.__name__)
         self._conn = psycopg.connect(self.dsn)  # type: ignore
         self._conn.autocommit = True
+        # psycopg keeps an LRU of server-side prepared statements keyed by
+        # query text and DEALLOCATEs on eviction; prepare=True makes every
+        # statement eligible from its first call. prepare=False turns both
+        # that and psycopg's own auto-prepare (after prepare_threshold
+        # executions) off, as needed behind pgbouncer in transaction pooling
+        # mode.
+        self._conn.prepared_max = prepared_max
+        if not prepare:
+            self._conn.prepare_threshold = None
+        self._prepare = bool(prepare)
+        self.statements = StatementCache(max_size=prepared_max)
+
+    def _execute(self, cur, sql: str, params: Optional[Sequence[Any]]) -> None:
+        start = time.perf_counter()
+        cur.execute(sql, params or (), prepare=self._prepare)
+        self.statements.record(sql, (time.perf_counter() - start) * 1000.0)
 
     def query_value(self, sql: str, params: Optional[Sequence[Any]] = None) -> Any:
         with self._conn.cursor() as cur:
-            cur.execute(sql, params or ())
+            self._execute(cur, sql, params)
             row = cur.fetchone()
             return row[0] if row else None
 
     def query_row(self, sql: str, params: Optional[Sequence[Any]] = None) -> Optional[Tuple]:
         with self._conn.cursor() as cur:
-            cur.execute(sql, params or ())
+            self._execute(cur, sql, params)
             return cur.fetchone()
 
     def query_rows(self, sql: str, params: Optional[Sequence[Any]] = None) -> List[Tuple]:
         with self._conn.cursor() as cur:
-            cur.execute(sql, params or ())
+            self._execute(cur, sql, params)
             return cur.fetchall()
 
     def execute(self, sql: str, params: Optional[Sequence[Any]] = None) -> None:
         with self._conn.cursor() as cur:
-            cur.execute(sql, params or ())
+            self._execute(cur, sql, params)
+
+    def execute_many(self, statements: Iterable[Tuple[str, Optional[Sequence[Any]]]]) -> None:
+        """Send a batch of parameterised statements in one round-trip.
+
+        In pipeline mode results only arrive at the final sync, so the batch
+        wall time is split evenly across its statements for the counters.
+        """
+        sent: List[str] = []
+        start = time.perf_counter()
+        with self._conn.pipeline():
+            with self._conn.cursor() as cur:
+                for sql, params in statements:
+                    cur.execute(sql, params or (), prepare=self._prepare)
+                    sent.append(sql)
+        if sent:
+            per_stmt_ms = (time.perf_counter() - start) * 1000.0 / len(sent)
+            for sql in sent:
+                self.statements.record(sql, per_stmt_ms)
 
 
 class FakeDB(DB):
@@ -95,3 +193,143 @@ class FakeDB(DB):
 
     def execute(self, sql: str, params: Optional[Sequence[Any]] = None) -> None:
         self.executed.append((sql, tuple(params or ())))
+
+
+class AsyncDB:
+    """Async counterpart of DB for asyncio-based agents."""
+
+    async def query_value(self, sql: str, params: Optional[Sequence[Any]] = None) -> Any:  # pragma: no cover - interface
+        raise NotImplementedError
+
+    async def query_row(self, sql: str, params: Optional[Sequence[Any]] = None) -> Optional[Tuple]:  # pragma: no cover
+        raise NotImplementedError
+
+    async def query_rows(self, sql: str, params: Optional[Sequence[Any]] = None) -> List[Tuple]:  # pragma: no cover
+        raise NotImplementedError
+
+    async def execute(self, sql: str, params: Optional[Sequence[Any]] = None) -> None:  # pragma: no cover
+        raise NotImplementedError
+
+    async def execute_many(self, statements: Iterable[Tuple[str, Optional[Sequence[Any]]]]) -> None:
+        for sql, params in statements:
+            await self.execute(sql, params)
+
+
+class AsyncDatabaseClient(AsyncDB):
+    """Pooled async Postgres client.
+
+    Connections come from a psycopg_pool.AsyncConnectionPool, so concurrent
+    lookups from different tasks run on separate connections instead of
+    queueing behind one. Call ``open()`` (or use ``async with``) before use.
+    """
+
+    def __init__(
+        self,
+        dsn: Optional[str] = None,
+        logger: Optional[logging.Logger] = None,
+        min_size: int = 1,
+        max_size: int = 10,
+        prepared_max: int = 128,
+        prepare: bool = True,
+    ):
+        if psycopg is None or AsyncConnectionPool is None:
+            raise RuntimeError("psycopg and psycopg_pool are required to use AsyncDatabaseClient")
+        self.dsn = dsn or os.getenv("DATABASE_URL")
+        if not self.dsn:
+            raise ValueError("DATABASE_URL not set and DSN not provided")
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self._prepare = bool(prepare)  # see DatabaseClient
+        self.statements = StatementCache(max_size=prepared_max)
+
+        async def _configure(conn) -> None:
+            conn.prepared_max = prepared_max
+            if not prepare:
+                conn.prepare_threshold = None
+
+        self._pool = AsyncConnectionPool(  # type: ignore
+            self.dsn,
+            min_size=min_size,
+            max_size=max_size,
+            kwargs={"autocommit": True},
+            configure=_configure,
+            open=False,
+        )
+
+    async def open(self) -> None:
+        await self._pool.open()
+
+    async def close(self) -> None:
+        await self._pool.close()
+
+    async def __aenter__(self) -> "AsyncDatabaseClient":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    async def query_value(self, sql: str, params: Optional[Sequence[Any]] = None) -> Any:
+        row = await self.query_row(sql, params)
+        return row[0] if row else None
+
+    async def _execute(self, cur, sql: str, params: Optional[Sequence[Any]]) -> None:
+        start = time.perf_counter()
+        await cur.execute(sql, params or (), prepare=self._prepare)
+        self.statements.record(sql, (time.perf_counter() - start) * 1000.0)
+
+    async def query_row(self, sql: str, params: Optional[Sequence[Any]] = None) -> Optional[Tuple]:
+        async with self._pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await self._execute(cur, sql, params)
+                return await cur.fetchone()
+
+    async def query_rows(self, sql: str, params: Optional[Sequence[Any]] = None) -> List[Tuple]:
+        async with self._pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await self._execute(cur, sql, params)
+                return await cur.fetchall()
+
+    async def execute(self, sql: str, params: Optional[Sequence[Any]] = None) -> None:
+        async with self._pool.connection() as conn:
+            async with conn.cursor() as cur:
+                await self._execute(cur, sql, params)
+
+    async def execute_many(self, statements: Iterable[Tuple[str, Optional[Sequence[Any]]]]) -> None:
+        # Pipeline mode sends every statement before waiting for results,
+        # so a batch of writes costs one round-trip instead of one each.
+        sent: List[str] = []
+        start = time.perf_counter()
+        async with self._pool.connection() as conn:
+            async with conn.pipeline():
+                async with conn.cursor() as cur:
+                    for sql, params in statements:
+                        await cur.execute(sql, params or (), prepare=self._prepare)
+                        sent.append(sql)
+        if sent:
+            per_stmt_ms = (time.perf_counter() - start) * 1000.0 / len(sent)
+            for sql in sent:
+                self.statements.record(sql, per_stmt_ms)
+
+
+class AsyncFakeDB(AsyncDB):
+    """Async wrapper around FakeDB sharing the same handler registry."""
+
+    def __init__(self):
+        self._fake = FakeDB()
+        self.handlers = self._fake.handlers
+        self.executed = self._fake.executed
+
+    def when(self, key: str, return_value: Any) -> None:
+        self._fake.when(key, return_value)
+
+    async def query_value(self, sql: str, params: Optional[Sequence[Any]] = None) -> Any:
+        return self._fake.query_value(sql, params)
+
+    async def query_row(self, sql: str, params: Optional[Sequence[Any]] = None) -> Optional[Tuple]:
+        return self._fake.query_row(sql, params)
+
+    async def query_rows(self, sql: str, params: Optional[Sequence[Any]] = None) -> List[Tuple]:
+        return self._fake.query_rows(sql, params)
+
+    async def execute(self, sql: str, params: Optional[Sequence[Any]] = None) -> None:
+        self._fake.execute(sql, params)
@@ -1,15 +1,25 @@
 from __future__ import annotations
 
 import os
+import re
 import sys
 import json
+import hashlib
+import argparse
 import logging
-import psycopg
-from typing import Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import psycopg
+except Exception:  # library might not be installed in some environments
+    psycopg = None  # type: ignore
 
 # Environment variables
 # DATABASE_URL: postgres connection string
+# DATABASE_URLS: optional comma-separated list of DSNs for multi-database mode
 # ALLOWLIST_JSON: optional JSON list of permitted PII columns
+# LINT_CACHE_PATH: optional path of the schema fingerprint cache
 
 DEFAULT_ALLOWLIST = {
     "public.verification_requests": {"user_id", "email_normalized_hash", "ip", "device_fingerprint"},
@@ -27,6 +37,12 @@ DISALLOWED_PATTERNS = {
     "access_token",
 }
 
+# One alternation instead of a loop over every pattern per column. Longer
+# patterns first so the reported match is the most specific one.
+DISALLOWED_RE = re.compile("|".join(re.escape(p) for p in sorted(DISALLOWED_PATTERNS, key=lambda p: (-len(p), p))))
+
+DEFAULT_CACHE_PATH = ".schema_linter_cache.json"
+
 logger = logging.getLogger("schema_linter")
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
 
@@ -57,6 +73,126 @@ def fetch_schema(conn) -> List[Tuple[str, str]]:
     return [ (f"{s}.{t}", c) for (s,t,c) in rows ]
 
 
+def fetch_fingerprint(conn) -> str:
+    # Hash of every user-table column name and type; changes on any DDL that
+    # could affect the lint result, and is cheap compared to a full lint.
+    sql = """
+        SELECT md5(coalesce(string_agg(
+                   n.nspname || '.' || c.relname || '.' || a.attname || ':' || a.atttypid::text,
+                   ',' ORDER BY n.nspname, c.relname, a.attname), ''))
+        FROM pg_attribute a
+        JOIN pg_class c ON c.oid = a.attrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relkind IN ('r', 'p', 'v', 'm', 'f')
+          AND a.attnum > 0 AND NOT a.attisdropped
+          AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+          AND n.nspname NOT LIKE 'pg_toast%'
+    """
+    with conn.cursor() as cur:
+        cur.execute(sql)
+        row = cur.fetchone()
+    return row[0] if row else ""
+
+
+def check_columns(columns: Sequence[Tuple[str, str]], allowlist: Dict[str, set]) -> List[str]:
+    violations: List[str] = []
+    for table, column in columns:
+        # Disallowed pattern match
+        m = DISALLOWED_RE.search(column)
+        if m:
+            violations.append(f"Disallowed PII column detected: {table}.{column} matches pattern '{m.group(0)}'")
+
+        # Allowlist enforcement if table present
+        allowed_cols = allowlist.get(table)
+        if allowed_cols is not None and column not in allowed_cols:
+            violations.append(f"Column not in allowlist for {table}: {column}")
+    return violations
+
+
+def _dsn_id(dsn: str) -> str:
+    # Cache and report entries are keyed by a digest so credentials embedded
+    # in the DSN never land in CI artifacts.
+    return hashlib.sha256(dsn.encode()).hexdigest()[:16]
+
+
+def _rules_digest(allowlist: Dict[str, set]) -> str:
+    rules = {"patterns": sorted(DISALLOWED_PATTERNS), "allowlist": {t: sorted(c) for t, c in sorted(allowlist.items())}}
+    return hashlib.sha256(json.dumps(rules, sort_keys=True).encode()).hexdigest()
+
+
+def load_cache(path: str) -> Dict[str, Any]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as exc:
+        logger.warning("Ignoring unreadable lint cache %s: %s", path, exc)
+        return {}
+
+
+def save_cache(path: str, cache: Dict[str, Any]) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def lint_database(dsn: str, allowlist: Dict[str, set], cached: Optional[Dict[str, Any]], rules_digest: str) -> Dict[str, Any]:
+    db_id = _dsn_id(dsn)
+    try:
+        with psycopg.connect(dsn) as conn:  # type: ignore
+            fingerprint = fetch_fingerprint(conn)
+            if cached and cached.get("fingerprint") == fingerprint and cached.get("rules") == rules_digest:
+                return {"database": db_id, "fingerprint": fingerprint, "rules": rules_digest, "skipped": True, "violations": cached.get("violations", [])}
+            violations = check_columns(fetch_schema(conn), allowlist)
+            return {"database": db_id, "fingerprint": fingerprint, "rules": rules_digest, "skipped": False, "violations": violations}
+    except Exception as exc:
+        logger.error("Failed to lint database %s: %s", db_id, exc)
+        return {"database": db_id, "error": str(exc), "skipped": False, "violations": []}
+
+
+def lint_many(dsns: Sequence[str], cache_path: Optional[str] = None, workers: int = 8) -> int:
+    """Lint several databases concurrently and print one merged JSON report.
+
+    Databases whose schema fingerprint and lint rules match the cached entry
+    are not re-linted; their cached violations are carried into the report.
+    """
+    allowlist = load_allowlist()
+    rules_digest = _rules_digest(allowlist)
+    cache_path = cache_path or os.getenv("LINT_CACHE_PATH", DEFAULT_CACHE_PATH)
+    cache = load_cache(cache_path)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(dsns)))) as pool:
+        results = list(pool.map(lambda d: lint_database(d, allowlist, cache.get(_dsn_id(d)), rules_digest), dsns))
+
+    for res in results:
+        if "error" not in res:
+            cache[res["database"]] = {"fingerprint": res["fingerprint"], "rules": res["rules"], "violations": res["violations"]}
+    save_cache(cache_path, cache)
+
+    violations = [f"[{r['database']}] {v}" for r in results for v in r["violations"]]
+    errors = [r for r in results if "error" in r]
+    databases = []
+    for r in results:
+        entry = {"database": r["database"], "skipped": r["skipped"], "violation_count": len(r["violations"])}
+        if "error" in r:
+            entry["error"] = r["error"]
+        databases.append(entry)
+    report = {"violations": violations, "tables": list(allowlist.keys()), "databases": databases}
+    print(json.dumps(report, indent=2))
+
+    skipped = sum(1 for r in results if r.get("skipped"))
+    if errors:
+        logger.error("Schema linter could not lint %d of %d databases", len(errors), len(results))
+        return 2
+    if violations:
+        logger.error("Schema linter found %d violations across %d databases (%d unchanged)", len(violations), len(results), skipped)
+        return 1
+    logger.info("Schema linter passed for %d databases (%d unchanged)", len(results), skipped)
+    return 0
+
+
 def lint() -> int:
     database_url = os.getenv("DATABASE_URL")
     if not database_url:
@@ -66,23 +202,7 @@ def lint() -> int:
     allowlist = load_allowlist()
 
     with psycopg.connect(database_url) as conn:  # type: ignore
-        violations: List[str] = []
-        findings: List[str] = []
-        for table, column in fetch_schema(conn):
-            # Disallowed pattern match
-            for pat in DISALLOWED_PATTERNS:
-                if pat in column:
-                    msg = f"Disallowed PII column detected: {table}.{column} matches pattern '{pat}'"
-                    violations.append(msg)
-                    findings.append(msg)
-                    break
-
-            # Allowlist enforcement if table present
-            allowed_cols = allowlist.get(table)
-            if allowed_cols is not None and column not in allowed_cols:
-                msg = f"Column not in allowlist for {table}: {column}"
-                violations.append(msg)
-                findings.append(msg)
+        violations = check_columns(fetch_schema(conn), allowlist)
 
         # Report findings to security team (stdout/CI artifact). Integrate with Slack later.
         report = {"violations": violations, "tables": list(allowlist.keys())}
@@ -95,5 +215,18 @@ def lint() -> int:
         return 0
 
 
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Lint database schemas for PII columns")
+    parser.add_argument("dsns", nargs="*", help="DSNs to lint concurrently (default: DATABASE_URLS, else DATABASE_URL)")
+    parser.add_argument("--cache", default=None, help="Schema fingerprint cache path")
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    dsns = args.dsns or [d.strip() for d in os.getenv("DATABASE_URLS", "").split(",") if d.strip()]
+    if not dsns:
+        return lint()
+    return lint_many(dsns, cache_path=args.cache, workers=args.workers)
+
+
 if __name__ == "__main__":
-    sys.exit(lint())
+    sys.exit(main(sys.argv[1:]))
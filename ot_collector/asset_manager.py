@@ -2,21 +2,41 @@ from __future__ import annotations
 
 import ipaddress
 import logging
-from collections import defaultdict, deque
-from dataclasses import dataclass, field
+import socket
+import sys
+import threading
+from array import array
+from bisect import bisect_right
+from collections import defaultdict
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from .fastpath import ip_str, mac_str
+from .protocols import is_response, is_write
+
+# Learned state is kept compact so sites with many flows and hundreds of
+# thousands of register addresses fit in memory: flows are keyed by one
+# packed integer (source, destination, protocol), function codes are a
+# bitmask, addresses are merged ranges in int64 arrays and the polling
+# period is a constant-size streaming estimate.
 
 
-@dataclass
 class Asset:
-    asset_id: str
-    ip: Optional[str]
-    mac: Optional[str]
-    role: Optional[str]
-    first_seen: datetime
-    last_seen: datetime
-    confidence: float = 0.5
+    __slots__ = ("asset_id", "ip", "mac", "role", "first_seen", "last_seen", "confidence")
+
+    def __init__(self, asset_id: str, ip: Optional[str], mac: Optional[str], role: Optional[str],
+                 first_seen: datetime, last_seen: datetime, confidence: float = 0.5):
+        self.asset_id = asset_id
+        self.ip = ip
+        self.mac = mac
+        self.role = role
+        self.first_seen = first_seen
+        self.last_seen = last_seen
+        self.confidence = confidence
+
+    def __repr__(self) -> str:
+        return f"Asset(asset_id={self.asset_id!r}, ip={self.ip!r}, mac={self.mac!r}, role={self.role!r}, confidence={self.confidence})"
 
 
 @dataclass
@@ -26,29 +46,319 @@ class FlowKey:
     protocol: str
 
 
-@dataclass
+# Function code -> bit index; numeric codes 0-255 use their own bit, names
+# (IEC 104 U-format, "summary", ...) are assigned bits from 256 up
+_FUNC_NAMES: List[str] = [str(i) for i in range(256)]
+_FUNC_BITS: Dict[str, int] = {name: i for i, name in enumerate(_FUNC_NAMES)}
+
+
+# Guards registration in the name tables (the baseline is compiled off-thread)
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _func_bit(code: str) -> int:
+    bit = _FUNC_BITS.get(code)
+    if bit is None:
+        with _REGISTRY_LOCK:
+            bit = _FUNC_BITS.get(code)
+            if bit is None:
+                bit = _FUNC_BITS[code] = len(_FUNC_NAMES)
+                _FUNC_NAMES.append(code)
+    return bit
+
+
+class AddressRanges:
+    """Set of integer addresses stored as sorted, merged [start, end] runs."""
+
+    __slots__ = ("starts", "ends")
+
+    def __init__(self, addrs: Iterable[int] = ()):
+        self.starts = array("q")
+        self.ends = array("q")
+        self.update(addrs)
+
+    def add(self, addr: int) -> bool:
+        return self.add_range(addr, addr)
+
+    def update(self, addrs: Iterable[int]) -> None:
+        if isinstance(addrs, range) and addrs.step == 1:
+            if len(addrs):
+                self.add_range(addrs.start, addrs.stop - 1)
+            return
+        for addr in addrs:
+            self.add_range(addr, addr)
+
+    def add_range(self, lo: int, hi: int) -> bool:
+        """Add [lo, hi]; False if it was already covered."""
+        starts, ends = self.starts, self.ends
+        i = j = bisect_right(starts, lo)
+        if i and ends[i - 1] >= lo - 1:
+            if ends[i - 1] >= hi:
+                return False
+            i -= 1
+            lo = starts[i]
+        n = len(starts)
+        while j < n and starts[j] <= hi + 1:
+            hi = max(hi, ends[j])
+            j += 1
+        starts[i:j] = array("q", (lo,))
+        ends[i:j] = array("q", (hi,))
+        return True
+
+    def __contains__(self, addr: int) -> bool:
+        i = bisect_right(self.starts, addr) - 1
+        return i >= 0 and self.ends[i] >= addr
+
+    def __iter__(self) -> Iterator[int]:
+        for lo, hi in zip(self.starts, self.ends):
+            yield from range(lo, hi + 1)
+
+    def __len__(self) -> int:
+        return sum(self.ends) - sum(self.starts) + len(self.starts)
+
+    def ranges(self) -> List[Tuple[int, int]]:
+        return list(zip(self.starts, self.ends))
+
+    def memory_bytes(self) -> int:
+        return sys.getsizeof(self) + sys.getsizeof(self.starts) + sys.getsizeof(self.ends)
+
+
+class P2Quantile:
+    """Streaming quantile estimate in constant memory (the P-square algorithm).
+
+    Five markers track the minimum, the p/2, p and (1+p)/2 quantiles and
+    the maximum; each ``add`` moves at most three of them. The first five
+    samples are kept and answered exactly (upper median for p=0.5).
+    """
+
+    __slots__ = ("p", "count", "_q", "_n", "_want", "_step")
+
+    def __init__(self, p: float = 0.5):
+        self.p = p
+        self.count = 0
+        self._q: List[float] = []  # marker heights
+        self._n = [0, 1, 2, 3, 4]  # marker positions
+        self._want = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]  # desired positions
+        self._step = (0.0, p / 2, p, (1 + p) / 2, 1.0)
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        q = self._q
+        if self.count <= 5:
+            q.append(x)
+            q.sort()
+            return
+        n, want = self._n, self._want
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            want[i] += self._step[i]
+        for i in (1, 2, 3):
+            d = want[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                # Piecewise-parabolic prediction, linear if it would break ordering
+                qp = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = qp
+                n[i] += d
+
+    def value(self) -> Optional[float]:
+        if not self.count:
+            return None
+        if self.count <= 5:
+            return self._q[min(len(self._q) - 1, int(self.p * len(self._q)))]
+        return self._q[2]
+
+    def memory_bytes(self) -> int:
+        return sys.getsizeof(self) + sys.getsizeof(self._q) + sys.getsizeof(self._n) + sys.getsizeof(self._want)
+
+
+class RollingQuantile:
+    """Quantile of roughly the last ``window`` samples in constant memory.
+
+    Two P2Quantile estimators restart every ``window`` samples, half a
+    window apart, and the older one answers. The estimate therefore covers
+    between window/2 and window of the most recent samples and follows a
+    change of regime within one window.
+    """
+
+    __slots__ = ("p", "window", "count", "_a", "_b")
+
+    def __init__(self, p: float = 0.5, window: int = 1000):
+        self.p = p
+        self.window = window
+        self.count = 0
+        self._a = P2Quantile(p)
+        self._b = P2Quantile(p)  # starts half a window after _a
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        if self._a.count >= self.window:
+            self._a = P2Quantile(self.p)
+        self._a.add(x)
+        if self.count > self.window // 2:
+            if self._b.count >= self.window:
+                self._b = P2Quantile(self.p)
+            self._b.add(x)
+
+    def value(self) -> Optional[float]:
+        a, b = self._a, self._b
+        return (a if a.count >= b.count else b).value()
+
+    def memory_bytes(self) -> int:
+        return sys.getsizeof(self) + self._a.memory_bytes() + self._b.memory_bytes()
+
+
 class FlowStats:
-    function_codes: Set[str] = field(default_factory=set)
-    addresses: Set[int] = field(default_factory=set)
-    timestamps: Deque[datetime] = field(default_factory=lambda: deque(maxlen=1000))
+    __slots__ = ("func_mask", "addresses", "last_seen", "observations", "interval", "summary_period", "changed", "exported_period")
+
+    def __init__(self):
+        self.func_mask = 0  # bit per function code, see _func_bit
+        self.addresses = AddressRanges()
+        self.last_seen: Optional[datetime] = None
+        self.observations = 0
+        # Median of the last ~1000 inter-arrival times, updated per observation in O(1)
+        self.interval = RollingQuantile(window=1000)
+        # Mean polling interval reported by collector-side summaries, if any
+        self.summary_period: Optional[float] = None
+        # Export bookkeeping: codes/addresses changed, period as last exported
+        self.changed = True
+        self.exported_period: Optional[float] = None
+
+    @property
+    def function_codes(self) -> Set[str]:
+        mask, codes, bit = self.func_mask, set(), 0
+        while mask:
+            if mask & 1:
+                codes.add(_FUNC_NAMES[bit])
+            mask >>= 1
+            bit += 1
+        return codes
+
+    def has_function_code(self, func_code: str) -> bool:
+        bit = _FUNC_BITS.get(str(func_code))
+        return bit is not None and bool(self.func_mask >> bit & 1)
 
     def record(self, func_code: Optional[str], addr: Optional[int], ts: datetime) -> None:
         if func_code:
-            self.function_codes.add(str(func_code))
-        if addr is not None:
-            self.addresses.add(int(addr))
-        self.timestamps.append(ts)
+            bit = 1 << _func_bit(str(func_code))
+            if not self.func_mask & bit:
+                self.func_mask |= bit
+                self.changed = True
+        if addr is not None and self.addresses.add(int(addr)):
+            self.changed = True
+        if self.last_seen is not None:
+            delta = (ts - self.last_seen).total_seconds()
+            if delta > 0:
+                self.interval.add(delta)
+        self.last_seen = ts
+        self.observations += 1
 
     def typical_period_seconds(self) -> Optional[float]:
-        if len(self.timestamps) < 3:
+        if self.summary_period is not None:
+            # Individual timestamps are sparse once polling is summarised
+            return self.summary_period
+        if self.observations < 3:
             return None
-        deltas = [ (t2 - t1).total_seconds() for t1, t2 in zip(list(self.timestamps)[:-1], list(self.timestamps)[1:]) ]
-        deltas = [d for d in deltas if d > 0]
-        if not deltas:
+        return self.interval.value()
+
+    def needs_export(self, period_tolerance: float = 0.1) -> bool:
+        """True if codes or addresses changed, or the period drifted, since the last export."""
+        if self.changed:
+            return True
+        period = self.typical_period_seconds()
+        if period is None or self.exported_period is None:
+            return period != self.exported_period
+        return abs(period - self.exported_period) > period_tolerance * self.exported_period
+
+    def mark_exported(self) -> None:
+        self.changed = False
+        self.exported_period = self.typical_period_seconds()
+
+    def memory_bytes(self) -> int:
+        return (sys.getsizeof(self) + sys.getsizeof(self.func_mask) + self.addresses.memory_bytes() + self.interval.memory_bytes()
+                + (sys.getsizeof(self.last_seen) if self.last_seen is not None else 0))
+
+
+# Flow keys: source and destination as 49-bit integers (IPv4 address, or
+# MAC address with bit 48 set) and an 8-bit protocol index packed into one
+# int. Anything else (IPv6, unparsable ids) falls back to a string tuple.
+_MAC_FLAG = 1 << 48
+_ADDR_MASK = (1 << 49) - 1
+_PROTOCOL_NAMES: List[str] = []
+_PROTOCOL_IDS: Dict[str, int] = {}
+
+FlowId = Union[int, Tuple[str, str, str]]
+
+
+def _addr_id(addr: str) -> Optional[int]:
+    if len(addr) == 17 and addr[2] == ":":
+        try:
+            value = int(addr.replace(":", ""), 16)
+        except ValueError:
             return None
-        deltas.sort()
-        mid = len(deltas)//2
-        return deltas[mid]
+        return value | _MAC_FLAG if mac_str(value) == addr else None
+    try:
+        value = int.from_bytes(socket.inet_pton(socket.AF_INET, addr), "big")
+    except (OSError, TypeError):
+        return None
+    return value if ip_str(value) == addr else None
+
+
+def _addr_str(value: int) -> str:
+    return mac_str(value & ~_MAC_FLAG) if value & _MAC_FLAG else ip_str(value)
+
+
+def pack_flow_id(src: str, dst: str, protocol: str, cache: Dict[str, Optional[int]]) -> FlowId:
+    """Packed (src, dst, protocol) key; ``cache`` memoises address parsing."""
+    src_id = cache.get(src, -1)
+    if src_id == -1:
+        if len(cache) >= 65536:
+            cache.clear()
+        src_id = cache[src] = _addr_id(src)
+    dst_id = cache.get(dst, -1)
+    if dst_id == -1:
+        dst_id = cache[dst] = _addr_id(dst)
+    proto_id = _PROTOCOL_IDS.get(protocol)
+    if proto_id is None:
+        with _REGISTRY_LOCK:
+            proto_id = _PROTOCOL_IDS.get(protocol)
+            if proto_id is None and len(_PROTOCOL_NAMES) < 256:
+                proto_id = _PROTOCOL_IDS[protocol] = len(_PROTOCOL_NAMES)
+                _PROTOCOL_NAMES.append(protocol)
+    if src_id is None or dst_id is None or proto_id is None:
+        return (src, dst, protocol)
+    return (((src_id << 49) | dst_id) << 8) | proto_id
+
+
+def unpack_flow_id(flow_id: FlowId) -> Tuple[str, str, str]:
+    if isinstance(flow_id, tuple):
+        return flow_id
+    return _addr_str(flow_id >> 57), _addr_str((flow_id >> 8) & _ADDR_MASK), _PROTOCOL_NAMES[flow_id & 0xFF]
+
+
+def func_code_bit(func_code: str) -> Optional[int]:
+    """Bit of a function code in the masks used here, None if never seen."""
+    return _FUNC_BITS.get(func_code)
+
+
+def _inventory_row(asset: Asset) -> Tuple[str, Optional[str], Optional[str], Optional[str], datetime, datetime, float]:
+    return (asset.asset_id, asset.ip, asset.mac, asset.role, asset.first_seen, asset.last_seen, asset.confidence)
 
 
 class AssetManager:
@@ -56,8 +366,29 @@ class AssetManager:
         self.logger = logger or logging.getLogger(self.__class__.__name__)
         self.assets_by_ip: Dict[str, Asset] = {}
         self.assets_by_mac: Dict[str, Asset] = {}
-        self.flows: Dict[Tuple[str, str, str], FlowStats] = {}
+        self.assets_by_id: Dict[str, Asset] = {}
+        self.flows: Dict[FlowId, FlowStats] = {}  # see flow_id()
+        # Touched since the last changed_assets()/changed_flows() call
+        self._touched_assets: Dict[str, Asset] = {}
+        self._touched_flows: Set[FlowId] = set()
         self.overrides: Dict[str, str] = {}  # asset_id -> role override
+        self._addr_ids: Dict[str, Optional[int]] = {}
+
+    def flow_id(self, src: str, dst: str, protocol: str) -> FlowId:
+        """Packed key of a flow in ``flows``."""
+        return pack_flow_id(src, dst, protocol, self._addr_ids)
+
+    @staticmethod
+    def flow_tuple(flow_id: FlowId) -> Tuple[str, str, str]:
+        """(src, dst, protocol) of a ``flows`` key."""
+        return unpack_flow_id(flow_id)
+
+    def flow(self, src: str, dst: str, protocol: str) -> Optional[FlowStats]:
+        return self.flows.get(self.flow_id(src, dst, protocol))
+
+    def iter_flows(self) -> Iterator[Tuple[str, str, str, FlowStats]]:
+        for flow_id, stats in self.flows.items():
+            yield (*self.flow_tuple(flow_id), stats)
 
     def load_overrides(self, overrides: Dict[str, str]) -> None:
         self.overrides = overrides or {}
@@ -71,11 +402,13 @@ class AssetManager:
             asset = self.assets_by_mac[mac]
         else:
             asset = Asset(asset_id=key, ip=ip, mac=mac, role=None, first_seen=ts, last_seen=ts)
+            self.assets_by_id.setdefault(key, asset)
             if ip:
                 self.assets_by_ip[ip] = asset
             if mac:
                 self.assets_by_mac[mac] = asset
         asset.last_seen = ts
+        self._touched_assets[asset.asset_id] = asset
         return asset
 
     def _infer_role(self, src_ip: str, dst_ip: str, protocol: str, func_code: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
@@ -86,7 +419,7 @@ class AssetManager:
             # Destination likely PLC
             server_role = "plc"
             # Source likely HMI/engineering/master
-            if func_code is not None and str(func_code) in {"5", "6", "15", "16"}:
+            if is_write(protocol, func_code):
                 client_role = "engineering"
             else:
                 client_role = "hmi"
@@ -96,13 +429,20 @@ class AssetManager:
         elif protocol in {"iec104", "iec61850"}:
             server_role = "substation_device"
             client_role = "control_center"
+        elif protocol in {"goose", "sv"}:
+            # Publisher is an IED or merging unit; the destination is multicast
+            client_role = "ied"
         return client_role, server_role
 
-    def ingest(self, src_mac: Optional[str], src_ip: Optional[str], dst_mac: Optional[str], dst_ip: Optional[str], protocol: str, func_code: Optional[str], addr: Optional[int], ts: datetime) -> None:
-        if not (src_ip and dst_ip):
-            return
+    def ingest(self, src_mac: Optional[str], src_ip: Optional[str], dst_mac: Optional[str], dst_ip: Optional[str], protocol: str, func_code: Optional[str], addr: Optional[int], ts: datetime) -> Optional[datetime]:
+        """Record one frame; returns when its flow was last seen before it (None if new)."""
+        if not ((src_ip or src_mac) and (dst_ip or dst_mac)):
+            return None
         src_asset = self._get_or_create_asset(src_ip, src_mac, ts)
         dst_asset = self._get_or_create_asset(dst_ip, dst_mac, ts)
+        if is_response(func_code):
+            # The request already gave roles, codes, addresses and timing
+            return None
         client_role, server_role = self._infer_role(src_ip, dst_ip, protocol, func_code)
         # Apply overrides if present
         if src_asset.asset_id in self.overrides:
@@ -118,54 +458,100 @@ class AssetManager:
         src_asset.confidence = min(1.0, src_asset.confidence + 0.02)
         dst_asset.confidence = min(1.0, dst_asset.confidence + 0.02)
 
-        key = (src_ip, dst_ip, protocol)
+        key = self.flow_id(src_ip or src_mac, dst_ip or dst_mac, protocol)
         stats = self.flows.get(key)
         if not stats:
             stats = FlowStats()
             self.flows[key] = stats
+        previous = stats.last_seen
         stats.record(func_code, addr, ts)
+        self._touched_flows.add(key)
+        return previous
+
+    def ingest_summary(self, src_ip: str, dst_ip: str, protocol: str, func_code: str, addr_start: Optional[int],
+                       addr_end: Optional[int], last_seen: datetime, period_seconds: Optional[float]) -> None:
+        """Fold a collector flow summary into assets and flow stats."""
+        l2 = protocol in {"goose", "sv"}
+        self.ingest(src_ip if l2 else None, None if l2 else src_ip, dst_ip if l2 else None, None if l2 else dst_ip,
+                    protocol, func_code, addr_start, last_seen)
+        if is_response(func_code):
+            return
+        stats = self.flows[self.flow_id(src_ip, dst_ip, protocol)]
+        if addr_start is not None and addr_end is not None and stats.addresses.add_range(addr_start, addr_end):
+            stats.changed = True
+        if period_seconds:
+            stats.summary_period = period_seconds
 
     def export_inventory_rows(self) -> List[Tuple[str, Optional[str], Optional[str], Optional[str], datetime, datetime, float]]:
-        rows: List[Tuple[str, Optional[str], Optional[str], Optional[str], datetime, datetime, float]] = []
-        for asset in {**self.assets_by_ip, **self.assets_by_mac}.values():
-            rows.append((asset.asset_id, asset.ip, asset.mac, asset.role, asset.first_seen, asset.last_seen, asset.confidence))
-        # Deduplicate
-        dedup: Dict[str, Tuple] = {}
-        for r in rows:
-            dedup[r[0]] = r
-        return list(dedup.values())
+        return [_inventory_row(asset) for asset in self.assets_by_id.values()]
+
+    def changed_assets(self) -> List[Asset]:
+        """Assets seen or updated since the last call."""
+        assets = list(self._touched_assets.values())
+        self._touched_assets = {}
+        return assets
+
+    def changed_flows(self) -> List[Tuple[str, str, str, FlowStats]]:
+        """Flows whose function codes, addresses or period changed since the last call.
+
+        Only flows that saw traffic are examined, so the cost follows the
+        active part of the inventory. Returned flows are marked exported.
+        """
+        out: List[Tuple[str, str, str, FlowStats]] = []
+        for flow_id in self._touched_flows:
+            stats = self.flows[flow_id]
+            if stats.needs_export():
+                stats.mark_exported()
+                out.append((*self.flow_tuple(flow_id), stats))
+        self._touched_flows = set()
+        return out
+
+    def touch_all(self) -> None:
+        """Make the next changed_*() calls return the whole inventory."""
+        self._touched_assets = dict(self.assets_by_id)
+        self._touched_flows = set(self.flows)
+        for stats in self.flows.values():
+            stats.changed = True
 
     def export_baseline_rows(self) -> List[Tuple[str, str, str, List[str], List[int], Optional[float]]]:
         rows: List[Tuple[str, str, str, List[str], List[int], Optional[float]]] = []
-        for (src, dst, protocol), stats in self.flows.items():
-            rows.append((src, dst, protocol, sorted(stats.function_codes), sorted(stats.addresses), stats.typical_period_seconds()))
+        for src, dst, protocol, stats in self.iter_flows():
+            rows.append((src, dst, protocol, sorted(stats.function_codes), list(stats.addresses), stats.typical_period_seconds()))
         return rows
 
     def generate_policy_yaml(self) -> str:
         import yaml  # type: ignore
         policy: Dict[str, Any] = {"version": 1, "generated_at": datetime.now(timezone.utc).isoformat(), "flows": []}
-        for (src, dst, protocol), stats in self.flows.items():
+        for src, dst, protocol, stats in self.iter_flows():
             policy["flows"].append({
                 "src": src,
                 "dst": dst,
                 "protocol": protocol,
                 "function_codes": sorted(stats.function_codes),
-                "address_ranges": self._address_ranges(sorted(stats.addresses)),
+                "address_ranges": [{"start": lo, "end": hi} for lo, hi in stats.addresses.ranges()],
                 "typical_period": stats.typical_period_seconds(),
             })
         return yaml.dump(policy, sort_keys=False)
 
-    @staticmethod
-    def _address_ranges(addrs: List[int]) -> List[Dict[str, int]]:
-        if not addrs:
-            return []
-        ranges = []
-        start = prev = addrs[0]
-        for a in addrs[1:]:
-            if a == prev + 1:
-                prev = a
-            else:
-                ranges.append({"start": start, "end": prev})
-                start = prev = a
-        ranges.append({"start": start, "end": prev})
-        return ranges
+    def flow_memory(self) -> List[Tuple[str, str, str, int, int, int]]:
+        """Per flow: (src, dst, protocol, bytes, addresses, address ranges)."""
+        rows = []
+        for flow_id, stats in self.flows.items():
+            src, dst, protocol = self.flow_tuple(flow_id)
+            rows.append((src, dst, protocol, stats.memory_bytes() + sys.getsizeof(flow_id), len(stats.addresses), len(stats.addresses.starts)))
+        return rows
+
+    def memory_report(self, top: int = 10) -> Dict[str, Any]:
+        """Approximate bytes held for flows and assets, with the largest flows."""
+        per_flow = self.flow_memory()
+        flow_bytes = sum(row[3] for row in per_flow)
+        assets = self.assets_by_id
+        asset_bytes = sum(sys.getsizeof(a) for a in assets.values())
+        return {
+            "flows": len(per_flow),
+            "flow_bytes": flow_bytes,
+            "bytes_per_flow": flow_bytes / len(per_flow) if per_flow else 0.0,
+            "assets": len(assets),
+            "asset_bytes": asset_bytes,
+            "largest_flows": sorted(per_flow, key=lambda row: row[3], reverse=True)[:top],
+        }
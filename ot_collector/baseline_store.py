@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import ipaddress
+import json
+import logging
+import threading
+from array import array
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from email_recording.db import DB
+
+from .asset_manager import AssetManager, FlowId, _func_bit, func_code_bit, pack_flow_id
+
+# Incremental export of the learned inventory and baseline to the tables in
+# sql/asset_baseline.sql. Each flush writes only what AssetManager reports as
+# changed: assets are upserted by asset_id, changed flows are inserted into
+# baseline_learned as a new version (readers take the latest version per
+# flow). Rows from a failed flush are kept and merged into the next one.
+# Learned flows are never trusted directly: approve_learned_baseline copies
+# a reviewed learned version into baseline_allowed, and only that table is
+# read back into a CompiledBaseline for the rules.
+
+UPSERT_ASSET_SQL = (
+    "INSERT INTO asset_inventory (asset_id, ip, mac, role, first_seen, last_seen, confidence) "
+    "VALUES (%s, %s::inet, %s, %s, %s, %s, %s) "
+    "ON CONFLICT (asset_id) DO UPDATE SET ip = EXCLUDED.ip, mac = EXCLUDED.mac, role = EXCLUDED.role, "
+    "first_seen = LEAST(asset_inventory.first_seen, EXCLUDED.first_seen), "
+    "last_seen = GREATEST(asset_inventory.last_seen, EXCLUDED.last_seen), confidence = EXCLUDED.confidence"
+)
+
+INSERT_LEARNED_SQL = (
+    "INSERT INTO baseline_learned (version, src, dst, protocol, function_codes, address_ranges, typical_period_seconds) "
+    "VALUES (%s, %s::inet, %s::inet, %s, %s, %s::jsonb, %s) "
+    "ON CONFLICT (src, dst, protocol, version) DO UPDATE SET function_codes = EXCLUDED.function_codes, "
+    "address_ranges = EXCLUDED.address_ranges, typical_period_seconds = EXCLUDED.typical_period_seconds"
+)
+
+MAX_LEARNED_VERSION_SQL = "SELECT COALESCE(max(version), 0) FROM baseline_learned"
+MAX_VERSION_SQL = "SELECT COALESCE(max(version), 0) FROM baseline_allowed"
+
+# Latest learned version per flow up to a reviewed version, as one new approved version
+APPROVE_LEARNED_SQL = (
+    "INSERT INTO baseline_allowed (version, src, dst, protocol, function_codes, address_ranges, typical_period_seconds) "
+    "SELECT %s, src, dst, protocol, function_codes, address_ranges, typical_period_seconds FROM ("
+    "SELECT DISTINCT ON (src, dst, protocol) * FROM baseline_learned WHERE version <= %s "
+    "ORDER BY src, dst, protocol, version DESC) latest"
+)
+
+# Latest version per flow, paged by keyset on (src, dst, protocol)
+LATEST_BASELINE_SQL = (
+    "SELECT DISTINCT ON (src, dst, protocol) host(src), host(dst), protocol, function_codes, address_ranges, "
+    "typical_period_seconds, version FROM baseline_allowed "
+    "WHERE (src, dst, protocol) > (%s::inet, %s::inet, %s) "
+    "ORDER BY src, dst, protocol, version DESC LIMIT %s"
+)
+
+
+def _is_ip(addr: str) -> bool:
+    try:
+        ipaddress.ip_address(addr)
+    except ValueError:
+        return False
+    return True
+
+
+class BaselineWriter:
+    """Write AssetManager changes to Postgres as batched upserts.
+
+    Statements go through ``DB.execute_many`` in chunks of ``batch_size``,
+    which DatabaseClient pipelines into one round-trip per chunk with the
+    statement prepared once. Flows go to ``baseline_learned``, never to the
+    approved ``baseline_allowed``. Layer-2 flows (MAC endpoints) are not
+    written, as the tables' endpoints are ``inet``.
+    """
+
+    def __init__(self, db: DB, asset_manager: AssetManager, batch_size: int = 1000,
+                 logger: Optional[logging.Logger] = None):
+        self.db = db
+        self.asset_manager = asset_manager
+        self.batch_size = batch_size
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.version: Optional[int] = None
+        self._assets: Dict[str, Tuple] = {}
+        self._flows: Dict[Tuple[str, str, str], Tuple] = {}
+        self.counters: Dict[str, int] = {"flushes": 0, "assets": 0, "flows": 0, "skipped_l2": 0, "errors": 0}
+
+    def flush(self) -> Tuple[int, int]:
+        """Write pending changes; returns (assets, flows) written."""
+        am = self.asset_manager
+        for asset in am.changed_assets():
+            self._assets[asset.asset_id] = (asset.asset_id, asset.ip, asset.mac, asset.role,
+                                            asset.first_seen, asset.last_seen, asset.confidence)
+        for src, dst, protocol, stats in am.changed_flows():
+            if not (_is_ip(src) and _is_ip(dst)):
+                self.counters["skipped_l2"] += 1
+                continue
+            ranges = json.dumps([{"start": lo, "end": hi} for lo, hi in stats.addresses.ranges()])
+            self._flows[(src, dst, protocol)] = (sorted(stats.function_codes), ranges, stats.typical_period_seconds())
+        if not self._assets and not self._flows:
+            return 0, 0
+        try:
+            statements: List[Tuple[str, Sequence]] = [(UPSERT_ASSET_SQL, row) for row in self._assets.values()]
+            if self._flows:
+                if self.version is None:
+                    self.version = int(self.db.query_value(MAX_LEARNED_VERSION_SQL) or 0)
+                version = self.version + 1
+                statements += [(INSERT_LEARNED_SQL, (version, src, dst, protocol, funcs, ranges, period))
+                               for (src, dst, protocol), (funcs, ranges, period) in self._flows.items()]
+            for i in range(0, len(statements), self.batch_size):
+                self.db.execute_many(statements[i:i + self.batch_size])
+        except Exception:
+            self.counters["errors"] += 1
+            self.logger.exception("Baseline export failed; %d assets and %d flows kept for retry", len(self._assets), len(self._flows))
+            return 0, 0
+        written = len(self._assets), len(self._flows)
+        if self._flows:
+            self.version = version
+        self.counters["flushes"] += 1
+        self.counters["assets"] += written[0]
+        self.counters["flows"] += written[1]
+        self._assets = {}
+        self._flows = {}
+        self.logger.debug("Exported %d assets and %d flows (learned version %s)", written[0], written[1], self.version)
+        return written
+
+
+def approve_learned_baseline(db: DB, learned_version: Optional[int] = None) -> int:
+    """Publish learned flows as a new ``baseline_allowed`` version and return it.
+
+    Takes the latest learned version of every flow up to ``learned_version``
+    (default: the newest), so an operator can approve exactly what they
+    reviewed. Running BaselineReloaders pick the new version up.
+    """
+    if learned_version is None:
+        learned_version = int(db.query_value(MAX_LEARNED_VERSION_SQL) or 0)
+    version = int(db.query_value(MAX_VERSION_SQL) or 0) + 1
+    db.execute(APPROVE_LEARNED_SQL, (version, learned_version))
+    return version
+
+
+class BaselineFlow:
+    """Allowed function codes (bitmask) and address ranges of one flow."""
+
+    __slots__ = ("func_mask", "starts", "ends", "period")
+
+    def __init__(self, function_codes: Iterable[str], address_ranges: Iterable[Tuple[int, int]] = (),
+                 period: Optional[float] = None):
+        self.func_mask = 0
+        for code in function_codes:
+            self.func_mask |= 1 << _func_bit(str(code))
+        self.starts = array("q")
+        self.ends = array("q")
+        for lo, hi in sorted(address_ranges):
+            if self.ends and lo <= self.ends[-1] + 1:
+                self.ends[-1] = max(self.ends[-1], hi)
+            else:
+                self.starts.append(lo)
+                self.ends.append(hi)
+        self.period = period
+
+    def allows_function(self, func_code: str) -> bool:
+        bit = func_code_bit(func_code)
+        return bit is not None and bool(self.func_mask >> bit & 1)
+
+    def allows_address(self, addr: int) -> bool:
+        i = bisect_right(self.starts, addr) - 1
+        return i >= 0 and self.ends[i] >= addr
+
+
+def _ranges(value: Any) -> List[Tuple[int, int]]:
+    if not value:
+        return []
+    if isinstance(value, (str, bytes)):
+        value = json.loads(value)
+    return [(int(r["start"]), int(r["end"])) for r in value]
+
+
+class CompiledBaseline:
+    """Immutable baseline index keyed by packed (src, dst, protocol).
+
+    Built off to the side and published by replacing the agent's reference,
+    so rules always see one complete version without locking.
+    """
+
+    def __init__(self, flows: Optional[Dict[FlowId, BaselineFlow]] = None, version: int = 0):
+        self.flows: Dict[FlowId, BaselineFlow] = flows or {}
+        self.version = version
+        self._ids: Dict[str, Optional[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.flows)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Sequence[Any]], version: int = 0) -> "CompiledBaseline":
+        """Rows of (src, dst, protocol, function_codes[, address_ranges[, period]])."""
+        ids: Dict[str, Optional[int]] = {}
+        flows: Dict[FlowId, BaselineFlow] = {}
+        for row in rows:
+            src, dst, protocol, funcs = row[:4]
+            ranges = _ranges(row[4]) if len(row) > 4 else []
+            period = row[5] if len(row) > 5 else None
+            flows[pack_flow_id(src, dst, protocol, ids)] = BaselineFlow(funcs, ranges, period)
+        baseline = cls(flows, version)
+        baseline._ids = ids
+        return baseline
+
+    def lookup(self, src: str, dst: str, protocol: str) -> Optional[BaselineFlow]:
+        if not self.flows:
+            return None
+        return self.flows.get(pack_flow_id(src, dst, protocol, self._ids))
+
+
+def load_latest_baseline(db: DB, page_size: int = 10000) -> CompiledBaseline:
+    """Read the latest version of every flow from baseline_allowed in keyset pages."""
+    ids: Dict[str, Optional[int]] = {}
+    flows: Dict[FlowId, BaselineFlow] = {}
+    version = 0
+    last: Tuple[str, str, str] = ("0.0.0.0", "0.0.0.0", "")
+    while True:
+        rows = db.query_rows(LATEST_BASELINE_SQL, (*last, page_size))
+        for src, dst, protocol, funcs, ranges, period, row_version in rows:
+            flows[pack_flow_id(src, dst, protocol, ids)] = BaselineFlow(funcs or (), _ranges(ranges), period)
+            version = max(version, row_version)
+        if len(rows) < page_size:
+            break
+        last = tuple(rows[-1][:3])
+    baseline = CompiledBaseline(flows, version)
+    baseline._ids = ids
+    return baseline
+
+
+class BaselineReloader:
+    """Poll the approved baseline_allowed and hot-swap a newer version into an agent."""
+
+    def __init__(self, db: DB, agent: Any, interval: float = 60.0, logger: Optional[logging.Logger] = None):
+        self.db = db
+        self.agent = agent
+        self.interval = interval
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def reload(self) -> bool:
+        """Load and swap in the latest baseline if its version is newer."""
+        latest = int(self.db.query_value(MAX_VERSION_SQL) or 0)
+        if latest <= self.agent.baseline.version:
+            return False
+        baseline = load_latest_baseline(self.db)
+        self.agent.swap_baseline(baseline)
+        self.logger.info("Loaded baseline version %d (%d flows)", baseline.version, len(baseline))
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.reload()
+            except Exception:
+                self.logger.exception("Baseline reload failed")
+            self._stop.wait(self.interval)
+
+    def start(self) -> "BaselineReloader":
+        self._thread = threading.Thread(target=self._run, name="baseline-reload", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
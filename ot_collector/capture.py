@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import ctypes
+import logging
+import mmap
+import select
+import socket
+import struct
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .fastpath import L2_ETHERTYPES, OT_TCP_PORTS
+
+# Linux AF_PACKET live capture over a TPACKET_V3 memory-mapped RX ring.
+# The kernel fills whole blocks of packets and hands them over in one go;
+# userspace walks a block in place and returns it, so there is no syscall
+# or copy per packet. Constants are from <linux/if_packet.h>.
+
+ETH_P_ALL = 0x0003
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+PACKET_FANOUT = 18
+PACKET_FANOUT_HASH = 0
+PACKET_FANOUT_FLAG_DEFRAG = 0x8000
+TPACKET_V3 = 2
+SO_ATTACH_FILTER = 26
+
+# Default ring: 64 blocks of 4 MiB, locked in kernel memory per ring
+RING_BLOCK_SIZE = 1 << 22
+DEFAULT_RING_BYTES = 64 * RING_BLOCK_SIZE
+
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+
+_REQ3 = struct.Struct("IIIIIII")          # struct tpacket_req3
+_BLOCK_HDR = struct.Struct("III")         # block_status, num_pkts, offset_to_first_pkt
+_PKT_HDR = struct.Struct("IIIIIIHH")      # struct tpacket3_hdr up to tp_net
+_STATS_V3 = struct.Struct("III")          # struct tpacket_stats_v3
+_STATUS = struct.Struct("I")
+BLOCK_HDR_OFFSET = 8                      # after version, offset_to_priv
+
+# Classic BPF opcodes
+_LD_H_ABS = 0x28
+_LD_B_ABS = 0x30
+_LD_H_IND = 0x48
+_LDX_B_MSH = 0xB1
+_JEQ_K = 0x15
+_JSET_K = 0x45
+_RET_K = 0x06
+
+
+def build_port_filter(ports: Iterable[int], snaplen: int = 0x40000, ethertypes: Iterable[int] = ()) -> List[Tuple[int, int, int, int]]:
+    """Classic BPF for ``ip and tcp and (port p1 or ...)``, first fragments only.
+
+    IPv4 and frames whose EtherType is in ``ethertypes`` (GOOSE/SV are
+    usually priority tagged) are accepted untagged, behind one 802.1Q tag
+    or behind an 802.1ad/QinQ pair, with every offset shifted by the tags.
+    """
+    ports = sorted(set(ports))
+    ethertypes = sorted(set(ethertypes))
+    prog: List[Tuple[int, Optional[str], Optional[str], int]] = []
+    labels: Dict[str, int] = {}
+
+    def insn(code: int, k: int) -> None:
+        prog.append((code, None, None, k))
+
+    def jmp(code: int, k: int, jt: Optional[str], jf: Optional[str]) -> None:
+        # Targets are label names, or None to fall through
+        prog.append((code, jt, jf, k))
+
+    # One block per tag depth, each ending in its own returns so that jumps
+    # stay within the 8-bit range however many depths there are
+    for depth, off in enumerate((0, 4, 8)):
+        accept, drop, tagged = f"accept{depth}", f"drop{depth}", f"tag{depth + 1}"
+        insn(_LD_H_ABS, 12 + off)                        # ethertype
+        for et in ethertypes:
+            jmp(_JEQ_K, et, accept, None)
+        if off < 8:
+            jmp(_JEQ_K, 0x8100, tagged, None)
+            jmp(_JEQ_K, 0x88A8, tagged, None)
+        jmp(_JEQ_K, 0x0800, None, drop)
+        insn(_LD_B_ABS, 23 + off)                        # ip protocol
+        jmp(_JEQ_K, 6, None, drop)
+        insn(_LD_H_ABS, 20 + off)                        # flags/fragment offset
+        jmp(_JSET_K, 0x1FFF, drop, None)
+        insn(_LDX_B_MSH, 14 + off)                       # X = ip header length
+        for field_off in (14, 16):                       # tcp sport, dport
+            insn(_LD_H_IND, field_off + off)
+            for port in ports:
+                jmp(_JEQ_K, port, accept, None)
+        labels[drop] = len(prog)
+        insn(_RET_K, 0)
+        labels[accept] = len(prog)
+        insn(_RET_K, snaplen)
+        labels[tagged] = len(prog)
+
+    resolved: List[Tuple[int, int, int, int]] = []
+    for pc, (code, jt, jf, k) in enumerate(prog):
+        jt = 0 if jt is None else labels[jt] - pc - 1
+        jf = 0 if jf is None else labels[jf] - pc - 1
+        if not (0 <= jt <= 255 and 0 <= jf <= 255):
+            raise ValueError("too many ports for a classic BPF filter")
+        resolved.append((code, jt, jf, k))
+    return resolved
+
+
+class TPacketV3Ring:
+    """AF_PACKET socket with a TPACKET_V3 RX ring and optional kernel BPF filter.
+
+    ``packets()`` yields ``(timestamp, memoryview)`` pairs that point into the
+    ring; the view is only valid until the next item is requested.
+    Requires CAP_NET_RAW.
+    """
+
+    def __init__(
+        self,
+        interface: str,
+        block_size: int = RING_BLOCK_SIZE,
+        block_count: int = DEFAULT_RING_BYTES // RING_BLOCK_SIZE,
+        frame_size: int = 2048,
+        retire_tov_ms: int = 50,
+        bpf_ports: Optional[Iterable[int]] = tuple(OT_TCP_PORTS),
+        bpf_ethertypes: Iterable[int] = tuple(L2_ETHERTYPES),
+        stats_interval: float = 10.0,
+        fanout_group: Optional[int] = None,
+        logger: Optional[logging.Logger] = None,
+    ):
+        if block_size % mmap.PAGESIZE or block_size % frame_size:
+            raise ValueError("block_size must be a multiple of the page size and frame_size")
+        self.interface = interface
+        self.block_size = block_size
+        self.block_count = block_count
+        self.frame_size = frame_size
+        self.retire_tov_ms = retire_tov_ms
+        self.bpf_ports = tuple(bpf_ports) if bpf_ports else ()
+        self.bpf_ethertypes = tuple(bpf_ethertypes)
+        self.stats_interval = stats_interval
+        self.fanout_group = fanout_group
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.sock: Optional[socket.socket] = None
+        self._ring: Optional[mmap.mmap] = None
+        self._totals = {"packets": 0, "drops": 0, "freeze_q_cnt": 0}
+        self._last_stats = 0.0
+
+    def __enter__(self) -> "TPacketV3Ring":
+        self.open()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def open(self) -> None:
+        # Protocol 0 receives nothing until bind(), so the filter and ring are
+        # in place before the first packet arrives.
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+        try:
+            if self.bpf_ports:
+                self._attach_filter(sock, build_port_filter(self.bpf_ports, ethertypes=self.bpf_ethertypes))
+            sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+            frame_nr = (self.block_size // self.frame_size) * self.block_count
+            req = _REQ3.pack(self.block_size, self.block_count, self.frame_size, frame_nr, self.retire_tov_ms, 0, 0)
+            sock.setsockopt(SOL_PACKET, PACKET_RX_RING, req)
+            self._ring = mmap.mmap(sock.fileno(), self.block_size * self.block_count, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+            sock.bind((self.interface, ETH_P_ALL))
+            if self.fanout_group is not None:
+                # Sockets in the same group share the interface's traffic by
+                # symmetric flow hash: both directions of a flow land on the
+                # same member, so per-flow ordering holds within a worker.
+                mode = PACKET_FANOUT_HASH | PACKET_FANOUT_FLAG_DEFRAG
+                sock.setsockopt(SOL_PACKET, PACKET_FANOUT, (self.fanout_group & 0xFFFF) | (mode << 16))
+        except Exception:
+            sock.close()
+            raise
+        self.sock = sock
+        self._last_stats = time.monotonic()
+
+    @staticmethod
+    def _attach_filter(sock: socket.socket, prog: List[Tuple[int, int, int, int]]) -> None:
+        insns = b"".join(struct.pack("HBBI", *insn) for insn in prog)
+        buf = ctypes.create_string_buffer(insns, len(insns))
+        fprog = struct.pack("HP", len(prog), ctypes.addressof(buf))
+        sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+    def close(self) -> None:
+        if self._ring is not None:
+            try:
+                self._ring.close()
+            except BufferError:
+                # A caller still holds a packet view; the mapping goes away
+                # with the last reference instead.
+                pass
+            self._ring = None
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def stats(self) -> Dict[str, int]:
+        """Cumulative kernel counters; PACKET_STATISTICS resets on every read."""
+        if self.sock is not None:
+            packets, drops, freeze = _STATS_V3.unpack(self.sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, _STATS_V3.size))
+            self._totals["packets"] += packets
+            self._totals["drops"] += drops
+            self._totals["freeze_q_cnt"] += freeze
+        return dict(self._totals)
+
+    def totals(self) -> Dict[str, int]:
+        """Kernel counters as of the last ``stats()`` call, without a syscall."""
+        return dict(self._totals)
+
+    def _report_stats(self) -> None:
+        if not self.stats_interval or time.monotonic() - self._last_stats < self.stats_interval:
+            return
+        self._last_stats = time.monotonic()
+        before = self._totals["drops"]
+        totals = self.stats()
+        if totals["drops"] > before:
+            self.logger.warning("Kernel dropped %d packets on %s (total drops=%d, packets=%d)",
+                                totals["drops"] - before, self.interface, totals["drops"], totals["packets"])
+
+    def packets(self, stop: Optional[Callable[[], bool]] = None, timeout_ms: int = 500) -> Iterator[Tuple[float, memoryview]]:
+        if self.sock is None or self._ring is None:
+            raise RuntimeError("ring is not open")
+        ring = memoryview(self._ring)
+        poller = select.poll()
+        poller.register(self.sock.fileno(), select.POLLIN | select.POLLERR)
+        block = 0
+        try:
+            while not (stop and stop()):
+                base = block * self.block_size
+                status, num_pkts, first = _BLOCK_HDR.unpack_from(ring, base + BLOCK_HDR_OFFSET)
+                if not status & TP_STATUS_USER:
+                    poller.poll(timeout_ms)
+                    self._report_stats()
+                    continue
+                try:
+                    off = base + first
+                    for _ in range(num_pkts):
+                        next_off, sec, nsec, snaplen, _len, _status, mac, _net = _PKT_HDR.unpack_from(ring, off)
+                        yield sec + nsec * 1e-9, ring[off + mac:off + mac + snaplen]
+                        off += next_off
+                finally:
+                    _STATUS.pack_into(ring, base + BLOCK_HDR_OFFSET, TP_STATUS_KERNEL)
+                block = (block + 1) % self.block_count
+                self._report_stats()
+        finally:
+            ring.release()
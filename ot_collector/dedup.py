@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import zlib
+from typing import Dict, Set
+
+from .fastpath import OTPacket
+
+# Duplicate suppression for collectors fed by several SPAN sessions or TAPs,
+# where the same packet arrives two or three times within microseconds to
+# milliseconds. Keys are kept in two generations of hash sets: lookups and
+# inserts are O(1), memory is bounded by 2 * max_entries keys, and a key is
+# remembered for at least ``window`` seconds (at most two windows).
+
+
+def packet_key(pkt: OTPacket) -> int:
+    """Identity of a captured packet: flow, IP id, TCP seq and payload CRC."""
+    return hash((pkt.src, pkt.dst, pkt.sport, pkt.dport, pkt.ip_id, pkt.seq, zlib.crc32(pkt.payload)))
+
+
+class DuplicateFilter:
+    """Time-windowed set of recently seen packet keys."""
+
+    __slots__ = ("window", "max_entries", "counters", "_current", "_previous", "_rotated")
+
+    def __init__(self, window: float = 0.1, max_entries: int = 65536):
+        self.window = window
+        self.max_entries = max_entries
+        self.counters: Dict[str, int] = {"duplicates": 0, "rotations": 0}
+        self._current: Set[int] = set()
+        self._previous: Set[int] = set()
+        self._rotated = 0.0
+
+    def __len__(self) -> int:
+        return len(self._current) + len(self._previous)
+
+    def seen(self, key: int, ts: float) -> bool:
+        """Record ``key`` at capture time ``ts``; True if it is a duplicate."""
+        current = self._current
+        if ts - self._rotated >= self.window or len(current) >= self.max_entries:
+            # A full generation rotates early, shortening memory under floods;
+            # after a quiet gap of two windows both generations are stale
+            self._previous = current if ts - self._rotated < 2 * self.window else set()
+            self._current = current = set()
+            self._rotated = ts
+            self.counters["rotations"] += 1
+        if key in current or key in self._previous:
+            self.counters["duplicates"] += 1
+            return True
+        current.add(key)
+        return False
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import struct
+from typing import Iterator, Optional, Tuple, Union
+
+# Minimal BER (ASN.1) TLV reader for the IEC 61850 layer-2 PDUs. Only what
+# GOOSE and SV use: single-byte tags and short/long definite lengths. Works
+# on offsets into the captured buffer; values are never copied.
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+_F32 = struct.Struct("!f")
+_F64 = struct.Struct("!d")
+
+
+def read_tlv(buf: Buffer, off: int, end: int) -> Optional[Tuple[int, int, int]]:
+    """Return (tag, value start, value end) of the TLV at ``off``, or None if malformed."""
+    if off + 2 > end:
+        return None
+    tag = buf[off]
+    length = buf[off + 1]
+    off += 2
+    if length & 0x80:
+        size = length & 0x7F
+        if size == 0 or size > 4 or off + size > end:
+            return None  # indefinite or oversized lengths do not occur here
+        length = int.from_bytes(buf[off:off + size], "big")
+        off += size
+    if off + length > end:
+        return None
+    return tag, off, off + length
+
+
+def iter_tlv(buf: Buffer, off: int, end: int) -> Iterator[Tuple[int, int, int]]:
+    """Iterate the TLVs between ``off`` and ``end``; stops at the first malformed one."""
+    while off < end:
+        tlv = read_tlv(buf, off, end)
+        if tlv is None:
+            return
+        yield tlv
+        off = tlv[2]
+
+
+def integer(buf: Buffer, start: int, end: int, signed: bool = True) -> int:
+    return int.from_bytes(buf[start:end], "big", signed=signed)
+
+
+def visible_string(buf: Buffer, start: int, end: int) -> str:
+    return bytes(buf[start:end]).decode("ascii", "replace")
+
+
+def floating_point(buf: Buffer, start: int, end: int) -> Optional[float]:
+    # IEC 61850-8-1: one exponent-width byte, then IEEE 754 single or double
+    if end - start == 5:
+        return _F32.unpack_from(buf, start + 1)[0]
+    if end - start == 9:
+        return _F64.unpack_from(buf, start + 1)[0]
+    return None
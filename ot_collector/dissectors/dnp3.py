@@ -1,25 +1,352 @@
 from __future__ import annotations
 
+import struct
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Callable, Dict, List, Optional, Tuple
 
 from schemas import OTProtocolFrame
 
+from ..protocols import RESPONSE_SUFFIX
 
-# Minimal DNP3 application layer indicator stub
 
-def parse_dnp3(payload: bytes, src_ip: str, dst_ip: str) -> Optional[OTProtocolFrame]:
-    if len(payload) < 2:
+# DNP3 over TCP: link layer (0x05 0x64 header, CRC-16/DNP after the header
+# and after every 16-byte data block), transport segments (FIR/FIN/seq) and
+# the application layer (function code + object headers).
+
+DNP3_PORT = 20000
+
+LINK_START = b"\x05\x64"
+LINK_HLEN = 10  # start(2) len(1) ctrl(1) dst(2) src(2) crc(2)
+BLOCK = 16
+
+DIR_MASTER = 0x80
+PRM = 0x40
+LINK_CONFIRMED_USER_DATA = 3
+LINK_UNCONFIRMED_USER_DATA = 4
+
+TRANSPORT_FIN = 0x80
+TRANSPORT_FIR = 0x40
+
+RESPONSE = 129
+UNSOLICITED_RESPONSE = 130
+AUTH_RESPONSE = 131
+RESPONSE_CODES = frozenset({RESPONSE, UNSOLICITED_RESPONSE, AUTH_RESPONSE})
+
+
+def _crc_table() -> Tuple[int, ...]:
+    # CRC-16/DNP: polynomial 0x3D65, reflected (0xA6BC), init 0, xorout 0xFFFF
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA6BC if crc & 1 else crc >> 1
+        table.append(crc)
+    return tuple(table)
+
+
+CRC_TABLE = _crc_table()
+
+
+def crc16_dnp(data, start: int = 0, end: Optional[int] = None) -> int:
+    table = CRC_TABLE
+    crc = 0
+    for b in data[start:end]:
+        crc = (crc >> 8) ^ table[(crc ^ b) & 0xFF]
+    return crc ^ 0xFFFF
+
+
+_LINK = struct.Struct("<BBBBHH")   # start, start, len, ctrl, dst, src
+_CRC = struct.Struct("<H")
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_RANGE = {0: _U8, 1: _U16, 2: _U32}
+_COUNT = {7: _U8, 8: _U16, 9: _U32}
+_PREFIX = {1: _U8, 2: _U16, 3: _U32}
+
+
+def _flagged(fmt: str) -> Tuple[int, Callable]:
+    # flags byte followed by the value
+    s = struct.Struct("<B" + fmt)
+    return s.size, lambda buf, off: s.unpack_from(buf, off)[1]
+
+
+def _plain(fmt: str) -> Tuple[int, Callable]:
+    s = struct.Struct("<" + fmt)
+    return s.size, lambda buf, off: s.unpack_from(buf, off)[0]
+
+
+def _state(buf, off: int) -> int:
+    return (buf[off] >> 7) & 1
+
+
+# (group, variation) -> (object size, value decoder) for the point types we
+# baseline: binary/analog inputs and outputs, counters and CROBs.
+OBJECTS: Dict[Tuple[int, int], Tuple[int, Callable]] = {
+    (1, 2): (1, _state),
+    (10, 2): (1, _state),
+    (12, 1): (11, lambda buf, off: buf[off]),  # CROB: control code
+    (20, 1): _flagged("I"),
+    (20, 2): _flagged("H"),
+    (20, 5): _plain("I"),
+    (20, 6): _plain("H"),
+    (30, 1): _flagged("i"),
+    (30, 2): _flagged("h"),
+    (30, 3): _plain("i"),
+    (30, 4): _plain("h"),
+    (30, 5): _flagged("f"),
+    (30, 6): _flagged("d"),
+    (40, 1): _flagged("i"),
+    (40, 2): _flagged("h"),
+    (40, 3): _flagged("f"),
+    (40, 4): _flagged("d"),
+    (41, 1): (5, lambda buf, off: struct.unpack_from("<i", buf, off)[0]),
+    (41, 2): (3, lambda buf, off: struct.unpack_from("<h", buf, off)[0]),
+    (41, 3): (5, lambda buf, off: struct.unpack_from("<f", buf, off)[0]),
+    (41, 4): (9, lambda buf, off: struct.unpack_from("<d", buf, off)[0]),
+}
+# Packed one bit per point
+PACKED_BITS = frozenset({(1, 1), (10, 1), (80, 1)})
+# Fixed-size objects that are skipped rather than reported
+SKIP_SIZES: Dict[Tuple[int, int], int] = {(50, 1): 6, (51, 1): 6, (51, 2): 6, (52, 1): 2, (52, 2): 2}
+
+
+def link_user_data(frame, verify_crc: bool = True) -> Optional[Tuple[int, int, int, bytearray]]:
+    """Validate one link frame and return (ctrl, dst, src, user data without CRCs).
+
+    Returns None if the start bytes, length or any CRC is wrong.
+    """
+    n = len(frame)
+    if n < LINK_HLEN:
+        return None
+    start1, start2, length, ctrl, dst, src = _LINK.unpack_from(frame, 0)
+    if start1 != 0x05 or start2 != 0x64 or length < 5:
+        return None
+    data_len = length - 5
+    if n < LINK_HLEN + data_len + 2 * ((data_len + BLOCK - 1) // BLOCK):
+        return None
+    if verify_crc and crc16_dnp(frame, 0, 8) != _CRC.unpack_from(frame, 8)[0]:
+        return None
+    data = bytearray()
+    off = LINK_HLEN
+    while data_len > 0:
+        size = min(BLOCK, data_len)
+        if verify_crc and crc16_dnp(frame, off, off + size) != _CRC.unpack_from(frame, off + size)[0]:
+            return None
+        data += frame[off:off + size]
+        off += size + 2
+        data_len -= size
+    return ctrl, dst, src, data
+
+
+def link_frame(dst: int, src: int, user_data: bytes, from_master: bool = True) -> bytes:
+    """Encode unconfirmed user data as a link frame (for tests and benchmarks)."""
+    ctrl = (DIR_MASTER if from_master else 0) | PRM | LINK_UNCONFIRMED_USER_DATA
+    header = _LINK.pack(0x05, 0x64, 5 + len(user_data), ctrl, dst, src)
+    out = bytearray(header + _CRC.pack(crc16_dnp(header)))
+    for off in range(0, len(user_data), BLOCK):
+        block = user_data[off:off + BLOCK]
+        out += block + _CRC.pack(crc16_dnp(block))
+    return bytes(out)
+
+
+def decode_objects(app, off: int) -> Tuple[List[Tuple[int, int, int, Optional[str]]], bool]:
+    """Walk object headers from ``off``.
+
+    Returns ([(group, variation, index, value)], complete). Headers without
+    objects (variation 0, "all" qualifier) give one entry with index -1.
+    ``complete`` is False if parsing stopped at an object we cannot size.
+    """
+    points: List[Tuple[int, int, int, Optional[str]]] = []
+    n = len(app)
+    while off + 3 <= n:
+        group, variation, qualifier = app[off], app[off + 1], app[off + 2]
+        off += 3
+        prefix_code, range_code = (qualifier >> 4) & 7, qualifier & 0x0F
+        if range_code in _RANGE:
+            rs = _RANGE[range_code]
+            if off + 2 * rs.size > n:
+                return points, False
+            first, last = rs.unpack_from(app, off)[0], rs.unpack_from(app, off + rs.size)[0]
+            off += 2 * rs.size
+            if last < first:
+                return points, False
+            count = last - first + 1
+        elif range_code in _COUNT:
+            cs = _COUNT[range_code]
+            if off + cs.size > n:
+                return points, False
+            first, count = 0, cs.unpack_from(app, off)[0]
+            off += cs.size
+        elif range_code == 6:
+            points.append((group, variation, -1, None))
+            continue
+        else:
+            return points, False
+
+        key = (group, variation)
+        if variation == 0:
+            points.append((group, variation, -1, None))
+            continue
+        if key in PACKED_BITS and prefix_code == 0:
+            size = (count + 7) >> 3
+            if off + size > n:
+                return points, False
+            if group != 80:
+                for i in range(count):
+                    points.append((group, variation, first + i, "1" if app[off + (i >> 3)] >> (i & 7) & 1 else "0"))
+            off += size
+            continue
+
+        spec = OBJECTS.get(key)
+        size = spec[0] if spec else SKIP_SIZES.get(key)
+        if size is None:
+            return points, False
+        ps = _PREFIX.get(prefix_code)
+        if prefix_code and ps is None:
+            return points, False
+        step = size + (ps.size if ps else 0)
+        if off + step * count > n:
+            return points, False
+        for i in range(count):
+            if ps is not None:
+                index = ps.unpack_from(app, off)[0]
+                off += ps.size
+            else:
+                index = first + i
+            if spec is not None:
+                points.append((group, variation, index, str(spec[1](app, off))))
+            off += size
+    return points, off >= n
+
+
+class _Segments:
+    __slots__ = ("seq", "data")
+
+    def __init__(self, seq: int, data: bytearray):
+        self.seq = seq
+        self.data = data
+
+
+class Dnp3Dissector:
+    """Link/transport/application DNP3 decoder.
+
+    Each call takes one link frame (the stream reassembler cuts them on the
+    link length). Transport segments are joined per (src, dst, link src,
+    link dst) until FIN; sessions are bounded by ``max_sessions`` and
+    fragments by ``max_fragment`` bytes. Frames are oriented master ->
+    outstation using the link DIR bit. Requests give one frame per decoded
+    point, or one per fragment when they carry no point values. Responses
+    (solicited or unsolicited) use the function code plus
+    ``protocols.RESPONSE_SUFFIX`` and give one frame per fragment; with
+    ``point_values`` they give one such frame per point instead.
+    """
+
+    def __init__(self, max_fragment: int = 4096, max_sessions: int = 16384, verify_crc: bool = True,
+                 point_values: bool = False):
+        self.max_fragment = max_fragment
+        self.point_values = point_values
+        self.max_sessions = max_sessions
+        self.verify_crc = verify_crc
+        self._segments: Dict[Tuple[str, str, int, int], _Segments] = {}
+        self.counters: Dict[str, int] = {
+            "link_frames": 0,
+            "crc_errors": 0,
+            "fragments": 0,
+            "segments_dropped": 0,
+            "truncated_objects": 0,
+        }
+
+    def dissect(self, adu, src_ip: str, dst_ip: str, sport: int, dport: int, ts: float) -> List[OTProtocolFrame]:
+        frames: List[OTProtocolFrame] = []
+        view = memoryview(adu)
+        off, n = 0, len(view)
+        # Normally exactly one link frame; the unreassembled path may pass several
+        while n - off >= LINK_HLEN:
+            length = view[off + 2]
+            data_len = max(length - 5, 0)
+            end = off + LINK_HLEN + data_len + 2 * ((data_len + BLOCK - 1) // BLOCK)
+            self._link(view[off:end], src_ip, dst_ip, ts, frames)
+            off = end
+        return frames
+
+    def _link(self, frame, src_ip: str, dst_ip: str, ts: float, frames: List[OTProtocolFrame]) -> None:
+        self.counters["link_frames"] += 1
+        decoded = link_user_data(frame, self.verify_crc)
+        if decoded is None:
+            self.counters["crc_errors"] += 1
+            return
+        ctrl, dst, src, data = decoded
+        if not data or not ctrl & PRM or ctrl & 0x0F not in (LINK_CONFIRMED_USER_DATA, LINK_UNCONFIRMED_USER_DATA):
+            return
+        th = data[0]
+        key = (src_ip, dst_ip, src, dst)
+        segments = self._segments
+        if th & TRANSPORT_FIR:
+            state = segments.pop(key, None)
+            if state is not None:
+                self.counters["segments_dropped"] += 1
+            if th & TRANSPORT_FIN:
+                self._application(data, 1, ctrl, src_ip, dst_ip, ts, frames)
+                return
+            segments[key] = _Segments(th & 0x3F, data[1:])
+            if len(segments) > self.max_sessions:
+                del segments[next(iter(segments))]
+            return
+        state = segments.get(key)
+        if state is None or (th & 0x3F) != (state.seq + 1) & 0x3F or len(state.data) + len(data) - 1 > self.max_fragment:
+            if state is not None:
+                del segments[key]
+            self.counters["segments_dropped"] += 1
+            return
+        state.seq = th & 0x3F
+        state.data += memoryview(data)[1:]
+        if th & TRANSPORT_FIN:
+            del segments[key]
+            self._application(state.data, 0, ctrl, src_ip, dst_ip, ts, frames)
+
+    def _application(self, app, off: int, ctrl: int, src_ip: str, dst_ip: str, ts: float, frames: List[OTProtocolFrame]) -> None:
+        if len(app) < off + 2:
+            return
+        self.counters["fragments"] += 1
+        func = app[off + 1]
+        obj_off = off + (4 if func in RESPONSE_CODES else 2)
+        points, complete = decode_objects(app, obj_off)
+        if not complete:
+            self.counters["truncated_objects"] += 1
+        master, outstation = (src_ip, dst_ip) if ctrl & DIR_MASTER else (dst_ip, src_ip)
+        session = f"{master}->{outstation}"
+        when = datetime.fromtimestamp(ts, timezone.utc)
+        response = func in RESPONSE_CODES
+        fc = f"{func}{RESPONSE_SUFFIX}" if response else str(func)
+        if response and not self.point_values:
+            frames.append(OTProtocolFrame.trusted("dnp3", master, outstation, fc, None, None, session, when))
+            return
+        emitted = False
+        for _group, _variation, index, value in points:
+            if value is not None:
+                frames.append(OTProtocolFrame.trusted("dnp3", master, outstation, fc, index, value, session, when))
+                emitted = True
+        if not emitted:
+            frames.append(OTProtocolFrame.trusted("dnp3", master, outstation, fc, None, None, session, when))
+
+
+def parse_dnp3(payload: bytes, src_ip: str, dst_ip: str, ts: Optional[float] = None) -> Optional[OTProtocolFrame]:
+    """Stateless decode of a single-segment fragment: function code only."""
+    decoded = link_user_data(payload)
+    if decoded is None:
+        return None
+    ctrl, _dst, _src, data = decoded
+    if len(data) < 3 or data[0] & (TRANSPORT_FIR | TRANSPORT_FIN) != TRANSPORT_FIR | TRANSPORT_FIN:
         return None
-    func_code = payload[1]  # not accurate; placeholder for demo
-    ts = datetime.now(timezone.utc)
+    master, outstation = (src_ip, dst_ip) if ctrl & DIR_MASTER else (dst_ip, src_ip)
     return OTProtocolFrame(
         protocol="dnp3",
-        src_ip=src_ip,
-        dst_ip=dst_ip,
-        func_code=str(func_code),
+        src_ip=master,
+        dst_ip=outstation,
+        func_code=f"{data[2]}{RESPONSE_SUFFIX}" if data[2] in RESPONSE_CODES else str(data[2]),
         addr=None,
         value=None,
-        session_id=f"{src_ip}->{dst_ip}",
-        timestamp=ts,
+        session_id=f"{master}->{outstation}",
+        timestamp=datetime.fromtimestamp(ts, timezone.utc) if ts is not None else datetime.now(timezone.utc),
     )
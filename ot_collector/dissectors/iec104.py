@@ -1,25 +1,291 @@
 from __future__ import annotations
 
+import struct
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
 from schemas import OTProtocolFrame
 
+from ..protocols import RESPONSE_SUFFIX
 
-# Very simplified IEC 60870-5-104 function code placeholder
 
-def parse_iec104(payload: bytes, src_ip: str, dst_ip: str) -> Optional[OTProtocolFrame]:
-    if len(payload) < 1:
+# IEC 60870-5-104: APCI (start 0x68, length, four control octets) with an
+# I-, S- or U-format control field; I-format APDUs carry an ASDU (type id,
+# variable structure qualifier, cause of transmission, common address,
+# information objects).
+
+IEC104_PORT = 2404
+APCI_LEN = 6
+ASDU_HLEN = 6  # type, vsq, cot (2), common address (2)
+
+U_FUNCTIONS = {
+    0x07: "STARTDT_ACT",
+    0x0B: "STARTDT_CON",
+    0x13: "STOPDT_ACT",
+    0x23: "STOPDT_CON",
+    0x43: "TESTFR_ACT",
+    0x83: "TESTFR_CON",
+}
+
+COT_ACTIVATION = 6
+
+_CTRL = struct.Struct("<HH")
+_ASDU = struct.Struct("<BBBBH")  # type, vsq, cot, originator, common address
+_IOA = struct.Struct("<HB")      # 3-byte little-endian address
+_I16 = struct.Struct("<h")
+_U32 = struct.Struct("<I")
+_I32 = struct.Struct("<i")
+_F32 = struct.Struct("<f")
+
+
+def _bits(mask: int) -> Callable:
+    return lambda buf, off: buf[off] & mask
+
+
+def _step(buf, off: int) -> int:
+    # VTI: 7-bit two's complement step position
+    v = buf[off] & 0x7F
+    return v - 0x80 if v & 0x40 else v
+
+
+def _normalized(buf, off: int) -> float:
+    return round(_I16.unpack_from(buf, off)[0] / 32768.0, 6)
+
+
+def _scaled(buf, off: int) -> int:
+    return _I16.unpack_from(buf, off)[0]
+
+
+def _bitstring(buf, off: int) -> int:
+    return _U32.unpack_from(buf, off)[0]
+
+
+def _counter(buf, off: int) -> int:
+    return _I32.unpack_from(buf, off)[0]
+
+
+def _short_float(buf, off: int) -> float:
+    return _F32.unpack_from(buf, off)[0]
+
+
+def _none(buf, off: int) -> None:
+    return None
+
+
+# type id -> (element size without IOA, value decoder)
+TYPES: Dict[int, Tuple[int, Callable]] = {
+    1: (1, _bits(0x01)),        # M_SP_NA_1 single point
+    3: (1, _bits(0x03)),        # M_DP_NA_1 double point
+    5: (2, _step),              # M_ST_NA_1 step position
+    7: (5, _bitstring),         # M_BO_NA_1 bitstring 32
+    9: (3, _normalized),        # M_ME_NA_1 measured, normalized
+    11: (3, _scaled),           # M_ME_NB_1 measured, scaled
+    13: (5, _short_float),      # M_ME_NC_1 measured, short float
+    15: (5, _counter),          # M_IT_NA_1 integrated totals
+    21: (2, _normalized),       # M_ME_ND_1 normalized without quality
+    30: (8, _bits(0x01)),       # time-tagged (CP56Time2a) variants
+    31: (8, _bits(0x03)),
+    32: (9, _step),
+    33: (12, _bitstring),
+    34: (10, _normalized),
+    35: (10, _scaled),
+    36: (12, _short_float),
+    37: (12, _counter),
+    45: (1, _bits(0x01)),       # C_SC_NA_1 single command
+    46: (1, _bits(0x03)),       # C_DC_NA_1 double command
+    47: (1, _bits(0x03)),       # C_RC_NA_1 regulating step
+    48: (3, _normalized),       # C_SE_NA_1 setpoint, normalized
+    49: (3, _scaled),           # C_SE_NB_1 setpoint, scaled
+    50: (5, _short_float),      # C_SE_NC_1 setpoint, short float
+    51: (4, _bitstring),        # C_BO_NA_1 bitstring 32
+    58: (8, _bits(0x01)),       # commands with time tag
+    59: (8, _bits(0x03)),
+    60: (8, _bits(0x03)),
+    61: (10, _normalized),
+    62: (10, _scaled),
+    63: (12, _short_float),
+    64: (11, _bitstring),
+    70: (1, _none),             # M_EI_NA_1 end of initialization
+    100: (1, _none),            # C_IC_NA_1 interrogation
+    101: (1, _none),            # C_CI_NA_1 counter interrogation
+    102: (0, _none),            # C_RD_NA_1 read
+    103: (7, _none),            # C_CS_NA_1 clock sync
+    104: (2, _none),            # C_TS_NA_1 test
+    105: (1, _none),            # C_RP_NA_1 reset process
+    107: (9, _none),            # C_TS_TA_1 test with time tag
+}
+
+COMMAND_TYPES = frozenset(t for t in TYPES if t >= 45)
+
+
+def iter_objects(apdu, type_id: int, vsq: int) -> Iterator[Tuple[int, Optional[object]]]:
+    """Yield (information object address, value) for each element of an ASDU.
+
+    ``apdu`` is the whole APDU; objects start after the ASDU header. Stops
+    quietly at a truncated element or an unknown type id.
+    """
+    spec = TYPES.get(type_id)
+    if spec is None:
+        return
+    size, decode = spec
+    count = vsq & 0x7F
+    off = APCI_LEN + ASDU_HLEN
+    end = len(apdu)
+    if vsq & 0x80:
+        # SQ=1: one address, then consecutive elements
+        if off + 3 + size * count > end:
+            return
+        lo, hi = _IOA.unpack_from(apdu, off)
+        ioa = lo | (hi << 16)
+        off += 3
+        for i in range(count):
+            yield ioa + i, decode(apdu, off)
+            off += size
+        return
+    step = 3 + size
+    for _ in range(count):
+        if off + step > end:
+            return
+        lo, hi = _IOA.unpack_from(apdu, off)
+        yield lo | (hi << 16), decode(apdu, off + 3)
+        off += step
+
+
+class _Session:
+    __slots__ = ("next_send", "acked")
+
+    def __init__(self):
+        self.next_send = 0
+        self.acked = 0
+
+
+class Iec104Dissector:
+    """Stateful IEC 104 decoder with per-direction sequence tracking.
+
+    Frames are oriented controlling station (TCP client) -> controlled
+    station. I-format APDUs from the controlling station give one frame per
+    information object with the type id as ``func_code`` and the IOA as
+    ``addr``. Monitor-direction ASDUs (measurements, interrogation replies)
+    use the type id plus ``protocols.RESPONSE_SUFFIX`` and give one frame
+    per ASDU, or one per object with ``object_values``; command
+    confirmations are dropped so they do not count as a second write.
+    U-format APDUs give one frame named after the function (STARTDT_ACT,
+    TESTFR_CON, ...). S-format APDUs only update sequence state.
+    Send-sequence gaps are counted per direction.
+    """
+
+    def __init__(self, max_sessions: int = 16384, object_values: bool = False):
+        self.max_sessions = max_sessions
+        self.object_values = object_values
+        self._sessions: Dict[Tuple[str, int, str, int], _Session] = {}
+        self.counters: Dict[str, int] = {
+            "i_frames": 0,
+            "s_frames": 0,
+            "u_frames": 0,
+            "sequence_errors": 0,
+            "unknown_types": 0,
+            "malformed": 0,
+        }
+
+    def _session(self, key: Tuple[str, int, str, int]) -> _Session:
+        sessions = self._sessions
+        session = sessions.get(key)
+        if session is None:
+            if len(sessions) >= self.max_sessions:
+                del sessions[next(iter(sessions))]
+            session = sessions[key] = _Session()
+        return session
+
+    def dissect(self, adu, src_ip: str, dst_ip: str, sport: int, dport: int, ts: float) -> List[OTProtocolFrame]:
+        frames: List[OTProtocolFrame] = []
+        view = memoryview(adu)
+        off, n = 0, len(view)
+        # Normally one APDU; the unreassembled path may pass several
+        while n - off >= APCI_LEN and view[off] == 0x68:
+            end = off + 2 + view[off + 1]
+            if end > n:
+                self.counters["malformed"] += 1
+                break
+            self._apdu(view[off:end], src_ip, dst_ip, sport, dport, ts, frames)
+            off = end
+        return frames
+
+    def _apdu(self, apdu, src_ip: str, dst_ip: str, sport: int, dport: int, ts: float, frames: List[OTProtocolFrame]) -> None:
+        c12, c34 = _CTRL.unpack_from(apdu, 2)
+        from_client = dport == IEC104_PORT
+        client, server = (src_ip, dst_ip) if from_client else (dst_ip, src_ip)
+        session = self._session((src_ip, sport, dst_ip, dport))
+        if c12 & 0x01 == 0:
+            self.counters["i_frames"] += 1
+            send_seq = c12 >> 1
+            if send_seq != session.next_send:
+                self.counters["sequence_errors"] += 1
+            session.next_send = (send_seq + 1) & 0x7FFF
+            session.acked = c34 >> 1
+            self._asdu(apdu, from_client, client, server, ts, frames)
+        elif c12 & 0x03 == 0x01:
+            self.counters["s_frames"] += 1
+            session.acked = c34 >> 1
+        else:
+            self.counters["u_frames"] += 1
+            name = U_FUNCTIONS.get(c12 & 0xFF)
+            if name is None:
+                self.counters["malformed"] += 1
+                return
+            if name == "STARTDT_ACT":
+                # New data transfer: both directions restart at 0
+                session.next_send = 0
+                self._session((dst_ip, dport, src_ip, sport)).next_send = 0
+            frames.append(OTProtocolFrame.trusted("iec104", client, server, name, None, None, f"{client}->{server}",
+                                                  datetime.fromtimestamp(ts, timezone.utc)))
+
+    def _asdu(self, apdu, from_client: bool, client: str, server: str, ts: float, frames: List[OTProtocolFrame]) -> None:
+        if len(apdu) < APCI_LEN + ASDU_HLEN:
+            self.counters["malformed"] += 1
+            return
+        type_id, vsq, cot, _originator, _common_address = _ASDU.unpack_from(apdu, APCI_LEN)
+        if type_id not in TYPES:
+            self.counters["unknown_types"] += 1
+        elif type_id in COMMAND_TYPES and not (from_client and cot & 0x3F == COT_ACTIVATION):
+            return
+        session = f"{client}->{server}"
+        when = datetime.fromtimestamp(ts, timezone.utc)
+        if not from_client:
+            fc = f"{type_id}{RESPONSE_SUFFIX}"
+            if not self.object_values:
+                frames.append(OTProtocolFrame.trusted("iec104", client, server, fc, None, None, session, when))
+                return
+        else:
+            fc = str(type_id)
+        emitted = False
+        for ioa, value in iter_objects(apdu, type_id, vsq):
+            frames.append(OTProtocolFrame.trusted("iec104", client, server, fc, ioa, None if value is None else str(value), session, when))
+            emitted = True
+        if not emitted:
+            frames.append(OTProtocolFrame.trusted("iec104", client, server, fc, None, None, session, when))
+
+
+def parse_iec104(payload: bytes, src_ip: str, dst_ip: str, ts: Optional[float] = None) -> Optional[OTProtocolFrame]:
+    """Stateless decode of the first APDU: type id for I-format, function name for U-format."""
+    if len(payload) < APCI_LEN or payload[0] != 0x68:
+        return None
+    c1 = payload[2]
+    if c1 & 0x01 == 0:
+        if len(payload) < APCI_LEN + 1:
+            return None
+        func_code = str(payload[APCI_LEN])
+    elif c1 & 0x03 == 0x03 and c1 in U_FUNCTIONS:
+        func_code = U_FUNCTIONS[c1]
+    else:
         return None
-    func_code = payload[0]
-    ts = datetime.now(timezone.utc)
+    when = datetime.fromtimestamp(ts, timezone.utc) if ts is not None else datetime.now(timezone.utc)
     return OTProtocolFrame(
         protocol="iec104",
         src_ip=src_ip,
         dst_ip=dst_ip,
-        func_code=str(func_code),
+        func_code=func_code,
         addr=None,
         value=None,
         session_id=f"{src_ip}->{dst_ip}",
-        timestamp=ts,
+        timestamp=when,
     )
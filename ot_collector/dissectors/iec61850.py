@@ -1,19 +1,22 @@
 from __future__ import annotations
 
+import struct
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 from schemas import OTProtocolFrame
 
+from .ber import floating_point, integer, iter_tlv, read_tlv, visible_string
 
-# Very simplified IEC 61850 MMS (IEC 61850 uses MMS over TCP/102; GOOSE is L2 and not parsed here)
 
-def parse_iec61850(payload: bytes, src_ip: str, dst_ip: str) -> Optional[OTProtocolFrame]:
+# Very simplified IEC 61850 MMS over TCP/102
+
+def parse_iec61850(payload: bytes, src_ip: str, dst_ip: str, ts: Optional[float] = None) -> Optional[OTProtocolFrame]:
     if len(payload) < 1:
         return None
     # Heuristic: treat as MMS application PDU
     func = "mms"
-    ts = datetime.now(timezone.utc)
+    when = datetime.fromtimestamp(ts, timezone.utc) if ts is not None else datetime.now(timezone.utc)
     return OTProtocolFrame(
         protocol="iec61850",
         src_ip=src_ip,
@@ -22,5 +25,220 @@ def parse_iec61850(payload: bytes, src_ip: str, dst_ip: str) -> Optional[OTProto
         addr=None,
         value=None,
         session_id=f"{src_ip}->{dst_ip}",
-        timestamp=ts,
+        timestamp=when,
     )
+
+
+# Layer-2 GOOSE (EtherType 0x88B8) and Sampled Values (0x88BA). Both start
+# with APPID, length and two reserved words, followed by a BER-encoded PDU.
+
+L2_HLEN = 8
+GOOSE_PDU = 0x61
+SV_PDU = 0x60
+
+_L2_HEADER = struct.Struct("!HH")
+
+
+def _l2_pdu(adu, tag: int) -> Optional[Tuple[int, int, int]]:
+    """Return (appid, pdu value start, pdu value end), trimming Ethernet padding."""
+    if len(adu) < L2_HLEN + 2:
+        return None
+    appid, length = _L2_HEADER.unpack_from(adu, 0)
+    end = min(len(adu), length) if length >= L2_HLEN else len(adu)
+    tlv = read_tlv(adu, L2_HLEN, end)
+    if tlv is None or tlv[0] != tag:
+        return None
+    return appid, tlv[1], tlv[2]
+
+
+def render_data(buf, start: int, end: int) -> str:
+    """Compact text form of a GOOSE allData sequence, e.g. ``1,0,{12.5,3}``."""
+    out: List[str] = []
+    for tag, vs, ve in iter_tlv(buf, start, end):
+        if tag == 0x83:
+            out.append("1" if ve > vs and buf[vs] else "0")
+        elif tag in (0x85, 0x86):
+            out.append(str(integer(buf, vs, ve, signed=tag == 0x85)))
+        elif tag == 0x87:
+            value = floating_point(buf, vs, ve)
+            out.append("" if value is None else repr(value))
+        elif tag == 0x8A:
+            out.append(visible_string(buf, vs, ve))
+        elif tag in (0xA1, 0xA2):
+            out.append("{" + render_data(buf, vs, ve) + "}")
+        else:
+            out.append(bytes(buf[vs:ve]).hex())  # bit strings, octet strings, times
+    return ",".join(out)
+
+
+class _GooseState:
+    __slots__ = ("st_num", "sq_num")
+
+    def __init__(self, st_num: int, sq_num: int):
+        self.st_num = st_num
+        self.sq_num = sq_num
+
+
+class GooseDissector:
+    """GOOSE decoder with per-stream stNum/sqNum tracking.
+
+    A stream is (source MAC, APPID, gocbRef). Retransmissions of an unchanged
+    state (same stNum) only advance sqNum and are not emitted; a frame is
+    emitted when a stream is first seen or its stNum changes. Frames carry
+    MAC addresses in ``src_ip``/``dst_ip``, the APPID as ``addr``, the
+    rendered allData as ``value`` and gocbRef as ``session_id``.
+    """
+
+    def __init__(self, max_streams: int = 4096):
+        self.max_streams = max_streams
+        self._streams: Dict[Tuple[str, int, bytes], _GooseState] = {}
+        self.counters: Dict[str, int] = {
+            "messages": 0,
+            "state_changes": 0,
+            "st_gaps": 0,
+            "sq_errors": 0,
+            "simulated": 0,
+            "malformed": 0,
+        }
+
+    def dissect(self, adu, src: str, dst: str, sport: int, dport: int, ts: float) -> List[OTProtocolFrame]:
+        pdu = _l2_pdu(adu, GOOSE_PDU)
+        if pdu is None:
+            self.counters["malformed"] += 1
+            return []
+        appid, start, end = pdu
+        self.counters["messages"] += 1
+        gocb_ref = b""
+        st_num = sq_num = -1
+        data: Optional[Tuple[int, int]] = None
+        for tag, vs, ve in iter_tlv(adu, start, end):
+            if tag == 0x80:
+                gocb_ref = bytes(adu[vs:ve])
+            elif tag == 0x85:
+                st_num = integer(adu, vs, ve, signed=False)
+            elif tag == 0x86:
+                sq_num = integer(adu, vs, ve, signed=False)
+            elif tag == 0x87 and ve > vs and adu[vs]:
+                self.counters["simulated"] += 1
+            elif tag == 0xAB:
+                data = (vs, ve)
+        if st_num < 0 or sq_num < 0:
+            self.counters["malformed"] += 1
+            return []
+
+        key = (src, appid, gocb_ref)
+        streams = self._streams
+        state = streams.get(key)
+        if state is not None:
+            if st_num == state.st_num:
+                if sq_num != (state.sq_num + 1) & 0xFFFFFFFF and not (sq_num == 1 and state.sq_num == 0xFFFFFFFF):
+                    self.counters["sq_errors"] += 1  # replayed, reordered or lost retransmission
+                state.sq_num = sq_num
+                return []
+            if st_num != (state.st_num + 1) & 0xFFFFFFFF and st_num != 1:
+                self.counters["st_gaps"] += 1
+            state.st_num, state.sq_num = st_num, sq_num
+        else:
+            if len(streams) >= self.max_streams:
+                del streams[next(iter(streams))]
+            streams[key] = _GooseState(st_num, sq_num)
+        self.counters["state_changes"] += 1
+        value = render_data(adu, *data) if data else None
+        ref = gocb_ref.decode("ascii", "replace") or f"appid-{appid}"
+        return [OTProtocolFrame("goose", src, dst, "goose", appid, value, ref, datetime.fromtimestamp(ts, timezone.utc))]
+
+
+class _SvStream:
+    __slots__ = ("sv_id", "dst", "window_start", "samples", "lost", "reordered", "unsynced", "last_cnt")
+
+    def __init__(self, sv_id: str, dst: str, ts: float):
+        self.sv_id = sv_id
+        self.dst = dst
+        self.window_start = ts
+        self.samples = 0
+        self.lost = 0
+        self.reordered = 0
+        self.unsynced = 0
+        self.last_cnt = -1
+
+
+class SampledValuesDissector:
+    """Sampled Values decoder that emits per-stream summaries, not packets.
+
+    A stream is (source MAC, APPID, svID). smpCnt continuity is tracked per
+    ASDU; every ``summary_interval`` seconds of capture time a stream emits
+    one frame (``func_code`` "summary") whose value reads
+    ``samples=..;lost=..;reordered=..;unsynced=..;rate=..``.
+    """
+
+    def __init__(self, summary_interval: float = 1.0, max_streams: int = 4096):
+        self.summary_interval = summary_interval
+        self.max_streams = max_streams
+        self._streams: Dict[Tuple[str, int, bytes], _SvStream] = {}
+        self.counters: Dict[str, int] = {"messages": 0, "asdus": 0, "summaries": 0, "malformed": 0}
+
+    def dissect(self, adu, src: str, dst: str, sport: int, dport: int, ts: float) -> List[OTProtocolFrame]:
+        pdu = _l2_pdu(adu, SV_PDU)
+        if pdu is None:
+            self.counters["malformed"] += 1
+            return []
+        appid, start, end = pdu
+        self.counters["messages"] += 1
+        frames: List[OTProtocolFrame] = []
+        for tag, vs, ve in iter_tlv(adu, start, end):
+            if tag != 0xA2:
+                continue
+            for asdu_tag, as_, ae in iter_tlv(adu, vs, ve):
+                if asdu_tag == 0x30:
+                    self._asdu(adu, as_, ae, src, dst, appid, ts, frames)
+        return frames
+
+    def _asdu(self, adu, start: int, end: int, src: str, dst: str, appid: int, ts: float, frames: List[OTProtocolFrame]) -> None:
+        sv_id = b""
+        cnt = -1
+        synced = True
+        for tag, vs, ve in iter_tlv(adu, start, end):
+            if tag == 0x80:
+                sv_id = bytes(adu[vs:ve])
+            elif tag == 0x82:
+                cnt = integer(adu, vs, ve, signed=False)
+            elif tag == 0x85:
+                synced = ve > vs and adu[vs] != 0
+        if cnt < 0:
+            self.counters["malformed"] += 1
+            return
+        self.counters["asdus"] += 1
+        key = (src, appid, sv_id)
+        stream = self._streams.get(key)
+        if stream is None:
+            if len(self._streams) >= self.max_streams:
+                del self._streams[next(iter(self._streams))]
+            stream = self._streams[key] = _SvStream(sv_id.decode("ascii", "replace") or f"appid-{appid}", dst, ts)
+        elif ts - stream.window_start >= self.summary_interval:
+            frames.append(self._summary(key, stream, ts))
+        stream.samples += 1
+        if not synced:
+            stream.unsynced += 1
+        last = stream.last_cnt
+        if last >= 0 and cnt != last + 1 and cnt != 0:
+            # smpCnt wraps to 0 at the sample rate (or 65535)
+            if cnt > last:
+                stream.lost += cnt - last - 1
+            else:
+                stream.reordered += 1
+        stream.last_cnt = cnt
+
+    def _summary(self, key: Tuple[str, int, bytes], stream: _SvStream, ts: float) -> OTProtocolFrame:
+        elapsed = ts - stream.window_start
+        rate = stream.samples / elapsed if elapsed > 0 else 0.0
+        value = f"samples={stream.samples};lost={stream.lost};reordered={stream.reordered};unsynced={stream.unsynced};rate={rate:.1f}"
+        frame = OTProtocolFrame("sv", key[0], stream.dst, "summary", key[1], value, stream.sv_id,
+                                datetime.fromtimestamp(ts, timezone.utc))
+        stream.window_start = ts
+        stream.samples = stream.lost = stream.reordered = stream.unsynced = 0
+        self.counters["summaries"] += 1
+        return frame
+
+    def flush(self, ts: float) -> List[OTProtocolFrame]:
+        """Summaries for every stream with samples in its current window."""
+        return [self._summary(key, stream, ts) for key, stream in self._streams.items() if stream.samples]
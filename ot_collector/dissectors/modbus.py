@@ -1,15 +1,18 @@
 from __future__ import annotations
 
+import struct
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 from schemas import OTProtocolFrame
 
+from ..protocols import RESPONSE_SUFFIX
+
 
 # Simplified Modbus/TCP parsing: MBAP (7 bytes) + PDU
 # Function code is first byte of PDU
 
-def parse_modbus(payload: bytes, src_ip: str, dst_ip: str) -> Optional[OTProtocolFrame]:
+def parse_modbus(payload: bytes, src_ip: str, dst_ip: str, ts: Optional[float] = None) -> Optional[OTProtocolFrame]:
     if len(payload) < 8:
         return None
     # MBAP header: Transaction ID (2), Protocol ID (2), Length (2), Unit ID (1)
@@ -26,7 +29,7 @@ def parse_modbus(payload: bytes, src_ip: str, dst_ip: str) -> Optional[OTProtoco
     # For Write Single Register (6), value is next 2 bytes
     if func_code == 6 and len(pdu) >= 5:
         value = str(int.from_bytes(pdu[3:5], "big"))
-    ts = datetime.now(timezone.utc)
+    when = datetime.fromtimestamp(ts, timezone.utc) if ts is not None else datetime.now(timezone.utc)
     return OTProtocolFrame(
         protocol="modbus",
         src_ip=src_ip,
@@ -35,5 +38,156 @@ def parse_modbus(payload: bytes, src_ip: str, dst_ip: str) -> Optional[OTProtoco
         addr=addr,
         value=value,
         session_id=f"{src_ip}->{dst_ip}",
-        timestamp=ts,
+        timestamp=when,
     )
+
+
+# Full Modbus/TCP decoding with request/response pairing.
+
+MODBUS_PORT = 502
+
+READ_COILS = 1
+READ_DISCRETE_INPUTS = 2
+READ_HOLDING_REGISTERS = 3
+READ_INPUT_REGISTERS = 4
+WRITE_SINGLE_COIL = 5
+WRITE_SINGLE_REGISTER = 6
+WRITE_MULTIPLE_COILS = 15
+WRITE_MULTIPLE_REGISTERS = 16
+
+ADDRESSED = frozenset({1, 2, 3, 4, 5, 6, 15, 16, 22, 23})
+BIT_READS = frozenset({READ_COILS, READ_DISCRETE_INPUTS})
+REGISTER_READS = frozenset({READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS})
+
+_MBAP = struct.Struct("!HHHBB")  # transaction, protocol, length, unit, function
+_ADDR_QTY = struct.Struct("!HH")
+_FC_STR = {fc: str(fc) for fc in range(256)}
+_RSP_STR = {fc: f"{fc}{RESPONSE_SUFFIX}" for fc in range(256)}
+_REGISTERS: Dict[int, struct.Struct] = {n: struct.Struct(f"!{n}H") for n in range(1, 126)}
+
+
+def _bits(data, off: int, count: int) -> List[int]:
+    # Coils are packed LSB first
+    return [(data[off + (i >> 3)] >> (i & 7)) & 1 for i in range(count)]
+
+
+class _Pending:
+    __slots__ = ("ts", "func", "addr", "qty")
+
+    def __init__(self, ts: float, func: int, addr: Optional[int], qty: int):
+        self.ts = ts
+        self.func = func
+        self.addr = addr
+        self.qty = qty
+
+
+class ModbusDissector:
+    """Stateful Modbus/TCP dissector that pairs requests with responses.
+
+    Requests are remembered by (client, client port, server, transaction id)
+    in a table bounded by ``max_pending`` entries and ``timeout`` seconds.
+    Frames are always oriented client -> server. Writes produce one frame per
+    register or coil written. A response produces one frame whose function
+    code has ``protocols.RESPONSE_SUFFIX`` (so a write acknowledgement is not
+    a second write) and carries ``latency_ms``; with ``read_values`` a read
+    response instead produces one such frame per value returned. Exception
+    responses use the function code with the 0x80 bit set and the exception
+    code as the value.
+    """
+
+    def __init__(self, max_pending: int = 65536, timeout: float = 30.0, read_values: bool = False):
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.read_values = read_values
+        self._pending: Dict[Tuple[str, int, str, int], _Pending] = {}
+        self.counters: Dict[str, int] = {
+            "requests": 0,
+            "responses": 0,
+            "unmatched": 0,
+            "expired": 0,
+            "exceptions": 0,
+            "malformed": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def dissect(self, adu, src_ip: str, dst_ip: str, sport: int, dport: int, ts: float) -> List[OTProtocolFrame]:
+        if len(adu) < 8:
+            self.counters["malformed"] += 1
+            return []
+        tid, proto, length, _unit, func = _MBAP.unpack_from(adu, 0)
+        if proto != 0 or len(adu) < 6 + length:
+            self.counters["malformed"] += 1
+            return []
+        when = datetime.fromtimestamp(ts, timezone.utc)
+        if dport == MODBUS_PORT:
+            return self._request(adu, tid, func, src_ip, sport, dst_ip, ts, when)
+        return self._response(adu, tid, func, dst_ip, dport, src_ip, ts, when)
+
+    def _request(self, adu, tid: int, func: int, client: str, cport: int, server: str, ts: float, when: datetime) -> List[OTProtocolFrame]:
+        self.counters["requests"] += 1
+        n = len(adu)
+        addr: Optional[int] = None
+        qty = 0
+        values: List[Tuple[int, str]] = []
+        if n >= 12 and func in ADDRESSED:
+            addr, qty = _ADDR_QTY.unpack_from(adu, 8)
+        if func == WRITE_SINGLE_COIL and addr is not None:
+            values = [(addr, "1" if qty == 0xFF00 else "0")]
+        elif func == WRITE_SINGLE_REGISTER and addr is not None:
+            values = [(addr, str(qty))]
+        elif func == WRITE_MULTIPLE_COILS and addr is not None and n >= 13 and n >= 13 + adu[12]:
+            values = [(addr + i, str(bit)) for i, bit in enumerate(_bits(adu, 13, min(qty, adu[12] * 8)))]
+        elif func == WRITE_MULTIPLE_REGISTERS and addr is not None and n >= 13:
+            count = min(qty, adu[12] // 2, (n - 13) // 2)
+            if count in _REGISTERS:
+                values = [(addr + i, str(v)) for i, v in enumerate(_REGISTERS[count].unpack_from(adu, 13))]
+
+        self._remember((client, cport, server, tid), _Pending(ts, func, addr, qty), ts)
+        session = f"{client}->{server}"
+        fc = _FC_STR[func]
+        if values:
+            return [OTProtocolFrame.trusted("modbus", client, server, fc, a, v, session, when) for a, v in values]
+        return [OTProtocolFrame.trusted("modbus", client, server, fc, addr, None, session, when)]
+
+    def _response(self, adu, tid: int, func: int, client: str, cport: int, server: str, ts: float, when: datetime) -> List[OTProtocolFrame]:
+        self.counters["responses"] += 1
+        pending = self._pending.pop((client, cport, server, tid), None)
+        session = f"{client}->{server}"
+        fc = _RSP_STR[func]
+        if pending is None or pending.func != func & 0x7F:
+            self.counters["unmatched"] += 1
+            return [OTProtocolFrame.trusted("modbus", client, server, fc, None, None, session, when)]
+        latency = max(0.0, (ts - pending.ts) * 1000.0)
+        addr = pending.addr
+        if func & 0x80:
+            self.counters["exceptions"] += 1
+            return [OTProtocolFrame.trusted("modbus", client, server, fc, addr, str(adu[8]) if len(adu) > 8 else None, session, when, latency)]
+
+        values: List[str] = []
+        n = len(adu)
+        if self.read_values and addr is not None and n >= 9:
+            byte_count = adu[8]
+            if func in REGISTER_READS:
+                count = min(pending.qty, byte_count // 2, (n - 9) // 2)
+                if count in _REGISTERS:
+                    values = [str(v) for v in _REGISTERS[count].unpack_from(adu, 9)]
+            elif func in BIT_READS and n >= 9 + byte_count:
+                values = [str(bit) for bit in _bits(adu, 9, min(pending.qty, byte_count * 8))]
+        if values:
+            return [OTProtocolFrame.trusted("modbus", client, server, fc, addr + i, v, session, when, latency) for i, v in enumerate(values)]
+        return [OTProtocolFrame.trusted("modbus", client, server, fc, addr, None, session, when, latency)]
+
+    def _remember(self, key: Tuple[str, int, str, int], pending: _Pending, ts: float) -> None:
+        table = self._pending
+        table.pop(key, None)  # a reused transaction id replaces the old request
+        table[key] = pending
+        # Insertion order is arrival order, so expired requests are at the front
+        cutoff = ts - self.timeout
+        while table:
+            oldest = next(iter(table))
+            if len(table) <= self.max_pending and table[oldest].ts >= cutoff:
+                break
+            del table[oldest]
+            self.counters["expired"] += 1
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import socket
+import struct
+import sys
+from typing import Dict, NamedTuple, Optional
+
+# Raw Ethernet/IPv4/TCP pre-filter. Works on fixed offsets of the captured
+# buffer so non-OT traffic (most of a SPAN port) is rejected after a couple
+# of struct reads, without building dpkt objects or copying the payload.
+# IEC 61850 GOOSE and Sampled Values ride directly on Ethernet and are
+# passed through by EtherType.
+
+OT_TCP_PORTS: Dict[int, str] = {
+    502: "modbus",
+    20000: "dnp3",
+    2404: "iec104",
+    102: "iec61850",
+}
+
+# EtherType -> protocol for layer-2 OT traffic
+L2_ETHERTYPES: Dict[int, str] = {
+    0x88B8: "goose",
+    0x88BA: "sv",
+}
+L2_PROTOCOLS = frozenset(L2_ETHERTYPES.values())
+
+ETH_P_IP = 0x0800
+VLAN_ETHERTYPES = frozenset({0x8100, 0x88A8, 0x9100})  # 802.1Q, 802.1ad (QinQ), legacy QinQ
+IPPROTO_TCP = 6
+
+ETH_HLEN = 14
+MIN_IP_HLEN = 20
+MIN_TCP_HLEN = 20
+
+_U16 = struct.Struct("!H")
+_U32 = struct.Struct("!I")
+_PORTS = struct.Struct("!HH")
+_ADDRS = struct.Struct("!II")
+_MACS = struct.Struct("!HIHI")
+
+
+class OTPacket(NamedTuple):
+    protocol: str
+    src: int  # IPv4 address (or MAC for layer-2 protocols) as an integer
+    dst: int
+    sport: int
+    dport: int
+    seq: int
+    flags: int  # TCP flags byte
+    payload: memoryview  # zero-copy slice of the captured buffer
+    ip_id: int = 0  # IPv4 identification (0 for layer-2 protocols)
+
+
+def prefilter(buf, ports: Dict[int, str] = OT_TCP_PORTS, l2: Dict[int, str] = L2_ETHERTYPES) -> Optional[OTPacket]:
+    """Return the OT view of an Ethernet frame, or None if it is not OT traffic.
+
+    Handles stacked VLAN tags, IPv4 options and Ethernet padding. Non-first
+    IP fragments are rejected since they carry no TCP header. Layer-2
+    protocols get MAC addresses in ``src``/``dst``, zero ports and the
+    bytes after the EtherType as payload.
+    """
+    n = len(buf)
+    if n < ETH_HLEN + MIN_IP_HLEN:
+        return None
+    off = 12
+    ethertype = _U16.unpack_from(buf, off)[0]
+    while ethertype in VLAN_ETHERTYPES:
+        off += 4
+        if n < off + 2 + MIN_IP_HLEN:
+            return None
+        ethertype = _U16.unpack_from(buf, off)[0]
+    if ethertype != ETH_P_IP:
+        protocol = l2.get(ethertype)
+        if protocol is None:
+            return None
+        dst_hi, dst_lo, src_hi, src_lo = _MACS.unpack_from(buf, 0)
+        return OTPacket(protocol, (src_hi << 32) | src_lo, (dst_hi << 32) | dst_lo, 0, 0, 0, 0, memoryview(buf)[off + 2:])
+    if n < off + 2 + MIN_IP_HLEN + MIN_TCP_HLEN:
+        return None
+
+    ip = off + 2
+    vihl = buf[ip]
+    ihl = (vihl & 0x0F) << 2
+    if vihl >> 4 != 4 or ihl < MIN_IP_HLEN or buf[ip + 9] != IPPROTO_TCP:
+        return None
+    if _U16.unpack_from(buf, ip + 6)[0] & 0x1FFF:
+        return None
+
+    tcp = ip + ihl
+    if n < tcp + MIN_TCP_HLEN:
+        return None
+    sport, dport = _PORTS.unpack_from(buf, tcp)
+    protocol = ports.get(dport) or ports.get(sport)
+    if protocol is None:
+        return None
+
+    # Trust the IP total length over the capture length so Ethernet padding
+    # is not handed to the dissectors; 0 means TSO/offload, use the capture.
+    total_len = _U16.unpack_from(buf, ip + 2)[0]
+    end = min(n, ip + total_len) if total_len else n
+    start = tcp + ((buf[tcp + 12] >> 4) << 2)
+    if start > end:
+        return None
+    src, dst = _ADDRS.unpack_from(buf, ip + 12)
+    seq = _U32.unpack_from(buf, tcp + 4)[0]
+    ip_id = _U16.unpack_from(buf, ip + 4)[0]
+    return OTPacket(protocol, src, dst, sport, dport, seq, buf[tcp + 13], memoryview(buf)[start:end], ip_id)
+
+
+def flow_shard(pkt: OTPacket, count: int) -> int:
+    """Direction-independent shard index for a packet's flow."""
+    return (((pkt.src ^ pkt.dst) * 0x9E3779B1) ^ (pkt.sport ^ pkt.dport)) % count
+
+
+_IP_STR_CACHE: Dict[int, str] = {}
+_IP_STR_CACHE_MAX = 65536
+
+
+def ip_str(addr: int) -> str:
+    """Dotted-quad for an integer IPv4 address, cached and interned."""
+    s = _IP_STR_CACHE.get(addr)
+    if s is None:
+        if len(_IP_STR_CACHE) >= _IP_STR_CACHE_MAX:
+            _IP_STR_CACHE.clear()
+        s = sys.intern(socket.inet_ntoa(_U32.pack(addr)))
+        _IP_STR_CACHE[addr] = s
+    return s
+
+
+_MAC_STR_CACHE: Dict[int, str] = {}
+
+
+def mac_str(addr: int) -> str:
+    """Colon-separated MAC for a 48-bit integer, cached like ip_str."""
+    s = _MAC_STR_CACHE.get(addr)
+    if s is None:
+        if len(_MAC_STR_CACHE) >= _IP_STR_CACHE_MAX:
+            _MAC_STR_CACHE.clear()
+        s = sys.intern(addr.to_bytes(6, "big").hex(":"))
+        _MAC_STR_CACHE[addr] = s
+    return s
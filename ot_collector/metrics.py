@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import logging
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Collector self-instrumentation. Hot-path code only bumps plain ints and
+# Histogram buckets it owns; values are pulled into Prometheus text format
+# when the endpoint is scraped, so there is no per-packet registry lookup.
+
+Labels = Dict[str, str]
+Sample = Tuple[Labels, float]
+# (name, type, help, samples, scale) as evaluated by MetricsRegistry.collect
+Family = Tuple[str, str, str, List[Tuple[Labels, Any]], float]
+
+# Dissector latency buckets in nanoseconds (exported in seconds)
+LATENCY_BUCKETS_NS = (1_000, 2_000, 5_000, 10_000, 20_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 5_000_000)
+
+
+class Histogram:
+    """Fixed-bucket histogram; ``observe`` is a bisect and three adds."""
+
+    __slots__ = ("bounds", "counts", "total", "count")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(sorted(bounds))
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def copy(self) -> "Histogram":
+        other = Histogram(())
+        other.bounds = self.bounds
+        other.counts = list(self.counts)
+        other.total = self.total
+        other.count = self.count
+        return other
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding quantile ``q`` (None if empty or above the last bound)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return None
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+class MetricsRegistry:
+    """Metric families whose values are pulled from callbacks at scrape time."""
+
+    def __init__(self):
+        self._families: List[Tuple[str, str, str, Callable[[], Iterable[Any]], float]] = []
+        self._sources: List[Callable[[], Iterable[Family]]] = []
+
+    def counter(self, name: str, help_text: str, fn: Callable[[], Iterable[Sample]]) -> None:
+        self._families.append((name, "counter", help_text, fn, 1.0))
+
+    def gauge(self, name: str, help_text: str, fn: Callable[[], Iterable[Sample]]) -> None:
+        self._families.append((name, "gauge", help_text, fn, 1.0))
+
+    def histogram(self, name: str, help_text: str, fn: Callable[[], Iterable[Tuple[Labels, Histogram]]], scale: float = 1.0) -> None:
+        """``scale`` converts observed units to exported ones (e.g. 1e-9 for ns -> s)."""
+        self._families.append((name, "histogram", help_text, fn, scale))
+
+    def include(self, fn: Callable[[], Iterable[Family]]) -> None:
+        """Add families collected elsewhere (e.g. in worker processes); same-named families are merged."""
+        self._sources.append(fn)
+
+    def collect(self) -> List[Family]:
+        """Evaluate every family now. Histograms are copied, so the result is a picklable snapshot."""
+        merged: Dict[str, Family] = {}
+        families: List[Family] = [
+            (name, kind, help_text, [(labels, value.copy() if kind == "histogram" else value) for labels, value in fn()], scale)
+            for name, kind, help_text, fn, scale in self._families
+        ]
+        for source in self._sources:
+            families += source()
+        for name, kind, help_text, samples, scale in families:
+            if name in merged:
+                merged[name][3].extend(samples)
+            else:
+                merged[name] = (name, kind, help_text, list(samples), scale)
+        return list(merged.values())
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name, kind, help_text, samples, scale in self.collect():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if kind != "histogram":
+                    lines.append(f"{name}{_labels(labels)} {value}")
+                    continue
+                cumulative = 0
+                for bound, n in zip(value.bounds, value.counts):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_labels({**labels, 'le': f'{bound * scale:g}'})} {cumulative}")
+                lines.append(f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {value.count}")
+                lines.append(f"{name}_sum{_labels(labels)} {value.total * scale:g}")
+                lines.append(f"{name}_count{_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Serves a registry at ``/metrics`` from a daemon thread."""
+
+    def __init__(self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9464,
+                 logger: Optional[logging.Logger] = None):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def start(self) -> "MetricsServer":
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+        self.logger.info("Metrics on http://%s:%d/metrics", self.host, self.port)
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def _innermost(producer: Any) -> Any:
+    # BufferingProducer wraps the Kafka producer
+    while hasattr(producer, "producer"):
+        producer = producer.producer
+    return producer
+
+
+def collector_metrics(collector: Any, registry: Optional[MetricsRegistry] = None) -> MetricsRegistry:
+    """Register an OTCollector's counters, per-protocol stats and producer/ring gauges."""
+    registry = registry or MetricsRegistry()
+    counters = collector.counters
+    stats = collector.protocol_stats
+
+    registry.counter("ot_collector_packets_total", "Packets seen, by pre-filter result", lambda: [
+        ({"result": "ot"}, counters["ot_packets"]),
+        ({"result": "duplicate"}, counters["duplicates"]),
+        ({"result": "filtered"}, counters["packets"] - counters["ot_packets"] - counters["duplicates"]),
+    ])
+    registry.counter("ot_collector_bytes_total", "Bytes read from capture files", lambda: [({}, counters["bytes"])])
+    registry.counter("ot_collector_protocol_packets_total", "OT packets (or reassembled ADUs) dissected",
+                     lambda: [({"protocol": p}, s.packets) for p, s in stats.items()])
+    registry.counter("ot_collector_protocol_frames_total", "Frames produced by each dissector",
+                     lambda: [({"protocol": p}, s.frames) for p, s in stats.items()])
+    registry.counter("ot_collector_protocol_errors_total", "Dissector exceptions",
+                     lambda: [({"protocol": p}, s.errors) for p, s in stats.items()])
+    registry.histogram("ot_collector_dissect_seconds", "Dissector latency per call",
+                       lambda: [({"protocol": p}, s.latency) for p, s in stats.items()], scale=1e-9)
+    registry.counter("ot_collector_frames_total", "Frames handed to the producer, by outcome", lambda: [
+        ({"outcome": "emitted"}, counters["frames_emitted"]),
+        ({"outcome": "dropped"}, counters.get("frames_dropped", 0)),
+    ])
+    registry.counter("ot_collector_summaries_total", "Flow summaries emitted", lambda: [({}, counters.get("summaries_emitted", 0))])
+    registry.counter("ot_collector_errors_total", "Packets whose handling raised", lambda: [({}, counters.get("errors", 0))])
+
+    def producer_gauges() -> List[Sample]:
+        out: List[Sample] = []
+        inner = _innermost(collector.producer)
+        if hasattr(inner, "in_flight"):
+            out.append(({"queue": "kafka"}, inner.in_flight))
+        if hasattr(collector.producer, "backlog"):
+            out.append(({"queue": "buffer"}, collector.producer.backlog()))
+        return out
+
+    def producer_counters() -> List[Sample]:
+        inner = _innermost(collector.producer)
+        return [({"result": k}, v) for k, v in getattr(inner, "counters", {}).items()]
+
+    registry.gauge("ot_collector_producer_queue_depth", "Messages not yet delivered", producer_gauges)
+    registry.counter("ot_collector_producer_messages_total", "Producer message accounting", producer_counters)
+
+    def ring_counters() -> List[Sample]:
+        ring = collector.ring
+        if ring is None:
+            return []
+        totals = ring.totals()
+        return [({"kind": "packets"}, totals["packets"]), ({"kind": "drops"}, totals["drops"]),
+                ({"kind": "freeze_q_cnt"}, totals["freeze_q_cnt"])]
+
+    registry.counter("ot_collector_kernel_packets_total", "AF_PACKET ring kernel statistics", ring_counters)
+    return registry
+
+
+def agent_metrics(agent: Any, registry: Optional[MetricsRegistry] = None) -> MetricsRegistry:
+    """Per-rule evaluation counts, alerts and latency of an OTTrackingAgent."""
+    registry = registry or MetricsRegistry()
+    stats = agent.rule_stats
+    registry.counter("ot_agent_rule_evaluations_total", "Frames each rule was evaluated on",
+                     lambda: [({"rule": name}, s.calls) for name, s in stats.items()])
+    registry.counter("ot_agent_rule_alerts_total", "Alerts raised by each rule",
+                     lambda: [({"rule": name}, s.hits) for name, s in stats.items()])
+    registry.histogram("ot_agent_rule_seconds", "Rule evaluation latency",
+                       lambda: [({"rule": name}, s.latency) for name, s in stats.items()], scale=1e-9)
+    return registry
+
+
+def pool_metrics(pool: Any, registry: Optional[MetricsRegistry] = None) -> MetricsRegistry:
+    """Latest collector_metrics snapshot of each CollectorPool worker, labelled ``worker``.
+
+    Workers send their snapshots with every report, so the families and
+    dashboards are the same as for a single collector.
+    """
+    registry = registry or MetricsRegistry()
+
+    def workers() -> List[Family]:
+        out: List[Family] = []
+        for index, snapshot in sorted(list(pool.latest.items())):
+            worker = str(index)
+            for name, kind, help_text, samples, scale in snapshot.get("metrics", ()):
+                out.append((name, kind, help_text, [({**labels, "worker": worker}, value) for labels, value in samples], scale))
+        return out
+
+    registry.include(workers)
+    return registry
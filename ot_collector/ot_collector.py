@@ -5,59 +5,218 @@ import logging
 import os
 import socket
 import struct
+import sys
 import time
 from dataclasses import asdict
-from typing import Any, Dict, Optional
+from time import perf_counter_ns
+from threading import Event
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 try:
     import dpkt  # lightweight pcap/packet parsing
 except Exception:  # pragma: no cover - optional dependency
     dpkt = None  # type: ignore
 
-from schemas import OTProtocolFrame  # reuse schema for normalization
+from schemas import CONTENT_TYPE_BINARY, CONTENT_TYPE_HEADER, CONTENT_TYPE_SUMMARY, OTFlowSummary, OTProtocolFrame, encode_frames  # reuse schema for normalization
 
-from .dissectors.modbus import parse_modbus
-from .dissectors.dnp3 import parse_dnp3
-from .dissectors.iec104 import parse_iec104
-from .dissectors.iec61850 import parse_iec61850
+from .dissectors.modbus import ModbusDissector, parse_modbus
+from .dissectors.dnp3 import Dnp3Dissector, parse_dnp3
+from .dissectors.iec104 import Iec104Dissector, parse_iec104
+from .dissectors.iec61850 import GooseDissector, SampledValuesDissector, parse_iec61850
+from .dedup import DuplicateFilter, packet_key
+from .fastpath import L2_PROTOCOLS, flow_shard, ip_str, mac_str, prefilter
+from .metrics import LATENCY_BUCKETS_NS, Histogram
+from .capture import DEFAULT_RING_BYTES, RING_BLOCK_SIZE, TPacketV3Ring
+from .pcapfile import CaptureFile
+from .producer import KafkaProducer
+from .reassembly import StreamReassembler, flow_key
+from .summarizer import FlowSummarizer
 
 
-class KafkaProducer:
-    def __init__(self, brokers: str, topic: str, logger: Optional[logging.Logger] = None):
-        self.brokers = brokers
-        self.topic = topic
-        self.logger = logger or logging.getLogger(self.__class__.__name__)
-        # Placeholder: integrate confluent_kafka.Producer with acks=all in production
+# Fast-path dissector: (adu, src_ip, dst_ip, sport, dport, capture ts) -> frames
+Dissector = Callable[[Any, str, str, int, int, float], List[OTProtocolFrame]]
+
+
+def _stateless(parse: Callable[..., Optional[OTProtocolFrame]]) -> Dissector:
+    def dissect(adu, src_ip: str, dst_ip: str, sport: int, dport: int, ts: float) -> List[OTProtocolFrame]:
+        frame = parse(adu, src_ip, dst_ip, ts)
+        return [frame] if frame else []
+    return dissect
 
-    def produce(self, key: str, value: str) -> None:
-        # Placeholder stub; replace with real Kafka producer
-        self.logger.debug("produce: key=%s len=%s", key, len(value))
 
-    def flush(self) -> None:
-        pass
+class ProtocolStats:
+    """Per-protocol dissection counters and latency (ns), read by metrics.collector_metrics."""
+
+    __slots__ = ("packets", "frames", "errors", "latency")
+
+    def __init__(self):
+        self.packets = 0
+        self.frames = 0
+        self.errors = 0
+        self.latency = Histogram(LATENCY_BUCKETS_NS)
 
 
 class OTCollector:
-    def __init__(self, interface: str, producer: KafkaProducer, logger: Optional[logging.Logger] = None):
+    def __init__(
+        self,
+        interface: str,
+        producer: KafkaProducer,
+        logger: Optional[logging.Logger] = None,
+        fast_path: bool = True,
+        shard: Optional[Tuple[int, int]] = None,
+        fanout_group: Optional[int] = None,
+        reassembler: Optional[StreamReassembler] = None,
+        reassemble: bool = True,
+        wire_format: Optional[str] = None,
+        summary_interval: Optional[float] = None,
+        dedup_window: Optional[float] = None,
+        ring_bytes: int = DEFAULT_RING_BYTES,
+    ):
         self.interface = interface
         self.producer = producer
         self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.fast_path = fast_path
+        # (index, count): when reading a pcap in a worker pool, only handle
+        # flows that hash to this worker. Live capture uses fanout_group.
+        self.shard = shard
+        self.fanout_group = fanout_group
+        # Kernel memory for the live capture ring (whole 4 MiB blocks, at least two)
+        self.ring_bytes = ring_bytes
+        # Cuts TCP payloads into whole protocol frames; without it each
+        # segment is handed to the dissector as-is.
+        self.reassembler = reassembler or (StreamReassembler(logger=self.logger) if reassemble else None)
+        # "binary" (schemas.encode_frames, one message per packet) or "json" (one per frame, for debugging)
+        self.wire_format = wire_format or os.getenv("OT_WIRE_FORMAT", "binary")
+        if self.wire_format not in ("binary", "json"):
+            raise ValueError(f"Unsupported wire format: {self.wire_format}")
+        self._headers = [(CONTENT_TYPE_HEADER, CONTENT_TYPE_BINARY.encode())]
+        self._summary_headers = [(CONTENT_TYPE_HEADER, CONTENT_TYPE_SUMMARY.encode())]
+        # Optional edge summarisation of steady polling (seconds; 0 = forward every frame)
+        if summary_interval is None:
+            summary_interval = float(os.getenv("OT_SUMMARY_INTERVAL", "0"))
+        self.summarizer = FlowSummarizer(summary_interval) if summary_interval > 0 else None
+        self.counters: Dict[str, int] = {"packets": 0, "bytes": 0, "ot_packets": 0, "duplicates": 0, "frames_emitted": 0, "errors": 0}
+        # Copies of one packet from several SPAN/TAP feeds within this many seconds are dropped (0 = off)
+        if dedup_window is None:
+            dedup_window = float(os.getenv("OT_DEDUP_WINDOW", "0.1"))
+        self.dedup = DuplicateFilter(dedup_window) if dedup_window > 0 else None
+        # One frame per register/coil value in Modbus read responses (off: one frame per response)
+        self.modbus = ModbusDissector(read_values=os.getenv("OT_MODBUS_READ_VALUES", "0") == "1")
+        # Likewise one frame per point in DNP3 responses (off: one frame per response fragment)
+        self.dnp3 = Dnp3Dissector(point_values=os.getenv("OT_DNP3_POINT_VALUES", "0") == "1")
+        # And one frame per information object in IEC 104 monitor-direction ASDUs (off: one per ASDU)
+        self.iec104 = Iec104Dissector(object_values=os.getenv("OT_IEC104_OBJECT_VALUES", "0") == "1")
+        self.goose = GooseDissector()
+        self.sv = SampledValuesDissector()
+        self._dissectors: Dict[str, Dissector] = {
+            "modbus": self.modbus.dissect,
+            "dnp3": self.dnp3.dissect,
+            "iec104": self.iec104.dissect,
+            "iec61850": _stateless(parse_iec61850),
+            "goose": self.goose.dissect,
+            "sv": self.sv.dissect,
+        }
+        self.protocol_stats: Dict[str, ProtocolStats] = {name: ProtocolStats() for name in self._dissectors}
+        self.ring: Optional[TPacketV3Ring] = None  # set during live capture, for kernel drop metrics
+        self._last_ts = 0.0
+        self._stop = Event()
 
-    def run(self) -> None:
-        if dpkt is None:
-            raise RuntimeError("dpkt library is required for packet parsing")
+    def stop(self) -> None:
+        """Signal the capture loop to stop."""
+        self._stop.set()
 
-        # Using pcap file reading for testability; replace with live capture via libpcap/pyshark in prod
+    def run(self) -> None:
+        # PCAP_PATH takes precedence so the collector stays testable without capture privileges
         pcap_path = os.getenv("PCAP_PATH")
         if pcap_path:
-            with open(pcap_path, "rb") as f:
-                pcap = dpkt.pcap.Reader(f)
-                for ts, buf in pcap:
-                    self._handle_packet(ts, buf)
+            self.run_pcap(pcap_path)
+        elif sys.platform.startswith("linux"):
+            self.run_live()
         else:
-            self.logger.warning("Live capture not implemented in this stub. Provide PCAP_PATH env var.")
+            self.logger.warning("Live capture requires Linux AF_PACKET. Provide PCAP_PATH env var.")
+
+    def run_pcap(self, pcap_path: str) -> None:
+        """Replay a pcap/pcapng file (optionally gzip) with its capture timestamps."""
+        with CaptureFile(pcap_path, logger=self.logger) as capture:
+            for ts, buf in capture.packets():
+                if self._stop.is_set():
+                    break
+                self.counters["bytes"] += len(buf)
+                self._handle_packet(ts, buf)
+        self.flush_summaries()
+
+    def run_live(self, ring: Optional[TPacketV3Ring] = None) -> None:
+        ring = ring or TPacketV3Ring(self.interface, block_count=max(2, self.ring_bytes // RING_BLOCK_SIZE),
+                                     fanout_group=self.fanout_group, logger=self.logger)
+        self.ring = ring
+        with ring:
+            self.logger.info("Live capture on %s (TPACKET_V3, %d x %d byte blocks)", self.interface, ring.block_count, ring.block_size)
+            for ts, buf in ring.packets(stop=self._stop.is_set):
+                self._handle_packet(ts, buf)
+            self.flush_summaries()
+            self.logger.info("Capture stopped: %s", ring.stats())
+
+    def flush_summaries(self) -> None:
+        """Emit the partial Sampled Values and flow summary windows."""
+        frames = self.sv.flush(self._last_ts)
+        if frames:
+            self._emit_many("sv", frames)
+        if self.summarizer is not None:
+            self._emit_summaries(self.summarizer.flush(self._last_ts, force=True))
 
     def _handle_packet(self, ts: float, buf: bytes) -> None:
+        if not self.fast_path:
+            self._handle_packet_dpkt(ts, bytes(buf))
+            return
+        counters = self.counters
+        counters["packets"] += 1
+        self._last_ts = ts
+        try:
+            pkt = prefilter(buf)
+            if pkt is None:
+                return
+            if self.shard is not None and flow_shard(pkt, self.shard[1]) != self.shard[0]:
+                return
+            if self.dedup is not None and self.dedup.seen(packet_key(pkt), ts):
+                counters["duplicates"] += 1
+                return
+            counters["ot_packets"] += 1
+            protocol = pkt.protocol
+            if protocol in L2_PROTOCOLS:
+                adus = [pkt.payload]
+                src, dst = mac_str(pkt.src), mac_str(pkt.dst)
+            else:
+                if self.reassembler is not None:
+                    key = flow_key(pkt.src, pkt.sport, pkt.dst, pkt.dport)
+                    adus = self.reassembler.feed(key, protocol, pkt.seq, pkt.flags, pkt.payload, ts)
+                    if not adus:
+                        return
+                else:
+                    adus = [pkt.payload]
+                src, dst = ip_str(pkt.src), ip_str(pkt.dst)
+            dissect = self._dissectors[protocol]
+            stats = self.protocol_stats[protocol]
+            frames = []
+            for adu in adus:
+                stats.packets += 1
+                start = perf_counter_ns()
+                try:
+                    frames += dissect(adu, src, dst, pkt.sport, pkt.dport, ts)
+                except Exception:
+                    stats.errors += 1
+                    raise
+                finally:
+                    stats.latency.observe(perf_counter_ns() - start)
+            if frames:
+                stats.frames += len(frames)
+                self._emit_many(protocol, frames)
+        except Exception as exc:
+            counters["errors"] += 1
+            self.logger.exception("Packet handling error: %s", exc)
+
+    def _handle_packet_dpkt(self, ts: float, buf: bytes) -> None:
+        # Reference path: full dpkt decode of every packet. Kept for
+        # comparison benchmarks and as a fallback (fast_path=False).
         try:
             eth = dpkt.ethernet.Ethernet(buf)
             if not isinstance(eth.data, dpkt.ip.IP):
@@ -72,19 +231,19 @@ class OTCollector:
                 payload = bytes(tcp.data or b"")
 
                 if sport == 502 or dport == 502:  # Modbus/TCP
-                    frame = parse_modbus(payload, src_ip, dst_ip)
+                    frame = parse_modbus(payload, src_ip, dst_ip, ts)
                     if frame:
                         self._emit(frame)
                 elif sport in (20000,) or dport in (20000,):  # DNP3 TCP
-                    frame = parse_dnp3(payload, src_ip, dst_ip)
+                    frame = parse_dnp3(payload, src_ip, dst_ip, ts)
                     if frame:
                         self._emit(frame)
                 elif sport in (2404,) or dport in (2404,):  # IEC 60870-5-104
-                    frame = parse_iec104(payload, src_ip, dst_ip)
+                    frame = parse_iec104(payload, src_ip, dst_ip, ts)
                     if frame:
                         self._emit(frame)
                 elif sport in (102,) or dport in (102,):  # IEC 61850 MMS
-                    frame = parse_iec61850(payload, src_ip, dst_ip)
+                    frame = parse_iec61850(payload, src_ip, dst_ip, ts)
                     if frame:
                         self._emit(frame)
             # TODO: Add UDP-based protocols as needed
@@ -92,6 +251,32 @@ class OTCollector:
             self.logger.exception("Packet handling error: %s", exc)
 
     def _emit(self, frame: OTProtocolFrame) -> None:
-        key = frame.protocol
-        value = frame.to_json()
-        self.producer.produce(key=key, value=value)
+        self._emit_many(frame.protocol, [frame])
+
+    def _emit_many(self, protocol: str, frames: List[OTProtocolFrame]) -> None:
+        if self.summarizer is not None:
+            frames, summaries = self.summarizer.observe(frames, self._last_ts)
+            if summaries:
+                self._emit_summaries(summaries)
+            if not frames:
+                return
+        try:
+            if self.wire_format == "binary":
+                self.producer.produce(key=protocol, value=encode_frames(frames), headers=self._headers)
+            else:
+                for frame in frames:
+                    self.producer.produce(key=protocol, value=frame.to_json())
+        except BufferError:
+            # Producer queue full: drop rather than stall the capture loop
+            self.counters["frames_dropped"] = self.counters.get("frames_dropped", 0) + len(frames)
+            return
+        self.counters["frames_emitted"] += len(frames)
+
+    def _emit_summaries(self, summaries: List[OTFlowSummary]) -> None:
+        for summary in summaries:
+            try:
+                self.producer.produce(key=summary.protocol, value=summary.to_json(), headers=self._summary_headers)
+            except BufferError:
+                self.counters["summaries_dropped"] = self.counters.get("summaries_dropped", 0) + 1
+                continue
+            self.counters["summaries_emitted"] = self.counters.get("summaries_emitted", 0) + 1
@@ -4,10 +4,15 @@ import json
 import logging
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from time import perf_counter_ns
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
 
-from schemas import OTProtocolFrame
+from schemas import OT_L2_PROTOCOLS, OTFlowSummary, OTProtocolFrame
 from .asset_manager import AssetManager
+from .baseline_store import CompiledBaseline
+from .metrics import LATENCY_BUCKETS_NS, Histogram
+from .protocols import WRITE_FUNCTION_CODES, is_response, is_write
+from .zones import ZoneTable
 
 
 @dataclass
@@ -21,6 +26,20 @@ class Alert:
 class Rule:
     name: str = "Rule"
     priority: int = 100
+    # Dispatch filters: the agent only calls evaluate() for matching frames
+    protocols: Optional[FrozenSet[str]] = None  # None: every protocol
+    writes_only: bool = False  # only write function codes (protocols.is_write)
+    requests_only: bool = False  # skip reply frames (protocols.is_response)
+    needs_func_code: bool = False
+
+    def applies_to(self, protocol: str, func_code: Optional[str]) -> bool:
+        if self.protocols is not None and protocol not in self.protocols:
+            return False
+        if self.needs_func_code and not func_code:
+            return False
+        if self.requests_only and is_response(func_code):
+            return False
+        return not self.writes_only or is_write(protocol, func_code)
 
     def evaluate(self, frame: OTProtocolFrame, agent: "OTTrackingAgent") -> Optional[Alert]:  # pragma: no cover
         return None
@@ -29,6 +48,7 @@ class Rule:
 class NewMasterRule(Rule):
     name = "NewMasterRule"
     priority = 10
+    protocols = frozenset({"modbus", "dnp3"})
 
     def evaluate(self, frame: OTProtocolFrame, agent: "OTTrackingAgent") -> Optional[Alert]:
         if frame.protocol not in {"modbus", "dnp3"}:
@@ -48,13 +68,15 @@ class NewMasterRule(Rule):
 class UnknownFunctionCodeRule(Rule):
     name = "UnknownFunctionCodeRule"
     priority = 20
+    needs_func_code = True
+    requests_only = True  # the baseline holds request function codes
 
     def evaluate(self, frame: OTProtocolFrame, agent: "OTTrackingAgent") -> Optional[Alert]:
-        baseline = agent.baseline.get((frame.src_ip, frame.dst_ip, frame.protocol))
-        if not baseline:
+        baseline = agent.baseline.lookup(frame.src_ip, frame.dst_ip, frame.protocol)
+        if baseline is None:
             return None
         func = frame.func_code
-        if func and func not in baseline.get("function_codes", set()):
+        if func and not baseline.allows_function(func):
             return Alert(
                 severity="medium",
                 rule=self.name,
@@ -67,22 +89,21 @@ class UnknownFunctionCodeRule(Rule):
 class OffScheduleWriteRule(Rule):
     name = "OffScheduleWriteRule"
     priority = 30
-
-    WRITE_FUNCS = {"5", "6", "15", "16"}
+    protocols = frozenset(WRITE_FUNCTION_CODES)
+    writes_only = True
 
     def evaluate(self, frame: OTProtocolFrame, agent: "OTTrackingAgent") -> Optional[Alert]:
-        if frame.protocol != "modbus" or not frame.func_code:
+        if not is_write(frame.protocol, frame.func_code):
             return None
-        if frame.func_code not in self.WRITE_FUNCS:
-            return None
-        stats = agent.asset_manager.flows.get((frame.src_ip, frame.dst_ip, frame.protocol))
+        stats = agent.asset_manager.flow(frame.src_ip, frame.dst_ip, frame.protocol)
         if not stats:
             return None
         period = stats.typical_period_seconds()
         if period is None:
             return None
-        # If write occurs outside 2x normal polling period, raise
-        last_ts = stats.timestamps[-1] if stats.timestamps else None
+        # If write occurs outside 2x normal polling period, raise. stats
+        # already include this frame, so compare with the flow's previous one
+        last_ts = agent.flow_last_seen
         if last_ts is None:
             return None
         delta = (frame.timestamp - last_ts).total_seconds()
@@ -90,8 +111,8 @@ class OffScheduleWriteRule(Rule):
             return Alert(
                 severity="medium",
                 rule=self.name,
-                message="Off-schedule Modbus write detected",
-                details={"src": frame.src_ip, "dst": frame.dst_ip, "func": frame.func_code, "delta_s": delta, "period_s": period},
+                message=f"Off-schedule {frame.protocol} write detected",
+                details={"src": frame.src_ip, "dst": frame.dst_ip, "protocol": frame.protocol, "func": frame.func_code, "delta_s": delta, "period_s": period},
             )
         return None
 
@@ -138,11 +159,25 @@ class UnauthorizedZonalFlowRule(Rule):
         )
 
 
+class RuleStats:
+    """Evaluations, alerts and latency (ns) of one rule."""
+
+    __slots__ = ("calls", "hits", "latency")
+
+    def __init__(self):
+        self.calls = 0
+        self.hits = 0
+        self.latency = Histogram(LATENCY_BUCKETS_NS)
+
+
 class OTTrackingAgent:
     def __init__(self, logger: Optional[logging.Logger] = None):
         self.logger = logger or logging.getLogger(self.__class__.__name__)
         self.asset_manager = AssetManager(logger=self.logger)
-        self.rules: List[Rule] = [
+        self.rule_stats: Dict[str, RuleStats] = {}
+        # (protocol, func_code) -> rules that apply, filled on first sight
+        self._dispatch: Dict[Tuple[str, Optional[str]], Tuple[Tuple[Rule, RuleStats], ...]] = {}
+        self.rules = [
             NewMasterRule(),
             UnknownFunctionCodeRule(),
             OffScheduleWriteRule(),
@@ -150,33 +185,78 @@ class OTTrackingAgent:
             UnauthorizedZonalFlowRule(),
         ]
         self.known_masters: Set[str] = set()
-        self.baseline: Dict[Tuple[str, str, str], Dict[str, Set[str]]] = {}
+        # When the current frame's flow was seen before it, for timing rules
+        self.flow_last_seen: Optional[datetime] = None
+        self.baseline = CompiledBaseline()
         self.zone_config: Dict[str, List[str]] = {}
+        self.zones = ZoneTable({})
         self.allowed_zone_pairs: Set[Tuple[str, str]] = set()
 
+    @property
+    def rules(self) -> Tuple[Rule, ...]:
+        return self._rules
+
+    @rules.setter
+    def rules(self, rules: Sequence[Rule]) -> None:
+        self._rules = tuple(rules)
+        for rule in self._rules:
+            self.rule_stats.setdefault(rule.name, RuleStats())
+        self._dispatch = {}
+
+    def add_rule(self, rule: Rule) -> None:
+        self.rules = (*self._rules, rule)
+
+    def _rules_for(self, protocol: str, func_code: Optional[str]) -> Tuple[Tuple[Rule, RuleStats], ...]:
+        key = (protocol, func_code)
+        entry = self._dispatch.get(key)
+        if entry is None:
+            if len(self._dispatch) >= 4096:
+                self._dispatch = {}
+            stats = self.rule_stats
+            entry = self._dispatch[key] = tuple((r, stats[r.name]) for r in self._rules if r.applies_to(protocol, func_code))
+        return entry
+
     def load_baseline(self, rows: Iterable[Tuple[str, str, str, List[str]]]) -> None:
-        for src, dst, protocol, funcs in rows:
-            self.baseline[(src, dst, protocol)] = {"function_codes": set(funcs)}
+        """Replace the baseline with (src, dst, protocol, function_codes[, address_ranges[, period]]) rows."""
+        self.swap_baseline(CompiledBaseline.from_rows(rows))
+
+    def swap_baseline(self, baseline: CompiledBaseline) -> None:
+        # One reference assignment: concurrent rule evaluation sees the old or the new index, never a mix
+        self.baseline = baseline
 
     def ingest_frame(self, frame: OTProtocolFrame) -> List[Alert]:
         alerts: List[Alert] = []
         # Update assets
-        self.asset_manager.ingest(None, frame.src_ip, None, frame.dst_ip, frame.protocol, frame.func_code, frame.addr, frame.timestamp)
-        # Evaluate rules
-        for rule in self.rules:
+        if frame.protocol in OT_L2_PROTOCOLS:
+            self.flow_last_seen = self.asset_manager.ingest(frame.src_ip, None, frame.dst_ip, None, frame.protocol, frame.func_code, frame.addr, frame.timestamp)
+        else:
+            self.flow_last_seen = self.asset_manager.ingest(None, frame.src_ip, None, frame.dst_ip, frame.protocol, frame.func_code, frame.addr, frame.timestamp)
+        # Evaluate the rules that apply to this protocol and function code
+        for rule, stats in self._rules_for(frame.protocol, frame.func_code):
+            start = perf_counter_ns()
             alert = rule.evaluate(frame, self)
+            stats.latency.observe(perf_counter_ns() - start)
+            stats.calls += 1
             if alert:
+                stats.hits += 1
                 alerts.append(alert)
         return alerts
 
+    def ingest_summary(self, summary: OTFlowSummary) -> None:
+        """Update assets and flow cadence from a collector summary.
+
+        Rules are not evaluated: the collector forwards the first frame of
+        every request shape, writes and off-cadence arrivals individually.
+        """
+        period = summary.interval_mean_ms / 1000.0 if summary.interval_mean_ms else None
+        self.asset_manager.ingest_summary(summary.src_ip, summary.dst_ip, summary.protocol, summary.func_code,
+                                          summary.addr_start, summary.addr_end, summary.last_seen, period)
+
     def load_zones(self, zones: Dict[str, Any], allowed: List[Dict[str, str]]) -> None:
         self.zone_config = {z["name"]: z["cidrs"] for z in zones.get("zones", [])} if isinstance(zones, dict) else zones
+        self.zones = ZoneTable(self.zone_config)
         self.allowed_zone_pairs = {(f["src_zone"], f["dst_zone"]) for f in allowed}
 
     def zone_of(self, ip: str) -> Optional[str]:
-        import ipaddress
-        for zone_name, cidrs in self.zone_config.items():
-            for cidr in cidrs:
-                if ipaddress.ip_address(ip) in ipaddress.ip_network(cidr):
-                    return zone_name
-        return None
+        """Most specific zone containing ``ip`` (None for unzoned hosts and MACs)."""
+        return self.zones.lookup(ip)
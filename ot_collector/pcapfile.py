@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import gzip
+import logging
+import mmap
+import shutil
+import struct
+import tempfile
+from typing import IO, Iterator, List, Optional, Tuple
+
+# Offline capture reader: memory-maps classic pcap and pcapng files and
+# yields (capture timestamp, zero-copy packet view) pairs. Gzip-compressed
+# captures are inflated once into an anonymous temporary file and mapped.
+
+LINKTYPE_ETHERNET = 1
+
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1e-6),
+    b"\xa1\xb2\xc3\xd4": (">", 1e-6),
+    b"\x4d\x3c\xb2\xa1": ("<", 1e-9),
+    b"\xa1\xb2\x3c\x4d": (">", 1e-9),
+}
+PCAPNG_SHB = b"\x0a\x0d\x0d\x0a"
+GZIP_MAGIC = b"\x1f\x8b"
+
+# pcapng block types
+SHB = 0x0A0D0D0A
+IDB = 1
+PB = 2
+SPB = 3
+EPB = 6
+IF_TSRESOL = 9
+
+
+class CaptureFile:
+    """Memory-mapped pcap/pcapng (optionally gzip) capture.
+
+    ``packets()`` yields ``(timestamp, memoryview)`` for every Ethernet
+    packet; views point into the mapping and stay valid until ``close()``.
+    Packets from non-Ethernet interfaces are counted in ``skipped``.
+    """
+
+    def __init__(self, path: str, logger: Optional[logging.Logger] = None):
+        self.path = path
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.size = 0
+        self.skipped = 0
+        self._file: Optional[IO[bytes]] = None
+        self._map: Optional[mmap.mmap] = None
+
+    def __enter__(self) -> "CaptureFile":
+        self.open()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def open(self) -> None:
+        f = open(self.path, "rb")
+        if f.read(2) == GZIP_MAGIC:
+            f.close()
+            f = tempfile.TemporaryFile()
+            with gzip.open(self.path, "rb") as src:
+                shutil.copyfileobj(src, f, 1 << 20)
+            f.flush()
+        f.seek(0, 2)
+        self.size = f.tell()
+        self._file = f
+        if self.size:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self) -> None:
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # a caller still holds a packet view
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def packets(self) -> Iterator[Tuple[float, memoryview]]:
+        if self._file is None:
+            raise RuntimeError("capture is not open")
+        if self._map is None:
+            return
+        buf = memoryview(self._map)
+        try:
+            magic = bytes(buf[:4])
+            if magic in PCAP_MAGIC:
+                yield from self._pcap(buf, *PCAP_MAGIC[magic])
+            elif magic == PCAPNG_SHB:
+                yield from self._pcapng(buf)
+            else:
+                raise ValueError(f"{self.path}: not a pcap or pcapng file")
+        finally:
+            buf.release()
+
+    def _pcap(self, buf: memoryview, endian: str, unit: float) -> Iterator[Tuple[float, memoryview]]:
+        linktype = struct.unpack_from(endian + "I", buf, 20)[0] & 0x0FFFFFFF
+        if linktype != LINKTYPE_ETHERNET:
+            raise ValueError(f"{self.path}: unsupported link type {linktype}")
+        record = struct.Struct(endian + "IIII")
+        off, end = 24, len(buf)
+        while off + 16 <= end:
+            sec, frac, caplen, _origlen = record.unpack_from(buf, off)
+            off += 16
+            if off + caplen > end:
+                self.logger.warning("%s: truncated record at offset %d", self.path, off - 16)
+                return
+            yield sec + frac * unit, buf[off:off + caplen]
+            off += caplen
+
+    def _pcapng(self, buf: memoryview) -> Iterator[Tuple[float, memoryview]]:
+        off, end = 0, len(buf)
+        endian = "<"
+        # Per section: interface id -> (linktype, timestamp unit)
+        interfaces: List[Tuple[int, float]] = []
+        while off + 12 <= end:
+            if bytes(buf[off:off + 4]) == PCAPNG_SHB:
+                bom = bytes(buf[off + 8:off + 12])
+                endian = "<" if bom == b"\x4d\x3c\x2b\x1a" else ">"
+                interfaces = []
+            block_type, block_len = struct.unpack_from(endian + "II", buf, off)
+            if block_len < 12 or off + block_len > end:
+                self.logger.warning("%s: truncated block at offset %d", self.path, off)
+                return
+            body = off + 8
+            if block_type == IDB:
+                linktype = struct.unpack_from(endian + "H", buf, body)[0]
+                interfaces.append((linktype, self._tsresol(buf, body + 8, off + block_len - 4, endian)))
+            elif block_type in (EPB, PB):
+                if block_type == EPB:
+                    iface, ts_hi, ts_lo, caplen, _origlen = struct.unpack_from(endian + "IIIII", buf, body)
+                else:
+                    iface, _drops, ts_hi, ts_lo, caplen, _origlen = struct.unpack_from(endian + "HHIIII", buf, body)
+                data = body + 20
+                if iface >= len(interfaces) or interfaces[iface][0] != LINKTYPE_ETHERNET:
+                    self.skipped += 1
+                else:
+                    yield ((ts_hi << 32) | ts_lo) * interfaces[iface][1], buf[data:data + caplen]
+            elif block_type == SPB:
+                # No timestamp and implicitly interface 0
+                if interfaces and interfaces[0][0] == LINKTYPE_ETHERNET:
+                    origlen = struct.unpack_from(endian + "I", buf, body)[0]
+                    caplen = min(origlen, block_len - 16)
+                    yield 0.0, buf[body + 4:body + 4 + caplen]
+                else:
+                    self.skipped += 1
+            off += block_len
+
+    @staticmethod
+    def _tsresol(buf: memoryview, off: int, end: int, endian: str) -> float:
+        opt = struct.Struct(endian + "HH")
+        while off + 4 <= end:
+            code, length = opt.unpack_from(buf, off)
+            if code == 0:
+                break
+            if code == IF_TSRESOL and length >= 1:
+                v = buf[off + 4]
+                return 2.0 ** -(v & 0x7F) if v & 0x80 else 10.0 ** -v
+            off += 4 + ((length + 3) & ~3)
+        return 1e-6
+
@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from confluent_kafka import Producer as ConfluentProducer
+except Exception:  # pragma: no cover - optional dependency
+    ConfluentProducer = None  # type: ignore
+
+try:
+    import yaml  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    yaml = None  # type: ignore
+
+# Producer settings recommended by kafka_topics.yaml (kafka_defaults), in
+# librdkafka property names. Idempotence keeps per-partition order under
+# retries with acks=all.
+DEFAULT_SETTINGS: Dict[str, Any] = {
+    "acks": "all",
+    "compression.type": "zstd",
+    "linger.ms": 10,
+    "batch.size": 32768,
+    "message.max.bytes": 1048576,
+    "enable.idempotence": True,
+    # Retry for as long as the broker is away instead of expiring queued
+    # messages (default 300 s): expired messages could only be handed back
+    # behind newer data, so an outage would reorder the stream. A full
+    # local queue still raises BufferError for BufferingProducer to hold.
+    "message.timeout.ms": 0,
+}
+
+_YAML_KEYS = {
+    "acks": "acks",
+    "compression_type": "compression.type",
+    "linger_ms": "linger.ms",
+    "batch_size": "batch.size",
+    "max_message_bytes": "message.max.bytes",
+}
+
+
+def load_producer_settings(path: Optional[str] = None) -> Dict[str, Any]:
+    """DEFAULT_SETTINGS overlaid with ``kafka_defaults`` from kafka_topics.yaml, if readable."""
+    settings = dict(DEFAULT_SETTINGS)
+    path = path or os.getenv("KAFKA_TOPICS_PATH", "kafka_topics.yaml")
+    if yaml is None or not os.path.exists(path):
+        return settings
+    with open(path) as f:
+        defaults = (yaml.safe_load(f) or {}).get("kafka_defaults", {})
+    for name, prop in _YAML_KEYS.items():
+        if name in defaults:
+            settings[prop] = defaults[name]
+    return settings
+
+
+class KafkaProducer:
+    """Asynchronous Kafka producer for collector frames.
+
+    ``produce`` only enqueues into the client's local queue; a background
+    thread polls for delivery reports, so the capture path never waits on
+    the network. When the local queue is full ``produce`` raises
+    ``BufferError`` (counted as ``queue_full``) so a wrapper such as
+    BufferingProducer can hold the message; messages whose delivery fails
+    are passed to ``on_failed(key, value, headers)`` when it is set.
+    ``client`` may be any object with the confluent-kafka Producer
+    interface, e.g. LocalProducerClient.
+    """
+
+    def __init__(
+        self,
+        brokers: str,
+        topic: str,
+        logger: Optional[logging.Logger] = None,
+        settings: Optional[Dict[str, Any]] = None,
+        client: Any = None,
+        poll_interval: float = 0.1,
+    ):
+        self.brokers = brokers
+        self.topic = topic
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.settings = {**load_producer_settings(), **(settings or {})}
+        if client is None:
+            if ConfluentProducer is None:
+                raise RuntimeError("confluent-kafka is required for KafkaProducer")
+            client = ConfluentProducer({"bootstrap.servers": brokers, **self.settings})
+        self._client = client
+        self.poll_interval = poll_interval
+        self.counters: Dict[str, int] = {"produced": 0, "delivered": 0, "failed": 0, "queue_full": 0}
+        self.on_failed: Optional[Callable[[Optional[str], bytes, Any], None]] = None
+        self._stop = threading.Event()
+        self._poller = threading.Thread(target=self._poll_loop, name="kafka-poll", daemon=True)
+        self._poller.start()
+
+    @property
+    def in_flight(self) -> int:
+        return self.counters["produced"] - self.counters["delivered"] - self.counters["failed"]
+
+    def produce(self, key: str, value, headers: Optional[List[Tuple[str, bytes]]] = None) -> None:
+        if isinstance(value, str):
+            value = value.encode()
+        try:
+            self._client.produce(self.topic, value=value, key=key, headers=headers, on_delivery=self._on_delivery)
+        except BufferError:
+            # Serve delivery reports once to free queue space, then give up
+            self._client.poll(0)
+            try:
+                self._client.produce(self.topic, value=value, key=key, headers=headers, on_delivery=self._on_delivery)
+            except BufferError:
+                self.counters["queue_full"] += 1
+                raise
+        self.counters["produced"] += 1
+
+    def _on_delivery(self, err, msg) -> None:
+        if err is not None:
+            self.counters["failed"] += 1
+            self.logger.warning("Delivery failed for key=%s: %s", msg.key() if msg is not None else None, err)
+            if self.on_failed is not None and msg is not None:
+                key = msg.key()
+                self.on_failed(key.decode() if isinstance(key, bytes) else key, msg.value(), msg.headers())
+        else:
+            self.counters["delivered"] += 1
+
+    def _poll_loop(self) -> None:
+        while not self._stop.is_set():
+            self._client.poll(self.poll_interval)
+
+    def flush(self, timeout: float = 30.0) -> int:
+        """Wait for outstanding deliveries; returns the number still queued."""
+        remaining = self._client.flush(timeout)
+        if remaining:
+            self.logger.warning("%d messages still queued after flush", remaining)
+        return remaining
+
+    def close(self, timeout: float = 30.0) -> None:
+        self.flush(timeout)
+        self._stop.set()
+        self._poller.join()
+
+
+class LocalMessage:
+    """Delivered message, shaped like confluent_kafka.Message."""
+
+    __slots__ = ("_topic", "_partition", "_offset", "_key", "_value", "_headers")
+
+    def __init__(self, topic: str, partition: int, offset: int, key: Optional[bytes], value: bytes,
+                 headers: Optional[List[Tuple[str, bytes]]] = None):
+        self._topic = topic
+        self._partition = partition
+        self._offset = offset
+        self._key = key
+        self._value = value
+        self._headers = headers
+
+    def topic(self) -> str:
+        return self._topic
+
+    def partition(self) -> int:
+        return self._partition
+
+    def offset(self) -> int:
+        return self._offset
+
+    def key(self) -> Optional[bytes]:
+        return self._key
+
+    def value(self) -> bytes:
+        return self._value
+
+    def headers(self) -> Optional[List[Tuple[str, bytes]]]:
+        return self._headers
+
+    def error(self) -> None:
+        return None
+
+
+class LocalBroker:
+    """In-memory broker: per-topic partition logs plus a record of batches.
+
+    Set ``available = False`` to make deliveries fail.
+    """
+
+    def __init__(self, partitions: int = 24):
+        self.partitions = partitions
+        self.available = True
+        self.logs: Dict[Tuple[str, int], List[LocalMessage]] = {}
+        self.batches: List[int] = []  # messages per appended batch
+
+    def partition_for(self, key: Optional[bytes]) -> int:
+        return zlib.crc32(key or b"") % self.partitions
+
+    def append(self, topic: str, partition: int, messages: List[Tuple[Optional[bytes], bytes, Any]]) -> List[LocalMessage]:
+        log = self.logs.setdefault((topic, partition), [])
+        out = [LocalMessage(topic, partition, len(log) + i, k, v, h) for i, (k, v, h) in enumerate(messages)]
+        log.extend(out)
+        self.batches.append(len(out))
+        return out
+
+    def messages(self, topic: str) -> List[LocalMessage]:
+        out: List[LocalMessage] = []
+        for (t, _p), log in sorted(self.logs.items()):
+            if t == topic:
+                out.extend(log)
+        return out
+
+
+class _Batch:
+    __slots__ = ("created", "size", "messages", "callbacks")
+
+    def __init__(self, created: float):
+        self.created = created
+        self.size = 0
+        self.messages: List[Tuple[Optional[bytes], bytes, Any]] = []
+        self.callbacks: List[Optional[Callable]] = []
+
+
+class LocalProducerClient:
+    """Stand-in for confluent_kafka.Producer backed by a LocalBroker.
+
+    Batches per partition like librdkafka: a batch is sent when it reaches
+    ``batch.size`` bytes or is ``linger.ms`` old. Delivery callbacks run
+    from ``poll``/``flush``. ``queue.buffering.max.messages`` bounds the
+    local queue; beyond it ``produce`` raises BufferError.
+    """
+
+    def __init__(self, broker: LocalBroker, config: Optional[Dict[str, Any]] = None):
+        config = {**DEFAULT_SETTINGS, **(config or {})}
+        self.broker = broker
+        self.linger = float(config.get("linger.ms", 10)) / 1000.0
+        self.batch_size = int(config.get("batch.size", 32768))
+        self.max_queued = int(config.get("queue.buffering.max.messages", 100000))
+        self._open: Dict[Tuple[str, int], _Batch] = {}
+        self._ready: List[Tuple[str, int, _Batch]] = []
+        self._queued = 0
+        self._lock = threading.Lock()
+        self._delivery_lock = threading.Lock()  # one deliverer at a time keeps batch order
+
+    def __len__(self) -> int:
+        return self._queued
+
+    def produce(self, topic: str, value: Optional[bytes] = None, key: Optional[bytes] = None,
+                headers: Optional[List[Tuple[str, bytes]]] = None, on_delivery: Optional[Callable] = None, **kwargs) -> None:
+        if isinstance(key, str):
+            key = key.encode()
+        value = value or b""
+        with self._lock:
+            if self._queued >= self.max_queued:
+                raise BufferError("Local: Queue full")
+            partition = self.broker.partition_for(key)
+            batch = self._open.get((topic, partition))
+            if batch is None:
+                batch = self._open[(topic, partition)] = _Batch(time.monotonic())
+            batch.messages.append((key, value, headers))
+            batch.callbacks.append(on_delivery)
+            batch.size += len(value) + len(key or b"")
+            self._queued += 1
+            if batch.size >= self.batch_size:
+                del self._open[(topic, partition)]
+                self._ready.append((topic, partition, batch))
+
+    def _seal(self, force: bool) -> None:
+        now = time.monotonic()
+        for tp, batch in list(self._open.items()):
+            if force or now - batch.created >= self.linger:
+                del self._open[tp]
+                self._ready.append((tp[0], tp[1], batch))
+
+    def _deliver(self) -> int:
+        with self._delivery_lock:
+            with self._lock:
+                ready, self._ready = self._ready, []
+            events = 0
+            for topic, partition, batch in ready:
+                events += self._deliver_batch(topic, partition, batch)
+            return events
+
+    def _deliver_batch(self, topic: str, partition: int, batch: _Batch) -> int:
+        with self._lock:
+            self._queued -= len(batch.messages)
+        if self.broker.available:
+            delivered = self.broker.append(topic, partition, batch.messages)
+            for cb, msg in zip(batch.callbacks, delivered):
+                if cb is not None:
+                    cb(None, msg)
+        else:
+            for cb, (key, value, headers) in zip(batch.callbacks, batch.messages):
+                if cb is not None:
+                    cb("Local: Broker transport failure", LocalMessage(topic, partition, -1, key, value, headers))
+        return len(batch.messages)
+
+    def poll(self, timeout: float = 0.0) -> int:
+        with self._lock:
+            self._seal(force=False)
+        events = self._deliver()
+        if not events and timeout:
+            time.sleep(min(timeout, self.linger or timeout))
+        return events
+
+    def flush(self, timeout: float = -1) -> int:
+        with self._lock:
+            self._seal(force=True)
+        self._deliver()
+        return self._queued
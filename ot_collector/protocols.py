@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+from typing import Dict, FrozenSet, Optional
+
+# Per-protocol function codes (as emitted in OTProtocolFrame.func_code) that
+# change process state. Shared by the OT rules and asset role inference.
+
+WRITE_FUNCTION_CODES: Dict[str, FrozenSet[str]] = {
+    # Write single/multiple coils and registers, mask write, read/write multiple
+    "modbus": frozenset({"5", "6", "15", "16", "22", "23"}),
+    # Write, select, operate, direct operate (with and without ack)
+    "dnp3": frozenset({"2", "3", "4", "5", "6"}),
+    # C_SC/C_DC/C_RC/C_SE/C_BO, with and without time tag
+    "iec104": frozenset(str(t) for t in (*range(45, 52), *range(58, 65))),
+}
+
+
+# Replies paired with their request (Modbus) carry the request's function
+# code with this suffix, so they never count as a write or as a poll.
+RESPONSE_SUFFIX = "/rsp"
+
+
+def is_response(func_code: Optional[str]) -> bool:
+    return func_code is not None and func_code.endswith(RESPONSE_SUFFIX)
+
+
+def is_write(protocol: str, func_code: Optional[str]) -> bool:
+    if func_code is None:
+        return False
+    codes = WRITE_FUNCTION_CODES.get(protocol)
+    return codes is not None and str(func_code) in codes
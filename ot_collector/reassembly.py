@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import logging
+from typing import Callable, Dict, List, Optional, Union
+
+# Per-flow TCP stream reassembly for the OT dissectors. Each direction of a
+# connection is its own byte stream; complete protocol frames are cut out of
+# it using the protocol's length field, so ADUs split across segments are
+# joined and pipelined ADUs in one segment are all delivered.
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+# A framer returns the total length of the frame starting at ``off``,
+# 0 if more bytes are needed to tell, or -1 if ``off`` is not a frame start.
+
+
+def modbus_frame_len(buf: Buffer, off: int, end: int) -> int:
+    # MBAP: transaction id (2), protocol id (2) == 0, length (2) of unit id + PDU
+    if end - off < 6:
+        return 0
+    if buf[off + 2] or buf[off + 3]:
+        return -1
+    length = (buf[off + 4] << 8) | buf[off + 5]
+    if length < 2 or length > 254:
+        return -1
+    return 6 + length
+
+
+def iec104_frame_len(buf: Buffer, off: int, end: int) -> int:
+    # APCI: start byte 0x68, length of control field + ASDU (4..253)
+    if end - off < 2:
+        return 0
+    if buf[off] != 0x68 or not 4 <= buf[off + 1] <= 253:
+        return -1
+    return 2 + buf[off + 1]
+
+
+def dnp3_frame_len(buf: Buffer, off: int, end: int) -> int:
+    # Link header: 0x05 0x64, LEN counts ctrl+dst+src (5) + user data; the
+    # 8-byte header and every 16-byte data block carry a 2-byte CRC.
+    if end - off < 3:
+        return 0
+    if buf[off] != 0x05 or buf[off + 1] != 0x64 or buf[off + 2] < 5:
+        return -1
+    data = buf[off + 2] - 5
+    return 10 + data + 2 * ((data + 15) // 16)
+
+
+def tpkt_frame_len(buf: Buffer, off: int, end: int) -> int:
+    # TPKT (RFC 1006): version 3, reserved 0, 16-bit total length
+    if end - off < 4:
+        return 0
+    if buf[off] != 0x03 or buf[off + 1] != 0x00:
+        return -1
+    length = (buf[off + 2] << 8) | buf[off + 3]
+    return length if length >= 7 else -1
+
+
+FRAMERS: Dict[str, Callable[[Buffer, int, int], int]] = {
+    "modbus": modbus_frame_len,
+    "iec104": iec104_frame_len,
+    "dnp3": dnp3_frame_len,
+    "iec61850": tpkt_frame_len,
+}
+
+# Byte patterns to resynchronise on after garbage; Modbus has none, so the
+# rest of the buffered data is dropped instead.
+SYNC_BYTES: Dict[str, bytes] = {
+    "iec104": b"\x68",
+    "dnp3": b"\x05\x64",
+    "iec61850": b"\x03\x00",
+}
+
+
+def flow_key(src: int, sport: int, dst: int, dport: int) -> int:
+    """Pack a directional IPv4/TCP 4-tuple into one int (smaller than a tuple)."""
+    return (src << 64) | (dst << 32) | (sport << 16) | dport
+
+
+class _Flow:
+    __slots__ = ("next_seq", "buf", "last_seen")
+
+    def __init__(self, next_seq: int, last_seen: float):
+        self.next_seq = next_seq
+        self.buf: Optional[bytearray] = None
+        self.last_seen = last_seen
+
+
+class StreamReassembler:
+    """Bounded reassembly of OT TCP streams into complete protocol frames.
+
+    Flows are kept in least-recently-used order. Idle flows are evicted after
+    ``idle_timeout`` seconds of capture time, a flow whose pending bytes exceed
+    ``max_flow_bytes`` is reset, and the oldest flows are evicted while total
+    pending bytes exceed ``max_total_bytes`` or the flow count exceeds
+    ``max_flows``. Sequence gaps (capture loss) reset the flow's buffer.
+    """
+
+    def __init__(
+        self,
+        max_flow_bytes: int = 65536,
+        max_total_bytes: int = 64 * 1024 * 1024,
+        max_flows: int = 250_000,
+        idle_timeout: float = 300.0,
+        sweep_interval: float = 1.0,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.max_flow_bytes = max_flow_bytes
+        self.max_total_bytes = max_total_bytes
+        self.max_flows = max_flows
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self._flows: Dict[int, _Flow] = {}
+        self.buffered_bytes = 0
+        self._last_sweep = 0.0
+        self.counters: Dict[str, int] = {
+            "frames": 0,
+            "gaps": 0,
+            "resyncs": 0,
+            "overflows": 0,
+            "evicted_idle": 0,
+            "evicted_pressure": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._flows)
+
+    def feed(self, key: int, protocol: str, seq: int, flags: int, payload: Buffer, ts: float) -> List[Buffer]:
+        """Add one segment and return the complete frames it finishes, in order.
+
+        Frames that lie entirely within ``payload`` are returned as zero-copy
+        slices of it; frames joined from several segments are new bytes.
+        """
+        flows = self._flows
+        if ts - self._last_sweep >= self.sweep_interval:
+            self._last_sweep = ts
+            self._evict_idle(ts)
+
+        flow = flows.pop(key, None)
+        if flags & TCP_RST:
+            if flow is not None:
+                self._drop_buffer(flow)
+            return []
+        if flow is None:
+            flow = _Flow(seq, ts)
+            if len(flows) >= self.max_flows:
+                self._evict_oldest()
+        if flags & TCP_SYN:
+            # New connection, possibly on a reused 4-tuple: start afresh
+            self._drop_buffer(flow)
+            flow.next_seq = (seq + 1) & 0xFFFFFFFF
+            seq = flow.next_seq
+        flows[key] = flow  # re-insert: dict order doubles as LRU order
+        flow.last_seen = ts
+
+        size = len(payload)
+        diff = (seq - flow.next_seq) & 0xFFFFFFFF
+        if diff:
+            if diff >= 0x80000000:
+                # Retransmission or overlap: keep only bytes not yet seen
+                overlap = 0x100000000 - diff
+                if overlap >= size:
+                    return []
+                payload = payload[overlap:]
+                size -= overlap
+            else:
+                # Missing bytes; whatever was pending can no longer complete
+                self.counters["gaps"] += 1
+                self._drop_buffer(flow)
+                flow.next_seq = seq
+        flow.next_seq = (flow.next_seq + size) & 0xFFFFFFFF
+
+        frames: List[Buffer] = []
+        if size:
+            framer = FRAMERS[protocol]
+            buf = flow.buf
+            if buf is None:
+                off = self._cut(protocol, framer, payload, frames, copy=False)
+                if off < size:
+                    flow.buf = bytearray(payload[off:])
+                    self.buffered_bytes += size - off
+            else:
+                buf += payload
+                self.buffered_bytes += size
+                off = self._cut(protocol, framer, buf, frames, copy=True)
+                if off:
+                    del buf[:off]
+                    self.buffered_bytes -= off
+                if not buf:
+                    flow.buf = None
+            if flow.buf is not None and len(flow.buf) > self.max_flow_bytes:
+                self.counters["overflows"] += 1
+                self._drop_buffer(flow)
+            if self.buffered_bytes > self.max_total_bytes:
+                self._evict_for_memory(key)
+            self.counters["frames"] += len(frames)
+
+        if flags & TCP_FIN:
+            del flows[key]
+            self._drop_buffer(flow)
+        return frames
+
+    def _cut(self, protocol: str, framer: Callable[[Buffer, int, int], int], data: Buffer, frames: List[Buffer], copy: bool) -> int:
+        """Append complete frames from ``data`` and return where the incomplete tail starts."""
+        end = len(data)
+        off = 0
+        while off < end:
+            length = framer(data, off, end)
+            if length < 0:
+                self.counters["resyncs"] += 1
+                off = self._resync(protocol, data, off + 1, end)
+                continue
+            if length == 0 or off + length > end:
+                return off
+            frames.append(bytes(data[off:off + length]) if copy else data[off:off + length])
+            off += length
+        return end
+
+    @staticmethod
+    def _resync(protocol: str, data: Buffer, start: int, end: int) -> int:
+        sync = SYNC_BYTES.get(protocol)
+        if sync is None:
+            return end
+        if isinstance(data, memoryview):
+            pos = bytes(data[start:end]).find(sync)
+            return end if pos < 0 else start + pos
+        pos = data.find(sync, start)
+        return end if pos < 0 else pos
+
+    def _drop_buffer(self, flow: _Flow) -> None:
+        if flow.buf is not None:
+            self.buffered_bytes -= len(flow.buf)
+            flow.buf = None
+
+    def _evict_oldest(self) -> None:
+        key = next(iter(self._flows))
+        self._drop_buffer(self._flows.pop(key))
+        self.counters["evicted_pressure"] += 1
+
+    def _evict_idle(self, now: float) -> None:
+        flows = self._flows
+        cutoff = now - self.idle_timeout
+        while flows:
+            key = next(iter(flows))
+            flow = flows[key]
+            if flow.last_seen >= cutoff:
+                break
+            del flows[key]
+            self._drop_buffer(flow)
+            self.counters["evicted_idle"] += 1
+
+    def _evict_for_memory(self, keep: int) -> None:
+        flows = self._flows
+        while self.buffered_bytes > self.max_total_bytes and len(flows) > 1:
+            key = next(iter(flows))
+            if key == keep:
+                break
+            self._drop_buffer(flows.pop(key))
+            self.counters["evicted_pressure"] += 1
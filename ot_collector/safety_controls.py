@@ -3,9 +3,21 @@ from __future__ import annotations
 import json
 import logging
 import os
+import threading
 import time
+from collections import deque
 from dataclasses import dataclass
-from typing import Callable, Optional
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from .spill import SpillQueue
+
+try:
+    from confluent_kafka import KafkaException
+except Exception:  # pragma: no cover - optional dependency
+    KafkaException = None  # type: ignore
+
+# Errors meaning "Kafka cannot take this right now": keep the message and retry
+_UNAVAILABLE: Tuple[type, ...] = (BufferError,) if KafkaException is None else (BufferError, KafkaException)
 
 
 class KillSwitch:
@@ -26,31 +38,154 @@ class ReadOnlyEnforcer:
 
 
 class BufferingProducer:
-    def __init__(self, producer, logger: Optional[logging.Logger] = None, max_buffer: int = 10000):
+    """Holds messages the producer cannot take and replays them in order.
+
+    Memory (up to ``max_buffer`` messages) is the fast tier; with
+    ``spill_dir`` set, overflow goes to a disk SpillQueue instead of being
+    dropped. While anything is held, new messages queue behind it so
+    ordering is preserved. Held messages are replayed, memory first, at up
+    to ``replay_rate`` messages/s from ``produce`` and ``flush``. Producers
+    exposing ``on_failed`` (KafkaProducer) also hand back messages whose
+    delivery failed; those are older than anything held, so they go back
+    in front of it.
+    """
+
+    def __init__(
+        self,
+        producer,
+        logger: Optional[logging.Logger] = None,
+        max_buffer: int = 10000,
+        spill_dir: Optional[str] = None,
+        spill_max_bytes: int = 1 << 30,
+        spill_segment_bytes: int = 16 << 20,
+        replay_rate: float = 5000.0,
+    ):
         self.producer = producer
-        self.buffer = []
+        self.buffer: Deque[Tuple[str, Any, Any]] = deque()
         self.max_buffer = max_buffer
         self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.spill = SpillQueue(spill_dir, spill_segment_bytes, spill_max_bytes, logger=self.logger) if spill_dir else None
+        self.replay_rate = replay_rate
+        self.counters: Dict[str, int] = {"buffered": 0, "spilled": 0, "replayed": 0, "requeued": 0, "dropped": 0}
+        self._tokens = replay_rate
+        self._refilled = time.monotonic()
+        self._lock = threading.RLock()
+        # Failed deliveries arrive on the producer's poll thread; they are
+        # parked here and requeued on the next produce/flush
+        self._failed: Deque[Tuple[str, Any, Any]] = deque()
+        if hasattr(producer, "on_failed"):
+            producer.on_failed = lambda key, value, headers: self._failed.append((key, value, headers))
+
+    def backlog(self) -> int:
+        return len(self.buffer) + (len(self.spill) if self.spill is not None else 0) + len(self._failed)
+
+    def produce(self, key: str, value: str, headers=None) -> None:
+        with self._lock:
+            self._requeue_failed()
+            if self.backlog():
+                self._hold(key, value, headers)
+                self._replay()
+                return
+            try:
+                self.producer.produce(key, value, headers=headers)
+            except Exception:
+                self.logger.warning("Kafka unavailable; buffering messages")
+                self._hold(key, value, headers)
 
-    def produce(self, key: str, value: str) -> None:
+    def _hold(self, key, value, headers) -> None:
+        spilled = self.spill is not None and len(self.spill) > 0
+        if not spilled and len(self.buffer) < self.max_buffer:
+            self.buffer.append((key, value, headers))
+            self.counters["buffered"] += 1
+        elif self.spill is not None:
+            self.spill.append(_as_bytes(key), _as_bytes(value), headers)
+            self.counters["spilled"] += 1
+        else:
+            self.counters["dropped"] += 1
+            if self.counters["dropped"] == 1 or self.counters["dropped"] % 10000 == 0:
+                self.logger.error("Buffer full; dropped %d messages", self.counters["dropped"])
+
+    def _requeue_failed(self) -> None:
+        # The memory tier is replayed before the spill, so its head is the front of the line
+        batch = []
+        while self._failed:
+            batch.append(self._failed.popleft())
+        if batch:
+            self.buffer.extendleft(reversed(batch))
+            self.counters["requeued"] += len(batch)
+
+    def _replay(self, unthrottled: bool = False) -> int:
+        now = time.monotonic()
+        self._tokens = min(self.replay_rate, self._tokens + (now - self._refilled) * self.replay_rate)
+        self._refilled = now
+        budget = float("inf") if unthrottled else self._tokens
+        sent = 0
         try:
-            self.producer.produce(key, value)
+            while self.buffer and budget - sent >= 1:
+                key, value, headers = self.buffer[0]
+                self.producer.produce(key, value, headers=headers)
+                self.buffer.popleft()
+                sent += 1
+            while not self.buffer and self.spill is not None and len(self.spill) and budget - sent >= 1:
+                records = self.spill.read(int(min(budget - sent, 512)))
+                done = 0
+                try:
+                    for key, value, headers in records:
+                        self.producer.produce(key.decode() if key is not None else None, value, headers=headers)
+                        done += 1
+                finally:
+                    self.spill.commit(done)
+                    sent += done
+        except _UNAVAILABLE:
+            pass  # still unavailable; keep the rest for the next attempt
         except Exception:
-            if len(self.buffer) < self.max_buffer:
-                self.buffer.append((key, value))
-                self.logger.warning("Kafka unavailable; buffering message. size=%s", len(self.buffer))
-            else:
-                self.logger.error("Buffer full; dropping message")
+            self.logger.exception("Replay failed; %d messages still held", self.backlog())
+        if not unthrottled:
+            self._tokens -= sent
+        self.counters["replayed"] += sent
+        return sent
 
     def flush(self) -> None:
-        # Attempt to resend buffered messages
-        remaining = []
-        for key, value in self.buffer:
-            try:
-                self.producer.produce(key, value)
-            except Exception:
-                remaining.append((key, value))
-        self.buffer = remaining
+        """Replay what the rate allows, then flush the underlying producer."""
+        with self._lock:
+            self._requeue_failed()
+            self._replay()
+        if hasattr(self.producer, "flush"):
+            self.producer.flush()
+
+    def close(self, timeout: float = 30.0) -> None:
+        """Replay everything held, ignoring the rate limit, for up to ``timeout`` seconds, then close.
+
+        Spilled messages left over stay on disk for the next run; anything
+        still in memory is lost and logged.
+        """
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                self._requeue_failed()
+                sent = self._replay(unthrottled=True)
+                if not self.backlog() or time.monotonic() >= deadline:
+                    break
+                # Let the client deliver what it has queued before trying again
+                if hasattr(self.producer, "flush"):
+                    self.producer.flush()
+                if not sent:
+                    time.sleep(min(0.1, max(deadline - time.monotonic(), 0.0)))
+            self._requeue_failed()
+            if self.buffer:
+                self.counters["dropped"] += len(self.buffer)
+                self.logger.error("Closing with %d undelivered messages in memory; they are lost", len(self.buffer))
+                self.buffer.clear()
+            if self.spill is not None and len(self.spill):
+                self.logger.warning("Closing with %d messages spilled to disk; they are replayed on the next start", len(self.spill))
+        if hasattr(self.producer, "close"):
+            self.producer.close()
+        if self.spill is not None:
+            self.spill.close()
+
+
+def _as_bytes(value) -> Optional[bytes]:
+    return value.encode() if isinstance(value, str) else value
 
 
 class AlertRamp:
@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import logging
+import mmap
+import os
+import struct
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+# Disk-backed FIFO of Kafka messages for broker outages. Messages are
+# appended to fixed-size, memory-mapped segment files; each record is
+#   length (u32) | crc32 of body (u32) | body
+# and a zero length marks the end of written data in a segment. Body:
+#   key length (u16) | header count (u8) | key | headers | value
+# with each header as name length (u8) | value length (u16) | name | value.
+# The read position is kept in an offset file replaced atomically, so after
+# a crash reading resumes at the last committed record (at-least-once).
+
+Record = Tuple[Optional[bytes], bytes, Optional[List[Tuple[str, bytes]]]]
+
+_REC = struct.Struct("<II")
+_BODY = struct.Struct("<HB")
+_HDR = struct.Struct("<BH")
+_OFFSET = struct.Struct("<QQI")  # segment, position, crc32 of the first 16 bytes
+
+SEGMENT_SUFFIX = ".seg"
+OFFSET_FILE = "offset"
+
+
+def encode_record(key: Optional[bytes], value: bytes, headers: Optional[List[Tuple[str, bytes]]] = None) -> bytes:
+    parts = [_BODY.pack(0xFFFF if key is None else len(key), len(headers or ()))]
+    if key is not None:
+        parts.append(key)
+    for name, hval in headers or ():
+        raw = name.encode()
+        parts.append(_HDR.pack(len(raw), len(hval)) + raw + hval)
+    parts.append(value)
+    body = b"".join(parts)
+    return _REC.pack(len(body), zlib.crc32(body)) + body
+
+
+def decode_body(body) -> Record:
+    klen, nhdr = _BODY.unpack_from(body, 0)
+    off = _BODY.size
+    key = None
+    if klen != 0xFFFF:
+        key = bytes(body[off:off + klen])
+        off += klen
+    headers = []
+    for _ in range(nhdr):
+        nlen, vlen = _HDR.unpack_from(body, off)
+        off += _HDR.size
+        headers.append((bytes(body[off:off + nlen]).decode(), bytes(body[off + nlen:off + nlen + vlen])))
+        off += nlen + vlen
+    return key, bytes(body[off:]), headers or None
+
+
+class _Segment:
+    __slots__ = ("seq", "path", "file", "map", "end")
+
+    def __init__(self, directory: str, seq: int, size: int):
+        self.seq = seq
+        self.path = os.path.join(directory, f"{seq:020d}{SEGMENT_SUFFIX}")
+        new = not os.path.exists(self.path)
+        self.file = open(self.path, "r+b" if not new else "w+b")
+        if new or os.fstat(self.file.fileno()).st_size < size:
+            self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.end = 0
+
+    def scan(self, start: int = 0) -> Tuple[int, int]:
+        """Find the end of valid data from ``start``; returns (end, records)."""
+        buf, off, n, count = self.map, start, len(self.map), 0
+        while off + _REC.size <= n:
+            length, crc = _REC.unpack_from(buf, off)
+            body = off + _REC.size
+            if length == 0 or body + length > n or zlib.crc32(buf[body:body + length]) != crc:
+                break
+            off = body + length
+            count += 1
+        return off, count
+
+    def close(self) -> None:
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+
+class SpillQueue:
+    """Bounded on-disk FIFO of Kafka messages in memory-mapped segments.
+
+    ``read(n)`` returns up to n records from the committed position without
+    consuming them; ``commit(k)`` consumes the first k of them and persists
+    the position. Fully consumed segments are deleted. When the directory
+    would exceed ``max_bytes`` the oldest segment is dropped (counted in
+    ``counters["dropped"]``) so the newest data survives a long outage.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = 16 << 20,
+        max_bytes: int = 1 << 30,
+        fsync: bool = False,
+        logger: Optional[logging.Logger] = None,
+    ):
+        if max_bytes < 2 * segment_bytes:
+            raise ValueError("max_bytes must hold at least two segments")
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.counters: Dict[str, int] = {"appended": 0, "committed": 0, "dropped": 0, "dropped_segments": 0}
+        self._segments: List[_Segment] = []
+        self._read = (0, 0)  # (segment seq, position)
+        self._records = 0
+        self._pending: List[Tuple[int, int]] = []  # position after each record handed out by read()
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    def __len__(self) -> int:
+        return self._records
+
+    def _recover(self) -> None:
+        seqs = sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX))
+        read_seq, read_pos = self._load_offset()
+        for seq in seqs:
+            if seq < read_seq:
+                os.unlink(os.path.join(self.directory, f"{seq:020d}{SEGMENT_SUFFIX}"))
+                continue
+            segment = _Segment(self.directory, seq, self.segment_bytes)
+            start = read_pos if seq == read_seq else 0
+            segment.end, count = segment.scan(start)
+            if start:
+                segment.end = max(segment.end, start)
+            self._records += count
+            self._segments.append(segment)
+        if self._segments:
+            # Clear anything after the last valid record (a torn write) before appending
+            last = self._segments[-1]
+            last.map[last.end:] = bytes(len(last.map) - last.end)
+            first = self._segments[0]
+            self._read = (first.seq, read_pos if first.seq == read_seq else 0)
+            if self._records:
+                self.logger.info("Recovered %d spilled messages in %d segments", self._records, len(self._segments))
+        else:
+            self._read = (read_seq, 0)
+
+    def _load_offset(self) -> Tuple[int, int]:
+        try:
+            with open(os.path.join(self.directory, OFFSET_FILE), "rb") as f:
+                seq, pos, crc = _OFFSET.unpack(f.read(_OFFSET.size))
+        except (OSError, struct.error):
+            return 0, 0
+        if zlib.crc32(struct.pack("<QQ", seq, pos)) != crc:
+            self.logger.warning("Ignoring corrupt spill offset file in %s", self.directory)
+            return 0, 0
+        return seq, pos
+
+    def _store_offset(self) -> None:
+        seq, pos = self._read
+        path = os.path.join(self.directory, OFFSET_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_OFFSET.pack(seq, pos, zlib.crc32(struct.pack("<QQ", seq, pos))))
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def append(self, key: Optional[bytes], value: bytes, headers: Optional[List[Tuple[str, bytes]]] = None) -> None:
+        record = encode_record(key, value, headers)
+        if len(record) + _REC.size > self.segment_bytes:
+            raise ValueError(f"message of {len(record)} bytes does not fit a {self.segment_bytes} byte segment")
+        segment = self._segments[-1] if self._segments else None
+        if segment is None or segment.end + len(record) + _REC.size > self.segment_bytes:
+            segment = self._roll()
+        segment.map[segment.end:segment.end + len(record)] = record
+        segment.end += len(record)
+        self._records += 1
+        self.counters["appended"] += 1
+
+    def _roll(self) -> _Segment:
+        if self._segments:
+            last = self._segments[-1]
+            last.map.flush()
+            if self.fsync:
+                os.fsync(last.file.fileno())
+        seq = self._segments[-1].seq + 1 if self._segments else self._read[0]
+        while self._segments and (len(self._segments) + 1) * self.segment_bytes > self.max_bytes:
+            self._drop_oldest()
+        segment = _Segment(self.directory, seq, self.segment_bytes)
+        self._segments.append(segment)
+        return segment
+
+    def _drop_oldest(self) -> None:
+        oldest = self._segments.pop(0)
+        start = self._read[1] if self._read[0] == oldest.seq else 0
+        lost = oldest.scan(start)[1]
+        oldest.close()
+        os.unlink(oldest.path)
+        self._records -= lost
+        self.counters["dropped"] += lost
+        self.counters["dropped_segments"] += 1
+        self._pending = []
+        self._read = (self._segments[0].seq if self._segments else oldest.seq + 1, 0)
+        self._store_offset()
+        self.logger.error("Spill queue full (%d bytes); dropped %d oldest messages", self.max_bytes, lost)
+
+    def read(self, n: int) -> List[Record]:
+        records: List[Record] = []
+        self._pending = []
+        seq, pos = self._read
+        for segment in self._segments:
+            if segment.seq < seq:
+                continue
+            if segment.seq > seq:
+                pos = 0
+            buf = segment.map
+            while len(records) < n and pos < segment.end:
+                length, _crc = _REC.unpack_from(buf, pos)
+                if length == 0:
+                    break
+                body = pos + _REC.size
+                records.append(decode_body(buf[body:body + length]))
+                pos = body + length
+                self._pending.append((segment.seq, pos))
+            if len(records) >= n:
+                break
+        return records
+
+    def commit(self, count: int) -> None:
+        """Consume the first ``count`` records returned by the last read()."""
+        count = min(count, len(self._pending))  # a dropped segment invalidates the read
+        if count <= 0:
+            return
+        self._read = self._pending[count - 1]
+        self._pending = []
+        self._records -= count
+        self.counters["committed"] += count
+        # Delete fully consumed segments; the last one is still being written
+        while len(self._segments) > 1:
+            first = self._segments[0]
+            if first.seq == self._read[0] and self._read[1] < first.end:
+                break
+            self._segments.pop(0)
+            first.close()
+            os.unlink(first.path)
+            if self._read[0] == first.seq:
+                self._read = (self._segments[0].seq, 0)
+        self._store_offset()
+
+    def close(self) -> None:
+        for segment in self._segments:
+            segment.close()
+        self._segments = []
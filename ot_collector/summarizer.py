@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import math
+from typing import Dict, List, Optional, Tuple
+
+from schemas import OT_L2_PROTOCOLS, OTFlowSummary, OTProtocolFrame
+
+from .protocols import is_write
+
+# Edge-side summarisation of SCADA polling. The frames one packet produced
+# are grouped into request shapes (protocol, src, dst, func_code, address
+# range); a steady shape is counted instead of forwarded and reported once
+# per interval as an OTFlowSummary. Writes, the first sighting of a shape
+# and arrivals that break its usual cadence are forwarded unchanged.
+
+ShapeKey = Tuple[str, str, str, str, Optional[int], Optional[int]]
+
+
+class _Shape:
+    __slots__ = (
+        "last_ts", "mean", "var", "samples",
+        "window_start", "count", "frames", "first", "last",
+        "iats", "iat_mean", "iat_m2", "iat_min", "iat_max", "latency_sum", "latency_n",
+    )
+
+    def __init__(self, ts: float):
+        # Long-run cadence (EWMA of inter-arrival time and its variance)
+        self.last_ts = ts
+        self.mean = 0.0
+        self.var = 0.0
+        self.samples = 0
+        self._reset(ts)
+
+    def _reset(self, ts: float) -> None:
+        self.window_start = ts
+        self.count = 0
+        self.frames = 0
+        self.first = None
+        self.last = None
+        self.iats = 0
+        self.iat_mean = 0.0
+        self.iat_m2 = 0.0
+        self.iat_min = math.inf
+        self.iat_max = 0.0
+        self.latency_sum = 0.0
+        self.latency_n = 0
+
+
+class FlowSummarizer:
+    """Aggregate repetitive polling into one OTFlowSummary per shape per interval.
+
+    An arrival is off-cadence once ``min_samples`` intervals are known and
+    it deviates from the running mean by more than both ``sigmas``
+    standard deviations and ``tolerance`` of the mean. Shapes idle for
+    ``idle_timeout`` seconds are closed and forgotten, so their next
+    arrival is forwarded as new.
+    """
+
+    def __init__(
+        self,
+        interval: float = 10.0,
+        min_samples: int = 8,
+        tolerance: float = 0.5,
+        sigmas: float = 4.0,
+        alpha: float = 0.1,
+        max_shapes: int = 65536,
+        idle_timeout: Optional[float] = None,
+    ):
+        self.interval = interval
+        self.min_samples = min_samples
+        self.tolerance = tolerance
+        self.sigmas = sigmas
+        self.alpha = alpha
+        self.max_shapes = max_shapes
+        self.idle_timeout = idle_timeout if idle_timeout is not None else 6 * interval
+        self._shapes: Dict[ShapeKey, _Shape] = {}
+        self._last_sweep = 0.0
+        self.counters: Dict[str, int] = {
+            "observations": 0,
+            "summarised": 0,
+            "forwarded_new": 0,
+            "forwarded_writes": 0,
+            "forwarded_timing": 0,
+            "forwarded_l2": 0,
+            "summaries": 0,
+            "evicted": 0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._shapes)
+
+    def observe(self, frames: List[OTProtocolFrame], ts: float) -> Tuple[List[OTProtocolFrame], List[OTFlowSummary]]:
+        """Take the frames of one packet; return (frames to forward now, closed summaries)."""
+        counters = self.counters
+        forward: List[OTProtocolFrame] = []
+        summaries: List[OTFlowSummary] = []
+        groups: Dict[Tuple[str, str, str, str], List[OTProtocolFrame]] = {}
+        for frame in frames:
+            groups.setdefault((frame.protocol, frame.src_ip, frame.dst_ip, frame.func_code), []).append(frame)
+        for (protocol, src, dst, func_code), group in groups.items():
+            counters["observations"] += 1
+            if protocol in OT_L2_PROTOCOLS:
+                # GOOSE is already event-driven and SV already summarised
+                counters["forwarded_l2"] += 1
+                forward += group
+                continue
+            if is_write(protocol, func_code):
+                counters["forwarded_writes"] += 1
+                forward += group
+                continue
+            addrs = [f.addr for f in group if f.addr is not None]
+            key = (protocol, src, dst, func_code, min(addrs) if addrs else None, max(addrs) if addrs else None)
+            shape = self._shapes.get(key)
+            if shape is None:
+                if len(self._shapes) >= self.max_shapes:
+                    oldest = next(iter(self._shapes))
+                    self._close(oldest, self._shapes.pop(oldest), summaries)
+                    counters["evicted"] += 1
+                self._shapes[key] = _Shape(ts)
+                counters["forwarded_new"] += 1
+                forward += group
+                continue
+            if self._arrival(shape, ts):
+                counters["forwarded_timing"] += 1
+                forward += group
+            else:
+                counters["summarised"] += 1
+                shape.count += 1
+                shape.frames += len(group)
+                if shape.first is None:
+                    shape.first = group[0].timestamp
+                shape.last = group[0].timestamp
+                for f in group:
+                    if f.latency_ms is not None:
+                        shape.latency_sum += f.latency_ms
+                        shape.latency_n += 1
+            if ts - shape.window_start >= self.interval:
+                self._close(key, shape, summaries)
+                shape._reset(ts)
+        if ts - self._last_sweep >= self.interval:
+            summaries += self.flush(ts)
+        return forward, summaries
+
+    def _arrival(self, shape: _Shape, ts: float) -> bool:
+        """Update cadence and window stats; True if the arrival is off-cadence."""
+        iat = ts - shape.last_ts
+        shape.last_ts = ts
+        off = (
+            shape.samples >= self.min_samples
+            and abs(iat - shape.mean) > max(self.sigmas * math.sqrt(shape.var), self.tolerance * shape.mean)
+        )
+        if shape.samples == 0:
+            shape.mean = iat
+        else:
+            diff = iat - shape.mean
+            shape.mean += self.alpha * diff
+            shape.var = (1 - self.alpha) * (shape.var + self.alpha * diff * diff)
+        shape.samples += 1
+        # Welford over the window
+        shape.iats += 1
+        delta = iat - shape.iat_mean
+        shape.iat_mean += delta / shape.iats
+        shape.iat_m2 += delta * (iat - shape.iat_mean)
+        shape.iat_min = min(shape.iat_min, iat)
+        shape.iat_max = max(shape.iat_max, iat)
+        return off
+
+    def _close(self, key: ShapeKey, shape: _Shape, summaries: List[OTFlowSummary]) -> None:
+        if not shape.count:
+            return
+        protocol, src, dst, func_code, lo, hi = key
+        iats = shape.iats
+        summaries.append(OTFlowSummary(
+            protocol=protocol,
+            src_ip=src,
+            dst_ip=dst,
+            func_code=func_code,
+            addr_start=lo,
+            addr_end=hi,
+            count=shape.count,
+            frames=shape.frames,
+            first_seen=shape.first,
+            last_seen=shape.last,
+            interval_mean_ms=shape.iat_mean * 1000.0 if iats else None,
+            interval_min_ms=shape.iat_min * 1000.0 if iats else None,
+            interval_max_ms=shape.iat_max * 1000.0 if iats else None,
+            interval_stddev_ms=math.sqrt(shape.iat_m2 / iats) * 1000.0 if iats else None,
+            latency_mean_ms=shape.latency_sum / shape.latency_n if shape.latency_n else None,
+        ))
+        self.counters["summaries"] += 1
+
+    def flush(self, ts: float, force: bool = False) -> List[OTFlowSummary]:
+        """Close windows older than the interval (all with ``force``) and drop idle shapes."""
+        self._last_sweep = ts
+        summaries: List[OTFlowSummary] = []
+        idle: List[ShapeKey] = []
+        for key, shape in self._shapes.items():
+            if force or ts - shape.window_start >= self.interval:
+                self._close(key, shape, summaries)
+                shape._reset(ts)
+            if ts - shape.last_ts >= self.idle_timeout:
+                idle.append(key)
+        for key in idle:
+            del self._shapes[key]
+        return summaries
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing as mp
+import os
+import queue
+import signal
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .capture import DEFAULT_RING_BYTES
+from .metrics import collector_metrics
+from .ot_collector import OTCollector
+from .safety_controls import BufferingProducer
+
+# Worker-pool mode: N collector processes, each with its own dissector state
+# and producer. Flows are pinned to one worker (kernel PACKET_FANOUT hash for
+# live capture, symmetric flow hash over the pcap otherwise), which keeps
+# per-flow ordering while spreading dissection across cores.
+
+
+def _worker_main(
+    index: int,
+    count: int,
+    interface: str,
+    pcap_path: Optional[str],
+    fanout_group: int,
+    producer_factory: Callable[[], Any],
+    reports: "mp.Queue[Dict[str, Any]]",
+    report_interval: float,
+    spill_dir: Optional[str] = None,
+    spill_max_bytes: int = 1 << 30,
+    ring_bytes: int = DEFAULT_RING_BYTES,
+) -> None:
+    logger = logging.getLogger(f"OTCollector[{index}]")
+    producer = producer_factory()
+    if spill_dir:
+        # One spill directory per worker: each replays only its own flows, in order
+        producer = BufferingProducer(producer, logger=logger, spill_dir=os.path.join(spill_dir, f"worker-{index}"),
+                                     spill_max_bytes=spill_max_bytes)
+    if pcap_path:
+        collector = OTCollector(interface, producer, logger=logger, shard=(index, count))
+    else:
+        collector = OTCollector(interface, producer, logger=logger, fanout_group=fanout_group, ring_bytes=ring_bytes)
+    signal.signal(signal.SIGTERM, lambda *_: collector.stop())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent coordinates shutdown
+
+    done = threading.Event()
+    metrics = collector_metrics(collector)
+
+    def report(finished: bool) -> None:
+        reports.put({"worker": index, "done": finished, **collector.counters, "metrics": metrics.collect()})
+
+    def report_loop() -> None:
+        while not done.wait(report_interval):
+            report(False)
+
+    reporter = threading.Thread(target=report_loop, daemon=True)
+    reporter.start()
+    try:
+        if pcap_path:
+            collector.run_pcap(pcap_path)
+        else:
+            collector.run_live()
+    finally:
+        done.set()
+        if hasattr(producer, "close"):
+            producer.close()
+        else:
+            producer.flush()
+        report(True)
+
+
+class CollectorPool:
+    """Runs ``workers`` collector processes and aggregates their counters.
+
+    With ``spill_dir`` each worker wraps its producer in a BufferingProducer
+    spilling to ``<spill_dir>/worker-<index>``. ``spill_max_bytes`` and the
+    live capture ``ring_bytes`` are totals, split evenly across workers.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        interface: str,
+        producer_factory: Callable[[], Any],
+        pcap_path: Optional[str] = None,
+        report_interval: float = 10.0,
+        spill_dir: Optional[str] = None,
+        spill_max_bytes: int = 1 << 30,
+        ring_bytes: int = DEFAULT_RING_BYTES,
+        logger: Optional[logging.Logger] = None,
+    ):
+        self.workers = workers
+        self.interface = interface
+        self.producer_factory = producer_factory
+        self.pcap_path = pcap_path
+        self.report_interval = report_interval
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+        self.ring_bytes = ring_bytes
+        self.logger = logger or logging.getLogger(self.__class__.__name__)
+        self.latest: Dict[int, Dict[str, Any]] = {}
+        self._procs: List[mp.Process] = []
+
+    def totals(self) -> Dict[str, int]:
+        totals: Dict[str, int] = {}
+        for snapshot in self.latest.values():
+            for name, value in snapshot.items():
+                if name not in ("worker", "done", "metrics"):
+                    totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def stop(self) -> None:
+        for proc in self._procs:
+            if proc.is_alive():
+                proc.terminate()  # SIGTERM -> collector.stop()
+
+    def run(self) -> Dict[str, int]:
+        reports: "mp.Queue[Dict[str, Any]]" = mp.Queue()
+        fanout_group = os.getpid() & 0xFFFF
+        for index in range(self.workers):
+            proc = mp.Process(
+                target=_worker_main,
+                name=f"ot-collector-{index}",
+                args=(index, self.workers, self.interface, self.pcap_path, fanout_group,
+                      self.producer_factory, reports, self.report_interval,
+                      self.spill_dir, self.spill_max_bytes // self.workers, self.ring_bytes // self.workers),
+                daemon=True,
+            )
+            proc.start()
+            self._procs.append(proc)
+
+        finished = set()
+        last_log = time.monotonic()
+        try:
+            while len(finished) < self.workers:
+                try:
+                    snapshot = reports.get(timeout=1.0)
+                except queue.Empty:
+                    if not any(p.is_alive() for p in self._procs):
+                        break
+                    continue
+                self.latest[snapshot["worker"]] = snapshot
+                if snapshot["done"]:
+                    finished.add(snapshot["worker"])
+                if time.monotonic() - last_log >= self.report_interval:
+                    last_log = time.monotonic()
+                    self.logger.info("collector pool (%d workers): %s", self.workers, self.totals())
+        except KeyboardInterrupt:
+            self.logger.info("Stopping collector pool")
+            self.stop()
+            # Collect the final snapshots the workers send on the way out.
+            deadline = time.monotonic() + 5.0
+            while len(finished) < self.workers and time.monotonic() < deadline:
+                try:
+                    snapshot = reports.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                self.latest[snapshot["worker"]] = snapshot
+                if snapshot["done"]:
+                    finished.add(snapshot["worker"])
+        finally:
+            for proc in self._procs:
+                proc.join(timeout=5.0)
+        totals = self.totals()
+        self.logger.info("collector pool finished: %s", totals)
+        return totals
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import ipaddress
+import socket
+import struct
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+# Network zones compiled into longest-prefix-match interval tables. CIDRs are
+# either nested or disjoint, so a sweep over them sorted by (start, prefix
+# length) flattens them into non-overlapping ranges each labelled with its
+# most specific zone. A lookup is one bisect over the range starts; results
+# per address string are cached since a site has few distinct hosts.
+
+_U32 = struct.Struct("!I")
+
+
+class _Table:
+    __slots__ = ("starts", "zones")
+
+    def __init__(self, networks: List[Tuple[int, int, int, int, str]]):
+        # networks: (start, prefixlen, -order, end, zone); identical CIDRs keep the first zone listed
+        starts: List[int] = []
+        zones: List[Optional[str]] = []
+
+        def mark(start: int, zone: Optional[str]) -> None:
+            if starts and starts[-1] == start:
+                zones[-1] = zone
+            else:
+                starts.append(start)
+                zones.append(zone)
+
+        stack: List[Tuple[int, str]] = []  # (end, zone) of enclosing networks
+        for start, _plen, _order, end, zone in sorted(networks):
+            while stack and stack[-1][0] < start:
+                top_end = stack.pop()[0]
+                mark(top_end + 1, stack[-1][1] if stack else None)
+            mark(start, zone)
+            stack.append((end, zone))
+        while stack:
+            top_end = stack.pop()[0]
+            mark(top_end + 1, stack[-1][1] if stack else None)
+        # Merge neighbours that resolve to the same zone
+        self.starts: List[int] = []
+        self.zones: List[Optional[str]] = []
+        for start, zone in zip(starts, zones):
+            if not self.zones or self.zones[-1] != zone:
+                self.starts.append(start)
+                self.zones.append(zone)
+
+    def lookup(self, addr: int) -> Optional[str]:
+        i = bisect_right(self.starts, addr) - 1
+        return self.zones[i] if i >= 0 else None
+
+
+class ZoneTable:
+    """Longest-prefix-match of IP addresses to zone names.
+
+    ``zones`` maps a zone name to its CIDRs (IPv4 or IPv6). The most
+    specific CIDR wins regardless of zone order; for identical CIDRs the
+    first zone listed wins. Non-IP strings (MAC addresses of layer-2
+    frames) resolve to None.
+    """
+
+    def __init__(self, zones: Mapping[str, Iterable[str]], cache_size: int = 65536):
+        v4: List[Tuple[int, int, int, int, str]] = []
+        v6: List[Tuple[int, int, int, int, str]] = []
+        order = 0
+        for name, cidrs in zones.items():
+            for cidr in cidrs:
+                net = ipaddress.ip_network(cidr, strict=False)
+                start = int(net.network_address)
+                (v4 if net.version == 4 else v6).append((start, net.prefixlen, -order, start + net.num_addresses - 1, name))
+                order += 1
+        self.networks = order
+        self._v4 = _Table(v4)
+        self._v6 = _Table(v6)
+        self.cache_size = cache_size
+        self._cache: Dict[str, Optional[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._v4.starts) + len(self._v6.starts)
+
+    def lookup_int(self, addr: int, version: int = 4) -> Optional[str]:
+        return (self._v4 if version == 4 else self._v6).lookup(addr)
+
+    def lookup(self, ip: str) -> Optional[str]:
+        cache = self._cache
+        try:
+            return cache[ip]
+        except KeyError:
+            pass
+        try:
+            zone = self._v4.lookup(_U32.unpack(socket.inet_pton(socket.AF_INET, ip))[0]) if ":" not in ip else self._v6.lookup(int(ipaddress.IPv6Address(ip)))
+        except (OSError, ValueError):
+            zone = None  # MAC address or garbage
+        if len(cache) >= self.cache_size:
+            cache.clear()
+        cache[ip] = zone
+        return zone
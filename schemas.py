@@ -1,10 +1,13 @@
 from __future__ import annotations
 
 import json
+import socket
+import struct
+import sys
 from dataclasses import dataclass, field, asdict
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from ipaddress import ip_address
-from typing import Optional, Literal, Any, Dict
+from typing import Optional, Literal, Any, Dict, Iterable, List, Sequence, Tuple
 
 ISO8601_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
 
@@ -24,6 +27,13 @@ def _validate_ip(value: str) -> str:
     return value
 
 
+def _validate_mac(value: str) -> str:
+    parts = value.split(":") if isinstance(value, str) else []
+    if len(parts) != 6 or not all(len(p) == 2 and all(c in "0123456789abcdefABCDEF" for c in p) for p in parts):
+        raise ValueError(f"Invalid MAC address: {value}")
+    return value
+
+
 def _non_empty(value: str, field_name: str) -> str:
     if not isinstance(value, str) or not value.strip():
         raise ValueError(f"{field_name} must be a non-empty string")
@@ -245,9 +255,17 @@ class SignInFailed:
         )
 
 
+_new_object = object.__new__
+_intern = sys.intern
+
+OT_PROTOCOLS = {"modbus", "dnp3", "iec104", "iec61850", "goose", "sv", "opcua", "ethernetip"}
+# Layer-2 protocols carry MAC addresses in src_ip/dst_ip
+OT_L2_PROTOCOLS = {"goose", "sv"}
+
+
 @dataclass(frozen=True)
 class OTProtocolFrame:
-    protocol: Literal["modbus", "dnp3", "iec104", "opcua", "ethernetip"]
+    protocol: Literal["modbus", "dnp3", "iec104", "iec61850", "goose", "sv", "opcua", "ethernetip"]
     src_ip: str
     dst_ip: str
     func_code: str
@@ -255,17 +273,54 @@ class OTProtocolFrame:
     value: Optional[str]
     session_id: str
     timestamp: datetime
+    latency_ms: Optional[float] = None  # request/response round trip, on response frames
 
     def __post_init__(self):
-        if self.protocol not in {"modbus", "dnp3", "iec104", "opcua", "ethernetip"}:
+        if self.protocol not in OT_PROTOCOLS:
             raise ValueError("Unsupported protocol")
-        _validate_ip(self.src_ip)
-        _validate_ip(self.dst_ip)
+        validate = _validate_mac if self.protocol in OT_L2_PROTOCOLS else _validate_ip
+        validate(self.src_ip)
+        validate(self.dst_ip)
         _non_empty(self.func_code, "func_code")
         _non_empty(self.session_id, "session_id")
         if self.addr is not None and (not isinstance(self.addr, int) or self.addr < 0):
             raise ValueError("addr must be a non-negative integer if provided")
         _validate_timestamp(self.timestamp)
+        if self.latency_ms is not None and self.latency_ms < 0:
+            raise ValueError("latency_ms must be non-negative if provided")
+
+    @classmethod
+    def trusted(
+        cls,
+        protocol: str,
+        src_ip: str,
+        dst_ip: str,
+        func_code: str,
+        addr: Optional[int],
+        value: Optional[str],
+        session_id: str,
+        timestamp: datetime,
+        latency_ms: Optional[float] = None,
+    ) -> "OTProtocolFrame":
+        """Build a frame without validation, interning the endpoint and session strings.
+
+        For collector dissectors whose fields come from packed packet
+        addresses and numeric codes; anything from outside (JSON, the wire
+        format, configs) must go through the validating constructor.
+        """
+        frame = _new_object(cls)
+        frame.__dict__.update(
+            protocol=protocol,
+            src_ip=_intern(src_ip),
+            dst_ip=_intern(dst_ip),
+            func_code=func_code,
+            addr=addr,
+            value=value,
+            session_id=_intern(session_id),
+            timestamp=timestamp,
+            latency_ms=latency_ms,
+        )
+        return frame
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -278,6 +333,7 @@ class OTProtocolFrame:
             "value": self.value,
             "session_id": self.session_id,
             "timestamp": _ensure_iso8601(self.timestamp),
+            "latency_ms": self.latency_ms,
         }
 
     def to_json(self) -> str:
@@ -288,16 +344,310 @@ class OTProtocolFrame:
         payload = json.loads(data)
         return OTProtocolFrame(
             protocol=payload.get("protocol"),
-            src_ip=_validate_ip(payload.get("src_ip", "")),
-            dst_ip=_validate_ip(payload.get("dst_ip", "")),
+            src_ip=payload.get("src_ip", ""),
+            dst_ip=payload.get("dst_ip", ""),
             func_code=_non_empty(payload.get("func_code", ""), "func_code"),
             addr=payload.get("addr"),
             value=payload.get("value"),
             session_id=_non_empty(payload.get("session_id", ""), "session_id"),
             timestamp=datetime.fromisoformat(payload["timestamp"].replace("Z", "+00:00")),
+            latency_ms=payload.get("latency_ms"),
+        )
+
+
+@dataclass(frozen=True)
+class OTFlowSummary:
+    """Collector-side aggregate of repetitive polling for one request shape.
+
+    ``count`` observations (one per packet) of ``func_code`` over
+    ``addr_start``..``addr_end`` between ``first_seen`` and ``last_seen``
+    that were not forwarded as individual frames; ``frames`` is the number
+    of frames they expanded to. Interval stats are over all arrivals in
+    the window.
+    """
+
+    protocol: str
+    src_ip: str
+    dst_ip: str
+    func_code: str
+    addr_start: Optional[int]
+    addr_end: Optional[int]
+    count: int
+    frames: int
+    first_seen: datetime
+    last_seen: datetime
+    interval_mean_ms: Optional[float] = None
+    interval_min_ms: Optional[float] = None
+    interval_max_ms: Optional[float] = None
+    interval_stddev_ms: Optional[float] = None
+    latency_mean_ms: Optional[float] = None
+
+    def __post_init__(self):
+        if self.protocol not in OT_PROTOCOLS:
+            raise ValueError("Unsupported protocol")
+        validate = _validate_mac if self.protocol in OT_L2_PROTOCOLS else _validate_ip
+        validate(self.src_ip)
+        validate(self.dst_ip)
+        _non_empty(self.func_code, "func_code")
+        if not isinstance(self.count, int) or self.count < 1:
+            raise ValueError("count must be a positive integer")
+        if not isinstance(self.frames, int) or self.frames < self.count:
+            raise ValueError("frames must be an integer >= count")
+        _validate_timestamp(self.first_seen)
+        _validate_timestamp(self.last_seen)
+        if self.last_seen < self.first_seen:
+            raise ValueError("last_seen must not precede first_seen")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": "OTFlowSummary",
+            "protocol": self.protocol,
+            "src_ip": self.src_ip,
+            "dst_ip": self.dst_ip,
+            "func_code": self.func_code,
+            "addr_start": self.addr_start,
+            "addr_end": self.addr_end,
+            "count": self.count,
+            "frames": self.frames,
+            "first_seen": _ensure_iso8601(self.first_seen),
+            "last_seen": _ensure_iso8601(self.last_seen),
+            "interval_mean_ms": self.interval_mean_ms,
+            "interval_min_ms": self.interval_min_ms,
+            "interval_max_ms": self.interval_max_ms,
+            "interval_stddev_ms": self.interval_stddev_ms,
+            "latency_mean_ms": self.latency_mean_ms,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), separators=(",", ":"))
+
+    @staticmethod
+    def from_json(data: str) -> "OTFlowSummary":
+        payload = json.loads(data)
+        return OTFlowSummary(
+            protocol=payload.get("protocol"),
+            src_ip=payload.get("src_ip", ""),
+            dst_ip=payload.get("dst_ip", ""),
+            func_code=_non_empty(payload.get("func_code", ""), "func_code"),
+            addr_start=payload.get("addr_start"),
+            addr_end=payload.get("addr_end"),
+            count=int(payload.get("count", 0)),
+            frames=int(payload.get("frames", 0)),
+            first_seen=datetime.fromisoformat(payload["first_seen"].replace("Z", "+00:00")),
+            last_seen=datetime.fromisoformat(payload["last_seen"].replace("Z", "+00:00")),
+            interval_mean_ms=payload.get("interval_mean_ms"),
+            interval_min_ms=payload.get("interval_min_ms"),
+            interval_max_ms=payload.get("interval_max_ms"),
+            interval_stddev_ms=payload.get("interval_stddev_ms"),
+            latency_mean_ms=payload.get("latency_mean_ms"),
         )
 
 
+# Compact binary encoding of OTProtocolFrame for the high-volume frame topic.
+# A message is a batch: version byte, varint frame count, then per frame
+#   protocol id (1), flags (1), timestamp (int64 epoch ns, LE),
+#   src/dst (4+4 IPv4, 16+16 IPv6 or 6+6 MAC), func_code (varint len + utf-8),
+#   then if flagged: addr (varint), value (varint len + utf-8),
+#   session_id (varint len + utf-8), latency_ms (float64 LE).
+# The session is omitted when it is the default "src->dst".
+# Producers tag messages with a content-type header so consumers can pick the
+# decoder; JSON (to_json) stays available for debugging.
+
+WIRE_VERSION = 1
+CONTENT_TYPE_HEADER = "content-type"
+CONTENT_TYPE_JSON = "application/json"
+CONTENT_TYPE_BINARY = "application/vnd.ot-frame.v1"
+CONTENT_TYPE_SUMMARY = "application/vnd.ot-flow-summary+json"
+
+PROTOCOL_IDS = {"modbus": 1, "dnp3": 2, "iec104": 3, "iec61850": 4, "goose": 5, "sv": 6, "opcua": 7, "ethernetip": 8}
+_PROTOCOL_NAMES = {v: k for k, v in PROTOCOL_IDS.items()}
+
+_F_ADDR = 0x01
+_F_VALUE = 0x02
+_F_SESSION = 0x04  # explicit session_id (otherwise "src->dst")
+_F_LATENCY = 0x08
+_F_IPV6 = 0x10
+_F_MAC = 0x20
+
+_HEAD = struct.Struct("<BBq")
+_F64 = struct.Struct("<d")
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_US = timedelta(microseconds=1)
+
+# Frames repeat a small set of endpoints; cache text <-> packed IP forms
+_PACK_CACHE: Dict[str, Tuple[int, bytes]] = {}
+_UNPACK_CACHE: Dict[Tuple[int, bytes], str] = {}
+_CACHE_LIMIT = 65536
+
+
+def _pack_ip(value: str) -> Tuple[int, bytes]:
+    hit = _PACK_CACHE.get(value)
+    if hit is None:
+        if ":" in value:
+            hit = (_F_IPV6, socket.inet_pton(socket.AF_INET6, value))
+        else:
+            hit = (0, socket.inet_pton(socket.AF_INET, value))
+        if len(_PACK_CACHE) >= _CACHE_LIMIT:
+            _PACK_CACHE.clear()
+        _PACK_CACHE[value] = hit
+    return hit
+
+
+def _unpack_addr(kind: int, raw: bytes) -> str:
+    key = (kind, raw)
+    hit = _UNPACK_CACHE.get(key)
+    if hit is None:
+        if kind == _F_MAC:
+            hit = ":".join(f"{b:02x}" for b in raw)
+        else:
+            hit = socket.inet_ntop(socket.AF_INET6 if kind == _F_IPV6 else socket.AF_INET, raw)
+        if len(_UNPACK_CACHE) >= _CACHE_LIMIT:
+            _UNPACK_CACHE.clear()
+        _UNPACK_CACHE[key] = hit
+    return hit
+
+
+_ADDR_LEN = {0: 4, _F_IPV6: 16, _F_MAC: 6}
+
+
+def _put_varint(out: bytearray, n: int) -> None:
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _get_varint(buf, off: int) -> Tuple[int, int]:
+    n = shift = 0
+    while True:
+        b = buf[off]
+        off += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, off
+        shift += 7
+
+
+def _put_str(out: bytearray, s: str) -> None:
+    raw = s.encode()
+    _put_varint(out, len(raw))
+    out += raw
+
+
+def _get_str(buf, off: int) -> Tuple[str, int]:
+    n, off = _get_varint(buf, off)
+    end = off + n
+    if end > len(buf):
+        raise IndexError("string runs past the end of the message")
+    return str(buf[off:end], "utf-8"), end
+
+
+def _epoch_ns(dt: datetime) -> int:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)  # naive timestamps are UTC
+    return (dt - _EPOCH) // _US * 1000
+
+
+def encode_frames(frames: Sequence["OTProtocolFrame"]) -> bytes:
+    """Encode frames into one binary batch message."""
+    out = bytearray((WIRE_VERSION,))
+    _put_varint(out, len(frames))
+    head = _HEAD.pack
+    for f in frames:
+        if f.protocol in OT_L2_PROTOCOLS:
+            kind, src, dst = _F_MAC, bytes.fromhex(f.src_ip.replace(":", "")), bytes.fromhex(f.dst_ip.replace(":", ""))
+        else:
+            kind, src = _pack_ip(f.src_ip)
+            dst_kind, dst = _pack_ip(f.dst_ip)
+            if dst_kind != kind:
+                raise ValueError("src_ip and dst_ip must be the same address family")
+        flags = kind
+        if f.addr is not None:
+            flags |= _F_ADDR
+        if f.value is not None:
+            flags |= _F_VALUE
+        if f.session_id != f"{f.src_ip}->{f.dst_ip}":
+            flags |= _F_SESSION
+        if f.latency_ms is not None:
+            flags |= _F_LATENCY
+        out += head(PROTOCOL_IDS[f.protocol], flags, _epoch_ns(f.timestamp))
+        out += src
+        out += dst
+        _put_str(out, f.func_code)
+        if flags & _F_ADDR:
+            _put_varint(out, f.addr)
+        if flags & _F_VALUE:
+            _put_str(out, f.value)
+        if flags & _F_SESSION:
+            _put_str(out, f.session_id)
+        if flags & _F_LATENCY:
+            out += _F64.pack(f.latency_ms)
+    return bytes(out)
+
+
+def decode_frames(data: bytes) -> List["OTProtocolFrame"]:
+    """Decode a binary batch message; frames are validated like any external input.
+
+    Any malformed input, including a truncated batch, raises ValueError.
+    """
+    buf = memoryview(data)
+    if not len(buf) or buf[0] != WIRE_VERSION:
+        raise ValueError(f"Unsupported OT frame wire version: {buf[0] if len(buf) else None}")
+    try:
+        count, off = _get_varint(buf, 1)
+        if count > len(buf) - off:  # every frame takes well over a byte
+            raise ValueError(f"OT frame batch claims {count} frames in {len(buf) - off} bytes")
+        frames: List[OTProtocolFrame] = []
+        head = _HEAD.unpack_from
+        for _ in range(count):
+            proto, flags, ns = head(buf, off)
+            off += _HEAD.size
+            kind = flags & (_F_IPV6 | _F_MAC)
+            n = _ADDR_LEN[kind]
+            src = _unpack_addr(kind, bytes(buf[off:off + n]))
+            dst = _unpack_addr(kind, bytes(buf[off + n:off + 2 * n]))
+            off += 2 * n
+            func_code, off = _get_str(buf, off)
+            addr = value = latency = None
+            if flags & _F_ADDR:
+                addr, off = _get_varint(buf, off)
+            if flags & _F_VALUE:
+                value, off = _get_str(buf, off)
+            if flags & _F_SESSION:
+                session, off = _get_str(buf, off)
+            else:
+                session = f"{src}->{dst}"
+            if flags & _F_LATENCY:
+                latency = _F64.unpack_from(buf, off)[0]
+                off += 8
+            protocol = _PROTOCOL_NAMES.get(proto)
+            if protocol is None:
+                raise ValueError(f"Unknown protocol id {proto}")
+            frames.append(OTProtocolFrame(protocol, src, dst, func_code, addr, value, session,
+                                          _EPOCH + timedelta(microseconds=ns // 1000), latency))
+    except (struct.error, IndexError, KeyError) as exc:
+        raise ValueError("truncated OT frame batch") from exc
+    return frames
+
+
+def message_content_type(headers: Optional[Iterable[Tuple[str, Any]]]) -> str:
+    """Content type from Kafka message headers; untagged messages are JSON frames."""
+    for name, header in headers or ():
+        if name == CONTENT_TYPE_HEADER:
+            return header.decode() if isinstance(header, bytes) else header
+    return CONTENT_TYPE_JSON
+
+
+def decode_frame_message(value: bytes, headers: Optional[Iterable[Tuple[str, Any]]] = None) -> List["OTProtocolFrame"]:
+    """Decode a frame-topic message according to its content-type header (JSON if absent)."""
+    content_type = message_content_type(headers)
+    if content_type == CONTENT_TYPE_BINARY:
+        return decode_frames(value)
+    if content_type == CONTENT_TYPE_JSON:
+        return [OTProtocolFrame.from_json(value)]
+    raise ValueError(f"Unsupported content type: {content_type}")
+
+
 @dataclass(frozen=True)
 class OTAssetChange:
     asset_id: str
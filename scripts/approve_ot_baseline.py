@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+import argparse
+import sys
+
+from email_recording.db import DatabaseClient
+from ot_collector.baseline_store import approve_learned_baseline
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Approve learned OT flows as the baseline the agent enforces")
+    parser.add_argument("--learned-version", type=int, default=None,
+                        help="Newest baseline_learned version to approve (default: the latest)")
+    args = parser.parse_args(argv)
+    version = approve_learned_baseline(DatabaseClient(), args.learned_version)
+    print(f"Approved baseline version {version}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,617 @@
+#!/usr/bin/env python3
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, List, Sequence, Tuple
+
+# Ensure project root is on sys.path when running as a script
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from ot_collector import ot_collector as collector_mod
+from ot_collector.ot_collector import OTCollector
+from ot_collector.capture import ETH_P_ALL, TPacketV3Ring
+from ot_collector.dedup import DuplicateFilter
+from ot_collector.dissectors.dnp3 import crc16_dnp, link_frame
+from ot_collector.producer import KafkaProducer, LocalBroker, LocalProducerClient
+from schemas import OTProtocolFrame, decode_frames, encode_frames
+from ot_collector.reassembly import StreamReassembler, flow_key
+from ot_collector.zones import ZoneTable
+
+
+class NullProducer:
+    def __init__(self):
+        self.count = 0
+
+    def produce(self, key: str, value, headers=None) -> None:
+        self.count += 1
+
+    def flush(self) -> None:
+        pass
+
+
+def build_tcp_packet(src: str, dst: str, sport: int, dport: int, payload: bytes, vlans: Sequence[int] = (), seq: int = 0, flags: int = 0x18) -> bytes:
+    eth = b"\x00\x11\x22\x33\x44\x55" + b"\x66\x77\x88\x99\xaa\xbb"
+    for i, vid in enumerate(vlans):
+        tpid = 0x88A8 if i == 0 and len(vlans) > 1 else 0x8100
+        eth += struct.pack("!HH", tpid, vid)
+    eth += struct.pack("!H", 0x0800)
+    tcp = struct.pack("!HHIIBBHHH", sport, dport, seq, 0, 5 << 4, flags, 65535, 0, 0)
+    total = 20 + len(tcp) + len(payload)
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, total, 1, 0x4000, 64, 6, 0, socket.inet_aton(src), socket.inet_aton(dst))
+    return eth + ip + tcp + payload
+
+
+def build_udp_packet(src: str, dst: str, sport: int, dport: int, payload: bytes) -> bytes:
+    eth = b"\x00\x11\x22\x33\x44\x55" + b"\x66\x77\x88\x99\xaa\xbb" + struct.pack("!H", 0x0800)
+    udp = struct.pack("!HHHH", sport, dport, 8 + len(payload), 0)
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 20 + len(udp) + len(payload), 1, 0, 64, 17, 0, socket.inet_aton(src), socket.inet_aton(dst))
+    return eth + ip + udp + payload
+
+
+def modbus_read_request(tid: int, addr: int = 0, count: int = 10) -> bytes:
+    return struct.pack("!HHHBBHH", tid, 0, 6, 1, 3, addr, count)
+
+
+def synthetic_span_mix(n: int, ot_ratio: float, seed: int = 7) -> List[bytes]:
+    """SPAN-like mix: mostly IT traffic (HTTPS, DNS, some VLAN tagged) plus Modbus polls."""
+    rnd = random.Random(seed)
+    https = build_tcp_packet("10.0.1.5", "10.0.2.9", 51000, 443, b"\x17" * 900)
+    tagged = build_tcp_packet("10.0.1.6", "10.0.2.9", 51001, 443, b"\x17" * 400, vlans=(100,))
+    dns = build_udp_packet("10.0.1.7", "10.0.0.53", 53000, 53, b"\x00" * 40)
+    packets: List[bytes] = []
+    seqs = [0] * 64
+    for i in range(n):
+        if rnd.random() < ot_ratio:
+            flow = i % 64
+            adu = modbus_read_request(i & 0xFFFF)
+            packets.append(build_tcp_packet("10.10.0.2", "10.10.0.10", 40000 + flow, 502, adu, seq=seqs[flow]))
+            seqs[flow] += len(adu)
+        else:
+            packets.append(rnd.choice((https, https, tagged, dns)))
+    return packets
+
+
+def _ot_capture(n: int, port: int, make_adu: Callable[[int], bytes], flows: int = 64) -> List[bytes]:
+    """``n`` OT packets round-robin over ``flows`` client connections, sequence numbers tracked."""
+    packets: List[bytes] = []
+    seqs = [0] * flows
+    for i in range(n):
+        flow = i % flows
+        adu = make_adu(i)
+        packets.append(build_tcp_packet("10.10.0.2", "10.10.0.10", 40000 + flow, port, adu, seq=seqs[flow]))
+        seqs[flow] += len(adu)
+    return packets
+
+
+def dnp3_operate(i: int) -> bytes:
+    # Direct operate: one g41v2 analog output and one g12v1 CROB, index-prefixed
+    app = struct.pack("<BBBBBHHhB", 0xC0 | (i & 0x0F), 5, 41, 2, 0x28, 1, i & 0xFF, i & 0x7FFF, 0)
+    app += struct.pack("<BBBHHBBIIB", 12, 1, 0x28, 1, 3, 0x41, 1, 100, 0, 0)
+    return link_frame(10, 1, bytes([0xC0 | (i & 0x3F)]) + app)
+
+
+def _measure(label: str, handle: Callable[[float, bytes], None], packets: List[bytes], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for buf in packets:
+            handle(0.0, buf)
+        best = min(best, time.perf_counter() - start)
+    pps = len(packets) / best
+    print(f"{label:<24} {pps:>12,.0f} pkts/s  ({best * 1e9 / len(packets):,.0f} ns/pkt)")
+    return pps
+
+
+def bench_prefilter(args: argparse.Namespace) -> int:
+    packets = synthetic_span_mix(args.packets, args.ot_ratio)
+    print(f"{len(packets)} packets, OT ratio {args.ot_ratio:.0%}")
+    fast = OTCollector(interface="bench", producer=NullProducer(), fast_path=True)
+    fast_pps = _measure("fast path (memoryview)", fast._handle_packet, packets, args.repeat)
+    if collector_mod.dpkt is None:
+        print("dpkt not installed; skipping dpkt path")
+        return 0
+    slow = OTCollector(interface="bench", producer=NullProducer(), fast_path=False)
+    dpkt_pps = _measure("dpkt path", slow._handle_packet, packets, args.repeat)
+    print(f"speedup: {fast_pps / dpkt_pps:.1f}x")
+    return 0
+
+
+def bench_dnp3(args: argparse.Namespace) -> int:
+    """Collector throughput on synthetic DNP3 vs Modbus captures (reassembly, dissect, emit)."""
+    n = args.packets
+    captures = {
+        "modbus FC16 x4": _ot_capture(n, 502, lambda i: struct.pack("!HHHBBHHB4H", i & 0xFFFF, 0, 15, 1, 16, 100, 4, 8, 1, 2, 3, 4)),
+        "dnp3 g41v2+g12v1": _ot_capture(n, 20000, dnp3_operate),
+    }
+    for label, packets in captures.items():
+        producer = NullProducer()
+        best = float("inf")
+        for _ in range(args.repeat):
+            collector = OTCollector(interface="bench", producer=producer)
+            start = time.perf_counter()
+            for buf in packets:
+                collector._handle_packet(0.0, buf)
+            best = min(best, time.perf_counter() - start)
+        frames = collector.counters["frames_emitted"]
+        print(f"{label:<24} {n / best:>12,.0f} pkts/s  {frames / best:>12,.0f} frames/s")
+    frame = dnp3_operate(1)
+    start = time.perf_counter()
+    for _ in range(10_000):
+        crc16_dnp(frame)
+    print(f"CRC-16/DNP table          {10_000 * len(frame) / (time.perf_counter() - start) / 1e6:>12.1f} MB/s")
+    return 0
+
+
+def bench_reassembly(args: argparse.Namespace) -> int:
+    """Memory and throughput of StreamReassembler with many concurrent flows.
+
+    Round 1 leaves a partial ADU pending on every flow (worst case for
+    memory); round 2 completes it and carries two more pipelined ADUs.
+    """
+    n = args.flows
+    adus = b"".join(modbus_read_request(t) for t in range(3))
+    head, tail = memoryview(adus[:7]), memoryview(adus[7:])
+    keys = [flow_key(0x0A0A0000 + (i >> 8), 1024 + (i & 0xFF), 0x0A0A1000 + (i % 97), 502) for i in range(n)]
+
+    def rounds(reasm: StreamReassembler) -> Tuple[float, float, int]:
+        start = time.perf_counter()
+        for key in keys:
+            reasm.feed(key, "modbus", 1000, 0x18, head, 1.0)
+        round1 = time.perf_counter() - start
+        frames = 0
+        start = time.perf_counter()
+        for key in keys:
+            frames += len(reasm.feed(key, "modbus", 1007, 0x18, tail, 2.0))
+        return round1, time.perf_counter() - start, frames
+
+    reasm = StreamReassembler(max_flows=n + 1)
+    round1, round2, frames = rounds(reasm)
+
+    # Memory is measured on a separate pass; tracemalloc slows allocation.
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    measured = StreamReassembler(max_flows=n + 1)
+    for key in keys:
+        measured.feed(key, "modbus", 1000, 0x18, head, 1.0)
+    pending = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+
+    print(f"{n:,} concurrent flows, {len(reasm):,} tracked")
+    print(f"memory with a partial ADU on every flow: {pending / 1e6:.1f} MB ({pending / n:.0f} B/flow)")
+    print(f"round 1 (buffer partial):   {n / round1:>12,.0f} segments/s")
+    print(f"round 2 (complete + 2 more): {n / round2:>11,.0f} segments/s, {frames / round2:,.0f} frames/s")
+    assert frames == 3 * n
+    return 0
+
+
+def bench_producer(args: argparse.Namespace) -> int:
+    """Producer throughput and batch sizes against the in-memory broker."""
+    packets = _ot_capture(args.messages, 502, lambda i: struct.pack("!HHHBBHH", i & 0xFFFF, 0, 6, 1, 6, i & 0xFF, i & 0xFFFF))
+    collector = OTCollector(interface="bench", producer=NullProducer())
+    frames = []
+    collector._emit_many = lambda protocol, batch: frames.extend(batch)  # type: ignore[assignment]
+    for buf in packets:
+        collector._handle_packet(0.0, buf)
+    values = [f.to_json().encode() for f in frames]
+    for linger_ms in args.linger_ms:
+        broker = LocalBroker()
+        client = LocalProducerClient(broker, {"linger.ms": linger_ms, "queue.buffering.max.messages": len(values) + 1})
+        producer = KafkaProducer("local", "ot.frames", settings={"linger.ms": linger_ms}, client=client)
+        start = time.perf_counter()
+        for value in values:
+            producer.produce(key="modbus", value=value)
+        produced = time.perf_counter() - start
+        producer.close()
+        total = time.perf_counter() - start
+        batches = broker.batches
+        print(f"linger.ms={linger_ms:<4} produce {len(values) / produced:>12,.0f} msgs/s  "
+              f"end-to-end {len(values) / total:>12,.0f} msgs/s  "
+              f"{len(batches)} batches, avg {sum(batches) / max(len(batches), 1):,.0f} msgs/batch  "
+              f"delivered={producer.counters['delivered']}")
+    return 0
+
+
+def bench_wire(args: argparse.Namespace) -> int:
+    """Encoded size and encode/decode rate of JSON vs the binary frame format."""
+    packets = _ot_capture(args.frames // 4, 502, lambda i: struct.pack("!HHHBBHHB4H", i & 0xFFFF, 0, 15, 1, 16, 100, 4, 8, 1, 2, 3, 4))
+    collector = OTCollector(interface="bench", producer=NullProducer())
+    batches: List[List[OTProtocolFrame]] = []
+    collector._emit_many = lambda protocol, frames: batches.append(frames)  # type: ignore[assignment]
+    for buf in packets:
+        collector._handle_packet(time.time(), buf)
+    frames = [f for batch in batches for f in batch]
+
+    start = time.perf_counter()
+    texts = [f.to_json() for f in frames]
+    json_enc = time.perf_counter() - start
+    start = time.perf_counter()
+    for text in texts:
+        OTProtocolFrame.from_json(text)
+    json_dec = time.perf_counter() - start
+
+    start = time.perf_counter()
+    blobs = [encode_frames(batch) for batch in batches]
+    bin_enc = time.perf_counter() - start
+    start = time.perf_counter()
+    for blob in blobs:
+        decode_frames(blob)
+    bin_dec = time.perf_counter() - start
+
+    n = len(frames)
+    json_bytes = sum(len(t) for t in texts)
+    bin_bytes = sum(len(b) for b in blobs)
+    print(f"{n:,} frames in {len(batches):,} packets")
+    print(f"json    {json_bytes / n:>6.1f} B/frame  encode {n / json_enc:>10,.0f}/s  decode {n / json_dec:>10,.0f}/s")
+    print(f"binary  {bin_bytes / n:>6.1f} B/frame  encode {n / bin_enc:>10,.0f}/s  decode {n / bin_dec:>10,.0f}/s")
+    return 0
+
+
+def bench_frame(args: argparse.Namespace) -> int:
+    """Per-frame construction cost: validating constructor vs OTProtocolFrame.trusted."""
+    n = args.frames
+    when = datetime.now(timezone.utc)
+    endpoints = [(f"10.10.{i >> 8}.{i & 0xFF}", f"10.20.0.{i % 16}") for i in range(256)]
+    fields = [(src, dst, str(i % 3 + 3), i % 1000, str(i), f"{src}->{dst}") for i, (src, dst) in
+              ((i, endpoints[i % 256]) for i in range(n))]
+    for label, make in (("validating __init__", OTProtocolFrame), ("trusted()", OTProtocolFrame.trusted)):
+        start = time.perf_counter()
+        for src, dst, fc, addr, value, session in fields:
+            make("modbus", src, dst, fc, addr, value, session, when)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<24} {n / elapsed:>12,.0f} frames/s  ({elapsed * 1e9 / n:,.0f} ns/frame)")
+    return 0
+
+
+def bench_dedup(args: argparse.Namespace) -> int:
+    """Collector throughput with every OT packet seen ``--copies`` times (several SPAN feeds)."""
+    unique = _ot_capture(args.packets // args.copies, 502, lambda i: struct.pack("!HHHBBHH", i & 0xFFFF, 0, 6, 1, 6, i & 0xFF, i & 0xFFFF))
+    packets = [buf for buf in unique for _ in range(args.copies)]
+    for label, window in (("dedup off", 0.0), ("dedup on", 0.1)):
+        best, collector = float("inf"), None
+        for _ in range(args.repeat):
+            collector = OTCollector(interface="bench", producer=NullProducer(), dedup_window=window)
+            start = time.perf_counter()
+            for i, buf in enumerate(packets):
+                collector._handle_packet(i * 1e-5, buf)
+            best = min(best, time.perf_counter() - start)
+        c = collector.counters
+        print(f"{label:<24} {len(packets) / best:>12,.0f} pkts/s  frames={c['frames_emitted']:,} duplicates={c['duplicates']:,}")
+    filt = DuplicateFilter()
+    keys = [hash((i, i * 7)) for i in range(len(packets))]
+    start = time.perf_counter()
+    for i, key in enumerate(keys):
+        filt.seen(key, i * 1e-6)
+    elapsed = time.perf_counter() - start
+    print(f"DuplicateFilter.seen     {len(keys) / elapsed:>12,.0f} keys/s ({elapsed * 1e9 / len(keys):,.0f} ns/key)")
+    return 0
+
+
+def bench_flowstats(args: argparse.Namespace) -> int:
+    """Per-write cost of the polling-period estimate used by OffScheduleWriteRule."""
+    from datetime import timedelta
+    from ot_collector.asset_manager import FlowStats
+    rng = random.Random(11)
+    stats = FlowStats()
+    ts = datetime.now(timezone.utc)
+    stamps = []
+    for _ in range(args.samples):
+        ts += timedelta(seconds=rng.gauss(1.0, 0.02))
+        stamps.append(ts)
+    start = time.perf_counter()
+    for ts in stamps:
+        stats.record("6", 1, ts)
+        stats.typical_period_seconds()
+    elapsed = time.perf_counter() - start
+    print(f"record + period          {elapsed * 1e9 / len(stamps):>10,.0f} ns/write  period={stats.typical_period_seconds():.4f}s")
+    window = stamps[-1000:]
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        deltas = sorted(d for d in ((b - a).total_seconds() for a, b in zip(window[:-1], window[1:])) if d > 0)
+    elapsed = time.perf_counter() - start
+    print(f"sort last 1000 deltas    {elapsed * 1e9 / args.repeat:>10,.0f} ns/write  period={deltas[len(deltas) // 2]:.4f}s")
+    return 0
+
+
+def bench_assets(args: argparse.Namespace) -> int:
+    """AssetManager memory and ingest rate for many flows with many register addresses."""
+    from ot_collector.asset_manager import AssetManager
+    when = datetime.now(timezone.utc)
+    am = AssetManager()
+    tracemalloc.start()
+    start = time.perf_counter()
+    n = 0
+    for f in range(args.flows):
+        src, dst = f"10.{f >> 8 & 255}.{f & 255}.2", f"10.{f >> 8 & 255}.{f & 255}.10"
+        for addr in range(args.addresses):
+            am.ingest(None, src, None, dst, "modbus", ("3", "4", "16")[addr % 3], addr * 2 if addr % 50 else addr * 2 + 1, when)
+            n += 1
+    elapsed = time.perf_counter() - start
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    report = am.memory_report()
+    print(f"{args.flows:,} flows x {args.addresses:,} addresses: {n / elapsed:,.0f} ingests/s")
+    print(f"traced {current / 1e6:.1f} MB; flow state {report['flow_bytes'] / 1e6:.2f} MB ({report['bytes_per_flow']:,.0f} B/flow)")
+    src, dst, protocol, size, addrs, ranges = report["largest_flows"][0]
+    print(f"largest flow {src} -> {dst} {protocol}: {size:,} B for {addrs:,} addresses in {ranges:,} ranges")
+    # Same addresses as a set of ints per flow, as FlowStats used to hold them
+    tracemalloc.start()
+    sets = [set(addr * 2 if addr % 50 else addr * 2 + 1 for addr in range(args.addresses)) for _ in range(args.flows)]
+    print(f"set-of-int addresses     {tracemalloc.get_traced_memory()[0] / 1e6:.1f} MB for {len(sets):,} flows")
+    tracemalloc.stop()
+    return 0
+
+
+def bench_export(args: argparse.Namespace) -> int:
+    """Incremental baseline export: full inventory vs a cycle where few flows changed."""
+    from datetime import timedelta
+    from email_recording.db import FakeDB
+    from ot_collector.asset_manager import AssetManager
+    from ot_collector.baseline_store import BaselineWriter
+    when = datetime.now(timezone.utc)
+    am = AssetManager()
+    for f in range(args.flows):
+        for addr in range(10):
+            am.ingest(None, f"10.{f >> 16 & 255}.{f >> 8 & 255}.{f & 255}", None, "10.255.0.1", "modbus", "3", addr, when)
+    db = FakeDB()
+    db.when("max(version)", 0)
+    writer = BaselineWriter(db, am)
+    start = time.perf_counter()
+    writer.flush()
+    full = time.perf_counter() - start
+    changed = max(1, args.flows * args.changed_pct // 100)
+    for f in range(changed):
+        am.ingest(None, f"10.{f >> 16 & 255}.{f >> 8 & 255}.{f & 255}", None, "10.255.0.1", "modbus", "16", 100, when + timedelta(seconds=1))
+    db.executed.clear()
+    start = time.perf_counter()
+    assets, flows = writer.flush()
+    incremental = time.perf_counter() - start
+    print(f"full export              {args.flows:,} flows in {full * 1e3:,.1f} ms")
+    print(f"incremental export       {flows:,} flows / {assets:,} assets in {incremental * 1e3:,.1f} ms ({len(db.executed):,} statements)")
+    return 0
+
+
+def bench_baseline(args: argparse.Namespace) -> int:
+    """Compile a baseline and measure the UnknownFunctionCodeRule lookup."""
+    from ot_collector.baseline_store import CompiledBaseline
+    rows = [(f"10.{f >> 16 & 255}.{f >> 8 & 255}.{f & 255}", "10.255.0.1", "modbus", ["3", "4", "16"],
+             [{"start": 0, "end": 99}, {"start": 1000, "end": 1099}], 1.0) for f in range(args.flows)]
+    start = time.perf_counter()
+    baseline = CompiledBaseline.from_rows(rows)
+    print(f"compiled {len(baseline):,} flows in {(time.perf_counter() - start) * 1e3:,.0f} ms")
+    probes = [(rows[i % len(rows)][0], "6" if i % 10 == 0 else "3", i % 1200) for i in range(args.lookups)]
+    start = time.perf_counter()
+    for src, func, addr in probes:
+        flow = baseline.lookup(src, "10.255.0.1", "modbus")
+        flow.allows_function(func)
+        flow.allows_address(addr)
+    elapsed = time.perf_counter() - start
+    print(f"lookup + function + addr {elapsed * 1e9 / len(probes):>10,.0f} ns/frame")
+    return 0
+
+
+def bench_rules(args: argparse.Namespace) -> int:
+    """OTTrackingAgent throughput on a read-heavy Modbus/DNP3/GOOSE mix, with per-rule cost."""
+    from ot_collector.ot_tracking_agent import OTTrackingAgent
+    agent = OTTrackingAgent()
+    agent.load_baseline([(f"10.10.0.{i}", "10.10.1.1", "modbus", ["3", "16"]) for i in range(64)])
+    agent.load_zones({"zones": [{"name": "OT", "cidrs": ["10.10.0.0/16"]}]}, [])
+    when = datetime.now(timezone.utc)
+    frames = []
+    for i in range(args.frames):
+        if i % 10 == 9:
+            frames.append(OTProtocolFrame(protocol="goose", src_ip="00:1a:2b:3c:4d:5e", dst_ip="01:0c:cd:01:00:01",
+                                          func_code="stNum", addr=None, value="1", session_id="s", timestamp=when))
+        else:
+            protocol, func = ("modbus", "16" if i % 50 == 0 else "3") if i % 3 else ("dnp3", "1")
+            frames.append(OTProtocolFrame(protocol=protocol, src_ip=f"10.10.0.{i % 64}", dst_ip="10.10.1.1", func_code=func,
+                                          addr=i % 100, value=str(i % 300), session_id="s", timestamp=when))
+    start = time.perf_counter()
+    for frame in frames:
+        agent.ingest_frame(frame)
+    elapsed = time.perf_counter() - start
+    print(f"ingest_frame             {len(frames) / elapsed:>12,.0f} frames/s")
+    for name, stats in agent.rule_stats.items():
+        mean = stats.latency.total / stats.calls if stats.calls else 0
+        print(f"  {name:<26} calls={stats.calls:>8,} alerts={stats.hits:>6,} mean={mean:>6,.0f} ns "
+              f"p99<={stats.latency.quantile(0.99) or 0:,} ns")
+    return 0
+
+
+def bench_zones(args: argparse.Namespace) -> int:
+    """Zone lookup: compiled LPM table (cold and cached) vs scanning ipaddress networks."""
+    import ipaddress
+    rng = random.Random(3)
+    zones = {f"Z{z}": [] for z in range(args.zones)}
+    for i in range(args.cidrs):
+        plen = rng.choice((16, 20, 24, 28))
+        net = ipaddress.ip_network((rng.getrandbits(32), plen), strict=False)
+        zones[f"Z{i % args.zones}"].append(str(net))
+    start = time.perf_counter()
+    table = ZoneTable(zones)
+    print(f"{args.cidrs:,} CIDRs -> {len(table):,} ranges compiled in {(time.perf_counter() - start) * 1e3:.1f} ms")
+    hosts = [socket.inet_ntoa(struct.pack("!I", rng.getrandbits(32))) for _ in range(args.hosts)]
+    lookups = [hosts[rng.randrange(len(hosts))] for _ in range(args.lookups)]
+
+    def scan(ip: str):
+        addr = ipaddress.ip_address(ip)
+        for name, cidrs in zones.items():
+            for cidr in cidrs:
+                if addr in ipaddress.ip_network(cidr):
+                    return name
+        return None
+
+    uncached = ZoneTable(zones, cache_size=0)
+    for label, fn, n in (("table (uncached)", uncached.lookup, args.lookups),
+                         ("table (cached)", table.lookup, args.lookups),
+                         ("ipaddress scan", scan, max(1, args.lookups // 1000))):
+        sample = lookups[:n]
+        start = time.perf_counter()
+        for ip in sample:
+            fn(ip)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<24} {n / elapsed:>12,.0f} lookups/s ({elapsed * 1e9 / n:,.0f} ns/lookup)")
+    return 0
+
+
+def _flood(interface: str, frame: bytes, stop: threading.Event) -> int:
+    tx = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+    tx.bind((interface, 0))
+    sent = 0
+    while not stop.is_set():
+        for _ in range(256):
+            tx.send(frame)
+        sent += 256
+    tx.close()
+    return sent
+
+
+def bench_capture(args: argparse.Namespace) -> int:
+    """Receive rate of the TPACKET_V3 ring vs one recv() per packet while flooding Modbus frames."""
+    frame = build_tcp_packet("10.10.0.2", "10.10.0.10", 40000, 502, modbus_read_request(1))
+
+    def run(label: str, reader: Callable[[], int]) -> None:
+        stop = threading.Event()
+        sender = threading.Thread(target=_flood, args=(args.interface, frame, stop), daemon=True)
+        sender.start()
+        start = time.perf_counter()
+        received = reader()
+        elapsed = time.perf_counter() - start
+        stop.set()
+        sender.join()
+        print(f"{label:<24} {received / elapsed:>12,.0f} pkts/s")
+
+    def ring_reader() -> int:
+        count = 0
+        deadline = time.monotonic() + args.seconds
+        with TPacketV3Ring(args.interface, stats_interval=0) as ring:
+            for _ts, buf in ring.packets(stop=lambda: time.monotonic() > deadline, timeout_ms=50):
+                count += 1
+            print(f"  ring kernel stats: {ring.stats()}")
+        return count
+
+    def recv_reader() -> int:
+        count = 0
+        deadline = time.monotonic() + args.seconds
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        sock.bind((args.interface, ETH_P_ALL))
+        sock.settimeout(0.05)
+        buf = bytearray(65536)
+        while time.monotonic() < deadline:
+            try:
+                sock.recv_into(buf)
+            except socket.timeout:
+                continue
+            count += 1
+        sock.close()
+        return count
+
+    run("TPACKET_V3 ring", ring_reader)
+    run("recv() per packet", recv_reader)
+    return 0
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the OT collector hot path")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_pre = sub.add_parser("prefilter", help="Fast-path pre-filter vs dpkt decode")
+    p_pre.add_argument("--packets", type=int, default=200_000)
+    p_pre.add_argument("--ot-ratio", type=float, default=0.1)
+    p_pre.add_argument("--repeat", type=int, default=3)
+
+    p_dnp = sub.add_parser("dnp3", help="DNP3 vs Modbus dissection throughput")
+    p_dnp.add_argument("--packets", type=int, default=50_000)
+    p_dnp.add_argument("--repeat", type=int, default=3)
+
+    p_re = sub.add_parser("reassembly", help="TCP reassembly memory/throughput with many flows")
+    p_re.add_argument("--flows", type=int, default=100_000)
+
+    p_prod = sub.add_parser("producer", help="Kafka producer batching against the in-memory broker")
+    p_prod.add_argument("--messages", type=int, default=100_000)
+    p_prod.add_argument("--linger-ms", type=int, nargs="+", default=[0, 10, 50])
+
+    p_dedup = sub.add_parser("dedup", help="Duplicate suppression with multiple SPAN copies")
+    p_dedup.add_argument("--packets", type=int, default=60_000)
+    p_dedup.add_argument("--copies", type=int, default=3)
+    p_dedup.add_argument("--repeat", type=int, default=3)
+
+    p_frame = sub.add_parser("frame", help="OTProtocolFrame construction cost")
+    p_frame.add_argument("--frames", type=int, default=200_000)
+
+    p_wire = sub.add_parser("wire", help="JSON vs binary frame encoding")
+    p_wire.add_argument("--frames", type=int, default=100_000)
+
+    p_fs = sub.add_parser("flowstats", help="Streaming polling-period estimate vs sorting a timestamp window")
+    p_fs.add_argument("--samples", type=int, default=100_000)
+    p_fs.add_argument("--repeat", type=int, default=200)
+
+    p_assets = sub.add_parser("assets", help="AssetManager memory with many flows and register addresses")
+    p_assets.add_argument("--flows", type=int, default=200)
+    p_assets.add_argument("--addresses", type=int, default=2000)
+
+    p_exp = sub.add_parser("export", help="Incremental inventory/baseline export (in-memory fake DB)")
+    p_exp.add_argument("--flows", type=int, default=50_000)
+    p_exp.add_argument("--changed-pct", type=int, default=1)
+
+    p_bl = sub.add_parser("baseline", help="Compiled baseline build and per-frame lookup")
+    p_bl.add_argument("--flows", type=int, default=50_000)
+    p_bl.add_argument("--lookups", type=int, default=200_000)
+
+    p_rules = sub.add_parser("rules", help="OT agent rule dispatch and per-rule latency")
+    p_rules.add_argument("--frames", type=int, default=100_000)
+
+    p_zone = sub.add_parser("zones", help="Zone longest-prefix-match lookup")
+    p_zone.add_argument("--cidrs", type=int, default=5000)
+    p_zone.add_argument("--zones", type=int, default=20)
+    p_zone.add_argument("--hosts", type=int, default=2000)
+    p_zone.add_argument("--lookups", type=int, default=200_000)
+
+    p_cap = sub.add_parser("capture", help="AF_PACKET ring vs per-packet recv (needs CAP_NET_RAW)")
+    p_cap.add_argument("--interface", default="lo")
+    p_cap.add_argument("--seconds", type=float, default=3.0)
+
+    args = parser.parse_args(argv)
+    if args.cmd == "prefilter":
+        return bench_prefilter(args)
+    if args.cmd == "dnp3":
+        return bench_dnp3(args)
+    if args.cmd == "reassembly":
+        return bench_reassembly(args)
+    if args.cmd == "producer":
+        return bench_producer(args)
+    if args.cmd == "dedup":
+        return bench_dedup(args)
+    if args.cmd == "frame":
+        return bench_frame(args)
+    if args.cmd == "wire":
+        return bench_wire(args)
+    if args.cmd == "flowstats":
+        return bench_flowstats(args)
+    if args.cmd == "assets":
+        return bench_assets(args)
+    if args.cmd == "export":
+        return bench_export(args)
+    if args.cmd == "baseline":
+        return bench_baseline(args)
+    if args.cmd == "rules":
+        return bench_rules(args)
+    if args.cmd == "zones":
+        return bench_zones(args)
+    if args.cmd == "capture":
+        return bench_capture(args)
+    return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -1,16 +1,76 @@
 from __future__ import annotations
 
+import argparse
+import functools
+import logging
 import os
+import sys
+
+from ot_collector.metrics import MetricsServer, collector_metrics, pool_metrics
+from ot_collector.offline import find_captures, ingest_many
 from ot_collector.ot_collector import OTCollector, KafkaProducer
+from ot_collector.safety_controls import BufferingProducer
+from ot_collector.workers import CollectorPool
+
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the OT collector")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Collector processes; flows are spread across them by hash "
+                             "(default: OT_WORKERS or 1; with --pcap-dir, one per CPU)")
+    parser.add_argument("--pcap-dir", default=os.getenv("PCAP_DIR"),
+                        help="Ingest every pcap/pcapng(.gz) under this directory, one file per worker, then exit")
+    args = parser.parse_args(argv)
+    workers = args.workers if args.workers is not None else int(os.getenv("OT_WORKERS", "1"))
 
-def main():
     brokers = os.getenv("KAFKA_BROKERS", "localhost:9092")
     topic = os.getenv("OT_TOPIC", "ot-network-events")
+    interface = os.getenv("IFACE", "eth0")
+    metrics_port = int(os.getenv("OT_METRICS_PORT", "0"))
+    metrics_host = os.getenv("OT_METRICS_HOST", "127.0.0.1")
+    if args.pcap_dir:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+        log = logging.getLogger("offline")
+        paths = find_captures(args.pcap_dir)
+        log.info("Ingesting %d captures from %s", len(paths), args.pcap_dir)
+        factory = functools.partial(KafkaProducer, brokers=brokers, topic=topic)
+        # Files are independent, so offline ingest uses every CPU unless told otherwise
+        for report in ingest_many(paths, factory, workers=args.workers or 0):
+            if "error" in report:
+                continue
+            log.info("%s: %d packets, %d OT, %d frames in %.2fs (%.0f pkts/s, %.1f MB/s)",
+                     report["path"], report["packets"], report["ot_packets"], report["frames_emitted"],
+                     report["seconds"], report["pkts_per_s"], report["bytes_per_s"] / 1e6)
+        return
+    ring_bytes = int(float(os.getenv("OT_RING_MB", "256")) * (1 << 20))
+    spill_dir = os.getenv("OT_SPILL_DIR")
+    spill_max_bytes = int(os.getenv("OT_SPILL_MAX_BYTES", str(1 << 30)))
+    if workers > 1:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s %(message)s")
+        pool = CollectorPool(
+            workers=workers,
+            interface=interface,
+            producer_factory=functools.partial(KafkaProducer, brokers=brokers, topic=topic),
+            pcap_path=os.getenv("PCAP_PATH"),
+            spill_dir=spill_dir,
+            spill_max_bytes=spill_max_bytes,
+            ring_bytes=ring_bytes,
+        )
+        if metrics_port:
+            MetricsServer(pool_metrics(pool), metrics_host, metrics_port).start()
+        pool.run()
+        return
     producer = KafkaProducer(brokers=brokers, topic=topic)
-    collector = OTCollector(interface=os.getenv("IFACE", "eth0"), producer=producer)
-    collector.run()
+    if spill_dir:
+        producer = BufferingProducer(producer, spill_dir=spill_dir, spill_max_bytes=spill_max_bytes)
+    collector = OTCollector(interface=interface, producer=producer, ring_bytes=ring_bytes)
+    if metrics_port:
+        MetricsServer(collector_metrics(collector), metrics_host, metrics_port).start()
+    try:
+        collector.run()
+    finally:
+        producer.close()
 
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
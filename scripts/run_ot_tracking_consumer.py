@@ -1,11 +1,16 @@
 from __future__ import annotations
 
-import json
+import logging
 import os
+import time
 
 from confluent_kafka import Consumer
 
+from email_recording.db import DatabaseClient
+from ot_collector.baseline_store import BaselineReloader, BaselineWriter
+from ot_collector.metrics import MetricsServer, agent_metrics
 from ot_collector.ot_tracking_agent import OTTrackingAgent
+from schemas import CONTENT_TYPE_SUMMARY, OTFlowSummary, decode_frame_message, message_content_type
 
 
 def main():
@@ -19,20 +24,41 @@ def main():
     c.subscribe([topic])
 
     agent = OTTrackingAgent()
+    log = logging.getLogger("ot_tracking_consumer")
+    metrics_port = int(os.getenv("OT_AGENT_METRICS_PORT", "0"))
+    if metrics_port:
+        MetricsServer(agent_metrics(agent), os.getenv("OT_METRICS_HOST", "127.0.0.1"), metrics_port).start()
+    # Changed assets/flows go to Postgres (baseline_learned) every OT_EXPORT_INTERVAL seconds
+    writer = BaselineWriter(DatabaseClient(), agent.asset_manager) if os.getenv("DATABASE_URL") else None
+    # Approved baseline versions (scripts/approve_ot_baseline.py) are swapped in only when asked for
+    reload_interval = float(os.getenv("OT_BASELINE_RELOAD_INTERVAL", "0"))
+    if reload_interval > 0 and os.getenv("DATABASE_URL"):
+        BaselineReloader(DatabaseClient(), agent, reload_interval).start()
+    export_interval = float(os.getenv("OT_EXPORT_INTERVAL", "60"))
+    next_export = time.monotonic() + export_interval
 
     while True:
+        if writer is not None and time.monotonic() >= next_export:
+            writer.flush()
+            next_export = time.monotonic() + export_interval
         msg = c.poll(1.0)
         if msg is None:
             continue
         if msg.error():
             continue
-        event = json.loads(msg.value())
-        # Construct frame-like object
-        from schemas import OTProtocolFrame
-        frame = OTProtocolFrame(**event)
-        alerts = agent.ingest_frame(frame)
-        for a in alerts:
-            print(f"ALERT: {a.severity} {a.rule} {a.message} {a.details}")
+        # Binary or JSON frames, or a collector flow summary, per the content-type header
+        try:
+            if message_content_type(msg.headers()) == CONTENT_TYPE_SUMMARY:
+                agent.ingest_summary(OTFlowSummary.from_json(msg.value()))
+                continue
+            frames = decode_frame_message(msg.value(), msg.headers())
+        except ValueError as exc:
+            log.warning("Skipping undecodable message at %s/%s: %s", msg.partition(), msg.offset(), exc)
+            continue
+        for frame in frames:
+            alerts = agent.ingest_frame(frame)
+            for a in alerts:
+                print(f"ALERT: {a.severity} {a.rule} {a.message} {a.details}")
 
 
 if __name__ == "__main__":
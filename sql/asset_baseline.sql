@@ -10,6 +10,9 @@ CREATE TABLE IF NOT EXISTS asset_inventory (
   confidence double precision NOT NULL
 );
 
+-- Approved baseline read by the agent's rules. Rows only arrive through an
+-- explicit approval of learned flows (baseline_store.approve_learned_baseline)
+-- or by hand; the agent never writes here.
 CREATE TABLE IF NOT EXISTS baseline_allowed (
   id bigserial PRIMARY KEY,
   version int NOT NULL,
@@ -24,3 +27,23 @@ CREATE TABLE IF NOT EXISTS baseline_allowed (
 
 -- Indexes for lookups
 CREATE INDEX IF NOT EXISTS idx_baseline_src_dst_proto ON baseline_allowed(src, dst, protocol);
+
+-- One row per flow per export version: makes batched inserts idempotent on
+-- retry and serves "latest version per flow" reads
+CREATE UNIQUE INDEX IF NOT EXISTS uq_baseline_flow_version ON baseline_allowed(src, dst, protocol, version);
+
+-- Flows learned from traffic, exported by the tracking consumer. Same shape
+-- as baseline_allowed; nothing here is trusted until approved.
+CREATE TABLE IF NOT EXISTS baseline_learned (
+  id bigserial PRIMARY KEY,
+  version int NOT NULL,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  src inet NOT NULL,
+  dst inet NOT NULL,
+  protocol text NOT NULL,
+  function_codes text[] NOT NULL,
+  address_ranges jsonb,
+  typical_period_seconds double precision
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_baseline_learned_flow_version ON baseline_learned(src, dst, protocol, version);
@@ -0,0 +1,206 @@
+import asyncio
+
+from email_recording.db import AsyncFakeDB, FakeDB, StatementCache
+
+
+def test_statement_cache_is_bounded_lru():
+    cache = StatementCache(max_size=2)
+    cache.record("SELECT 1", 1.0)
+    cache.record("SELECT 2", 2.0)
+    cache.record("SELECT 1", 3.0)  # refresh, SELECT 2 is now oldest
+    cache.record("SELECT 3", 1.0)
+
+    assert "SELECT 2" not in cache
+    assert len(cache) == 2
+    stats = cache.snapshot()["SELECT 1"]
+    assert stats.calls == 2
+    assert stats.avg_ms == 2.0
+    assert stats.max_ms == 3.0
+
+
+def test_fakes_record_batched_statements():
+    db = FakeDB()
+    db.execute_many([("INSERT INTO t VALUES (%s)", (1,)), ("INSERT INTO t VALUES (%s)", (2,))])
+    assert db.executed == [("INSERT INTO t VALUES (%s)", (1,)), ("INSERT INTO t VALUES (%s)", (2,))]
+
+    adb = AsyncFakeDB()
+    adb.when("FROM users", 3)
+
+    async def run():
+        await adb.execute_many([("UPDATE users SET x = %s", (1,))])
+        return await adb.query_value("SELECT count(*) FROM users")
+
+    assert asyncio.run(run()) == 3
+    assert adb.executed == [("UPDATE users SET x = %s", (1,))]
+
+
+def test_async_fake_db_execute_batches_and_queries():
+    adb = AsyncFakeDB()
+    adb.when("FROM verification_requests", [("u1", 2), ("u2", 1)])
+
+    async def run():
+        await adb.execute("INSERT INTO t VALUES (%s)", (1,))
+        await adb.execute_many([("INSERT INTO t VALUES (%s)", (2,)), ("DELETE FROM t WHERE x = %s", (3,))])
+        return await adb.query_rows("SELECT user_id, count(*) FROM verification_requests GROUP BY 1")
+
+    assert asyncio.run(run()) == [("u1", 2), ("u2", 1)]
+    assert adb.executed == [("INSERT INTO t VALUES (%s)", (1,)), ("INSERT INTO t VALUES (%s)", (2,)),
+                            ("DELETE FROM t WHERE x = %s", (3,))]
+
+
+class _FakeAsyncCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self._rows = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, sql, params, prepare=None):
+        self.conn.log.append((self.conn.id, self.conn.in_pipeline, sql, tuple(params), prepare))
+        self._rows = [(len(self.conn.log),)]
+
+    async def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    async def fetchall(self):
+        return list(self._rows)
+
+
+class _FakeAsyncConn:
+    def __init__(self, conn_id, log):
+        self.id = conn_id
+        self.log = log
+        self.in_pipeline = False
+
+    def cursor(self):
+        return _FakeAsyncCursor(self)
+
+    def pipeline(self):
+        conn = self
+
+        class _Pipeline:
+            async def __aenter__(self):
+                conn.in_pipeline = True
+
+            async def __aexit__(self, *exc):
+                conn.in_pipeline = False
+                return False
+
+        return _Pipeline()
+
+
+class _FakeAsyncPool:
+    def __init__(self, dsn, min_size, max_size, kwargs, configure, open):
+        self.opened = False
+        self.log = []
+        self.checkouts = 0
+        self.configure = configure
+
+    async def open(self):
+        self.opened = True
+
+    async def close(self):
+        self.opened = False
+
+    def connection(self):
+        pool = self
+
+        class _Checkout:
+            async def __aenter__(self):
+                assert pool.opened, "pool used before open()"
+                pool.checkouts += 1
+                return _FakeAsyncConn(pool.checkouts, pool.log)
+
+            async def __aexit__(self, *exc):
+                return False
+
+        return _Checkout()
+
+
+def test_async_database_client_uses_pool_connections_and_pipelines_batches(monkeypatch):
+    from email_recording import db as db_mod
+
+    monkeypatch.setattr(db_mod, "psycopg", object())
+    monkeypatch.setattr(db_mod, "AsyncConnectionPool", _FakeAsyncPool)
+    client = db_mod.AsyncDatabaseClient(dsn="postgresql://test", max_size=4)
+
+    async def run():
+        async with client:
+            await client.execute("UPDATE t SET x = %s", (1,))
+            await client.execute_many([("INSERT INTO t VALUES (%s)", (2,)), ("INSERT INTO t VALUES (%s)", (3,))])
+            rows = await client.query_rows("SELECT 1")
+            value = await client.query_value("SELECT 2")
+        return rows, value
+
+    rows, value = asyncio.run(run())
+    log = client._pool.log
+    assert [(conn, pipelined, sql) for conn, pipelined, sql, _params, _prepare in log] == [
+        (1, False, "UPDATE t SET x = %s"),
+        (2, True, "INSERT INTO t VALUES (%s)"),  # one checkout, one pipeline for the batch
+        (2, True, "INSERT INTO t VALUES (%s)"),
+        (3, False, "SELECT 1"),
+        (4, False, "SELECT 2"),
+    ]
+    assert rows == [(4,)] and value == 5 and not client._pool.opened
+    assert client.statements.snapshot()["INSERT INTO t VALUES (%s)"].calls == 2
+
+
+class _FakeSyncCursor:
+    def __init__(self, log):
+        self.log = log
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params, prepare=None):
+        self.log.append((sql, prepare))
+
+    def fetchone(self):
+        return (1,)
+
+
+class _FakeSyncConn:
+    def __init__(self):
+        self.log = []
+        self.prepare_threshold = 5  # psycopg default
+
+    def cursor(self):
+        return _FakeSyncCursor(self.log)
+
+
+def test_prepare_false_disables_explicit_and_automatic_preparing(monkeypatch):
+    from email_recording import db as db_mod
+
+    conns = []
+
+    class _Psycopg:
+        @staticmethod
+        def connect(dsn):
+            conns.append(_FakeSyncConn())
+            return conns[-1]
+
+    monkeypatch.setattr(db_mod, "psycopg", _Psycopg)
+    db_mod.DatabaseClient(dsn="postgresql://test").query_value("SELECT 1")
+    db_mod.DatabaseClient(dsn="postgresql://test", prepare=False).query_value("SELECT 1")
+    assert conns[0].log == [("SELECT 1", True)] and conns[0].prepare_threshold == 5
+    assert conns[1].log == [("SELECT 1", False)] and conns[1].prepare_threshold is None
+
+    monkeypatch.setattr(db_mod, "AsyncConnectionPool", _FakeAsyncPool)
+    client = db_mod.AsyncDatabaseClient(dsn="postgresql://test", prepare=False)
+    conn = _FakeSyncConn()
+    asyncio.run(client._pool.configure(conn))
+    assert conn.prepare_threshold is None
+
+    async def run():
+        async with client:
+            await client.execute("SELECT 1")
+
+    asyncio.run(run())
+    assert [prepare for *_rest, prepare in client._pool.log] == [False]
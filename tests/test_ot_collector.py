@@ -0,0 +1,925 @@
+import json
+import os
+import socket
+import struct
+
+import pytest
+
+from ot_collector import ot_collector as collector_mod
+from ot_collector.fastpath import flow_shard, ip_str, prefilter
+from ot_collector.ot_collector import OTCollector
+from ot_collector.dissectors.dnp3 import Dnp3Dissector, link_frame
+from ot_collector.dissectors.iec104 import Iec104Dissector
+from ot_collector.dissectors.modbus import ModbusDissector
+from ot_collector.producer import KafkaProducer, LocalBroker, LocalProducerClient
+from ot_collector.protocols import is_response, is_write
+from ot_collector.reassembly import StreamReassembler, flow_key
+from schemas import OTProtocolFrame, decode_frame_message, decode_frames, encode_frames
+
+
+def _packet(sport, dport, payload, vlans=(), ip_options=b"", proto=6, pad=0, seq=1):
+    eth = b"\x00\x11\x22\x33\x44\x55\x66\x77\x88\x99\xaa\xbb"
+    for tpid, vid in vlans:
+        eth += struct.pack("!HH", tpid, vid)
+    eth += struct.pack("!H", 0x0800)
+    tcp = struct.pack("!HHIIBBHHH", sport, dport, seq, 0, 5 << 4, 0x18, 65535, 0, 0)
+    ihl = 5 + len(ip_options) // 4
+    ip = struct.pack("!BBHHHBBH4s4s", 0x40 | ihl, 0, ihl * 4 + len(tcp) + len(payload), 1, 0, 64, proto, 0,
+                     socket.inet_aton("10.10.0.2"), socket.inet_aton("10.10.0.10")) + ip_options
+    return eth + ip + tcp + payload + b"\x00" * pad
+
+
+class _ListProducer:
+    def __init__(self):
+        self.messages = []
+
+    def produce(self, key, value, headers=None):
+        self.messages.append((key, value, headers))
+
+    def frames(self):
+        return [f for _key, value, headers in self.messages for f in decode_frame_message(value, headers)]
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+MODBUS_WRITE = struct.pack("!HHHBBHH", 1, 0, 6, 1, 6, 40, 1234)
+
+
+def test_prefilter_handles_qinq_options_and_padding():
+    buf = _packet(40000, 502, MODBUS_WRITE, vlans=((0x88A8, 10), (0x8100, 20)), ip_options=b"\x01" * 4, pad=6)
+    pkt = prefilter(buf)
+    assert pkt is not None
+    assert pkt.protocol == "modbus"
+    assert (ip_str(pkt.src), ip_str(pkt.dst), pkt.sport, pkt.dport) == ("10.10.0.2", "10.10.0.10", 40000, 502)
+    assert isinstance(pkt.payload, memoryview)
+    assert bytes(pkt.payload) == MODBUS_WRITE  # padding trimmed
+
+
+def _run_bpf(prog, buf):
+    # Just enough of a classic BPF interpreter for build_port_filter
+    a = x = pc = 0
+    while True:
+        code, jt, jf, k = prog[pc]
+        pc += 1
+        if code == 0x28:
+            a = struct.unpack_from("!H", buf, k)[0]
+        elif code == 0x30:
+            a = buf[k]
+        elif code == 0x48:
+            a = struct.unpack_from("!H", buf, x + k)[0]
+        elif code == 0xB1:
+            x = (buf[k] & 0xF) * 4
+        elif code == 0x15:
+            pc += jt if a == k else jf
+        elif code == 0x45:
+            pc += jt if a & k else jf
+        elif code == 0x06:
+            return k
+        else:
+            raise AssertionError(f"unexpected opcode {code:#x}")
+
+
+def test_port_filter_accepts_untagged_vlan_and_qinq_frames():
+    from ot_collector.capture import build_port_filter
+
+    prog = build_port_filter((502, 20000), snaplen=1500, ethertypes=(0x88B8,))
+    for vlans in ((), ((0x8100, 20),), ((0x88A8, 10), (0x8100, 20))):
+        assert _run_bpf(prog, _packet(40000, 502, MODBUS_WRITE, vlans=vlans, ip_options=b"\x01" * 4)) == 1500
+        assert _run_bpf(prog, _packet(502, 40000, b"", vlans=vlans)) == 1500
+        assert _run_bpf(prog, _packet(51000, 443, b"x", vlans=vlans)) == 0
+        assert _run_bpf(prog, _packet(40000, 502, b"x", vlans=vlans, proto=17)) == 0
+        goose = b"\x01\x0c\xcd\x01\x00\x01" + b"\x00" * 6 + b"".join(struct.pack("!HH", *v) for v in vlans) + b"\x88\xb8" + b"\x00" * 8
+        assert _run_bpf(prog, goose) == 1500
+
+
+def test_prefilter_rejects_non_ot_traffic():
+    assert prefilter(_packet(51000, 443, b"x" * 64)) is None
+    assert prefilter(_packet(40000, 502, MODBUS_WRITE, proto=17)) is None
+    assert prefilter(b"\x00" * 20) is None
+
+
+@pytest.mark.skipif(collector_mod.dpkt is None, reason="dpkt not installed")
+def test_fast_path_matches_dpkt_path():
+    buf = _packet(40000, 502, MODBUS_WRITE, vlans=((0x8100, 20),))
+    fast, slow = _ListProducer(), _ListProducer()
+    OTCollector("test", fast, fast_path=True)._handle_packet(0.0, buf)
+    OTCollector("test", slow, fast_path=False)._handle_packet(0.0, buf)
+    decoded = [{k: v for k, v in f.to_dict().items() if k != "timestamp"} for f in fast.frames() + slow.frames()]
+    assert len(decoded) == 2 and decoded[0] == decoded[1]
+    assert decoded[0]["func_code"] == "6" and decoded[0]["value"] == "1234"
+
+
+def test_shards_partition_flows_in_both_directions():
+    request = _packet(40000, 502, MODBUS_WRITE)
+    reply = _packet(502, 40000, MODBUS_WRITE)
+    counts = []
+    for index in range(4):
+        producer = _ListProducer()
+        collector = OTCollector("test", producer, shard=(index, 4))
+        collector._handle_packet(0.0, request)
+        collector._handle_packet(0.0, reply)
+        counts.append(collector.counters["ot_packets"])
+    # Both directions land on the same single worker
+    assert sorted(counts) == [0, 0, 0, 2]
+    assert flow_shard(prefilter(request), 4) == flow_shard(prefilter(reply), 4)
+
+
+def test_duplicate_packets_from_several_feeds_are_suppressed():
+    from ot_collector.dedup import DuplicateFilter
+
+    producer = _ListProducer()
+    collector = OTCollector("test", producer, dedup_window=0.1)
+    buf = _packet(40000, 502, MODBUS_WRITE)
+    for ts in (1.0, 1.0001, 1.002):  # same packet via three SPAN sessions
+        collector._handle_packet(ts, buf)
+    collector._handle_packet(1.003, _packet(40000, 502, MODBUS_WRITE, seq=1 + len(MODBUS_WRITE)))
+    assert collector.counters["duplicates"] == 2 and len(producer.frames()) == 2
+    collector._handle_packet(1.5, buf)  # outside the window: not a duplicate
+    assert collector.counters["duplicates"] == 2
+
+    dedup = DuplicateFilter(window=10.0, max_entries=100)
+    for key in range(1000):
+        assert not dedup.seen(key, 0.0)
+    assert len(dedup) <= 200 and dedup.seen(999, 0.0)
+
+
+def test_modbus_pairs_transactions_and_marks_responses():
+    from ot_collector.ot_tracking_agent import OTTrackingAgent
+
+    modbus = ModbusDissector()
+    client, server = "10.10.0.2", "10.10.0.10"
+    write = struct.pack("!HHHBBHHB3H", 7, 0, 13, 1, 16, 100, 3, 6, 11, 22, 33)
+    frames = modbus.dissect(write, client, server, 40000, 502, 10.0)
+    assert [(f.func_code, f.addr, f.value) for f in frames] == [("16", 100, "11"), ("16", 101, "22"), ("16", 102, "33")]
+
+    read = struct.pack("!HHHBBHH", 8, 0, 6, 1, 3, 200, 2)
+    modbus.dissect(read, client, server, 40000, 502, 10.0)
+    ack = struct.pack("!HHHBBHH", 7, 0, 6, 1, 16, 100, 3)
+    [frame] = modbus.dissect(ack, server, client, 502, 40000, 10.004)
+    assert (frame.src_ip, frame.dst_ip, frame.func_code) == (client, server, "16/rsp")
+    assert not is_write("modbus", frame.func_code)
+    assert frame.latency_ms == pytest.approx(4.0)
+    reply = struct.pack("!HHHBBB2H", 8, 0, 7, 1, 3, 4, 500, 501)
+    [frame] = modbus.dissect(reply, server, client, 502, 40000, 10.02)
+    assert (frame.func_code, frame.addr, frame.value) == ("3/rsp", 200, None)
+    assert frame.latency_ms == pytest.approx(20.0)
+
+    modbus.dissect(struct.pack("!HHHBBHH", 9, 0, 6, 1, 6, 5, 1), client, server, 40000, 502, 11.0)
+    [exc] = modbus.dissect(struct.pack("!HHHBBB", 9, 0, 3, 1, 0x86, 2), server, client, 502, 40000, 11.001)
+    assert (exc.func_code, exc.addr, exc.value) == ("134/rsp", 5, "2")
+    assert len(modbus) == 0 and modbus.counters["exceptions"] == 1
+    assert json.loads(exc.to_json())["latency_ms"] == pytest.approx(1.0)
+
+    # Register values only on request
+    values = ModbusDissector(read_values=True)
+    values.dissect(read, client, server, 40000, 502, 10.0)
+    frames = values.dissect(reply, server, client, 502, 40000, 10.02)
+    assert [(f.func_code, f.addr, f.value) for f in frames] == [("3/rsp", 200, "500"), ("3/rsp", 201, "501")]
+
+    # Replies neither count as writes nor shorten the flow's polling period
+    agent = OTTrackingAgent()
+    for i in range(4):
+        t = 20.0 + i
+        for f in modbus.dissect(struct.pack("!HHHBBHH", i, 0, 6, 1, 3, 200, 2), client, server, 40000, 502, t) + \
+                modbus.dissect(struct.pack("!HHHBBB2H", i, 0, 7, 1, 3, 4, 1, 2), server, client, 502, 40000, t + 0.01):
+            agent.asset_manager.ingest(None, f.src_ip, None, f.dst_ip, f.protocol, f.func_code, f.addr, f.timestamp)
+    stats = agent.asset_manager.flow(client, server, "modbus")
+    assert stats.typical_period_seconds() == pytest.approx(1.0)
+    assert stats.has_function_code("3") and not stats.has_function_code("3/rsp")
+    assert not agent.rules[1].applies_to("modbus", "3/rsp")
+
+
+def test_modbus_transaction_table_is_bounded():
+    modbus = ModbusDissector(max_pending=4, timeout=5.0)
+    for tid in range(10):
+        modbus.dissect(struct.pack("!HHHBBHH", tid, 0, 6, 1, 3, 0, 1), "10.0.0.1", "10.0.0.2", 40000, 502, 0.0)
+    assert len(modbus) == 4 and modbus.counters["expired"] == 6
+    modbus.dissect(struct.pack("!HHHBBHH", 99, 0, 6, 1, 3, 0, 1), "10.0.0.1", "10.0.0.2", 40000, 502, 60.0)
+    assert len(modbus) == 1
+
+
+def test_dnp3_decodes_crob_and_multi_segment_response():
+    dnp3 = Dnp3Dissector()
+    master, outstation = "10.0.1.5", "192.168.100.20"
+    crob = struct.pack("<BBBBBHHBBIIB", 0xC1, 5, 12, 1, 0x28, 1, 7, 0x03, 1, 100, 0, 0)
+    [frame] = dnp3.dissect(link_frame(10, 1, b"\xC0" + crob), master, outstation, 40000, 20000, 5.0)
+    assert (frame.src_ip, frame.func_code, frame.addr, frame.value) == (master, "5", 7, "3")
+
+    # Response with 40 g30v1 analog inputs, split over two transport segments
+    objects = struct.pack("<BBBBB", 30, 1, 0x00, 0, 39) + b"".join(struct.pack("<Bi", 1, i * 10) for i in range(40))
+    app = struct.pack("<BBH", 0xC1, 129, 0) + objects
+    first, second = link_frame(1, 10, bytes([0x40 | 3]) + app[:100], from_master=False), link_frame(1, 10, bytes([0x80 | 4]) + app[100:], from_master=False)
+    assert dnp3.dissect(first, outstation, master, 20000, 40000, 5.1) == []
+    [frame] = dnp3.dissect(second, outstation, master, 20000, 40000, 5.2)
+    assert (frame.src_ip, frame.dst_ip, frame.func_code, frame.addr, frame.value) == (master, outstation, "129/rsp", None, None)
+    assert is_response(frame.func_code)
+
+    points = Dnp3Dissector(point_values=True)
+    assert points.dissect(first, outstation, master, 20000, 40000, 5.1) == []
+    frames = points.dissect(second, outstation, master, 20000, 40000, 5.2)
+    assert len(frames) == 40 and (frames[0].src_ip, frames[0].dst_ip) == (master, outstation)
+    assert (frames[-1].func_code, frames[-1].addr, frames[-1].value) == ("129/rsp", 39, "390")
+
+    corrupt = bytearray(link_frame(10, 1, b"\xC0" + crob))
+    corrupt[12] ^= 0xFF
+    assert dnp3.dissect(bytes(corrupt), master, outstation, 40000, 20000, 5.3) == []
+    assert dnp3.counters["crc_errors"] == 1
+
+
+def _apdu(send_seq: int, asdu: bytes) -> bytes:
+    return struct.pack("<BBHH", 0x68, 4 + len(asdu), send_seq << 1, 0) + asdu
+
+
+def test_iec104_decodes_objects_and_tracks_sequences():
+    iec = Iec104Dissector()
+    scada, rtu = "10.1.0.5", "10.2.0.9"
+    # M_ME_NC_1, SQ=1, 3 floats from IOA 1000, spontaneous (COT 3), CA 7
+    measured = struct.pack("<BBBBHHB", 13, 0x83, 3, 0, 7, 1000, 0) + b"".join(struct.pack("<fB", v, 0) for v in (1.5, 2.5, 3.5))
+    [frame] = iec.dissect(_apdu(0, measured), rtu, scada, 2404, 40000, 1.0)
+    assert (frame.src_ip, frame.func_code, frame.addr, frame.value) == (scada, "13/rsp", None, None)
+    frames = Iec104Dissector(object_values=True).dissect(_apdu(0, measured), rtu, scada, 2404, 40000, 1.0)
+    assert [(f.src_ip, f.func_code, f.addr, f.value) for f in frames] == [
+        (scada, "13/rsp", 1000, "1.5"), (scada, "13/rsp", 1001, "2.5"), (scada, "13/rsp", 1002, "3.5")]
+
+    # C_SC_NA_1 activation is a write; its confirmation is not reported again
+    command = struct.pack("<BBBBHHBB", 45, 1, 6, 0, 7, 2000, 0, 1)
+    [write] = iec.dissect(_apdu(0, command), scada, rtu, 40000, 2404, 1.1)
+    assert (write.func_code, write.addr, write.value) == ("45", 2000, "1")
+    assert is_write("iec104", write.func_code)
+    confirm = struct.pack("<BBBBHHBB", 45, 1, 7, 0, 7, 2000, 0, 1)
+    assert iec.dissect(_apdu(2, confirm), rtu, scada, 2404, 40000, 1.2) == []
+    assert iec.counters["sequence_errors"] == 1  # send sequence 1 was skipped
+
+    [u] = iec.dissect(struct.pack("<BBBBBB", 0x68, 4, 0x43, 0, 0, 0), scada, rtu, 40000, 2404, 1.3)
+    assert u.func_code == "TESTFR_ACT"
+    assert iec.dissect(struct.pack("<BBHH", 0x68, 4, 0x01, 6), scada, rtu, 40000, 2404, 1.4) == []
+    assert iec.counters["s_frames"] == 1
+
+
+def test_reassembly_joins_split_and_pipelined_adus():
+    adus = [struct.pack("!HHHBBHH", tid, 0, 6, 1, 3, tid, 1) for tid in range(3)]
+    stream = b"".join(adus)
+    reasm = StreamReassembler()
+    key = flow_key(1, 40000, 2, 502)
+
+    assert reasm.feed(key, "modbus", 99, 0x02, b"", 0.0) == []  # SYN
+    assert reasm.feed(key, "modbus", 100, 0x18, memoryview(stream[:5]), 0.1) == []
+    assert reasm.buffered_bytes == 5
+    out = reasm.feed(key, "modbus", 105, 0x18, memoryview(stream[5:]), 0.2)
+    assert [bytes(f) for f in out] == adus
+    assert reasm.buffered_bytes == 0
+    # Retransmission is ignored; a gap drops the pending partial ADU
+    assert reasm.feed(key, "modbus", 105, 0x18, memoryview(stream[5:]), 0.3) == []
+    reasm.feed(key, "modbus", 100 + len(stream), 0x18, memoryview(adus[0][:4]), 0.4)
+    out = reasm.feed(key, "modbus", 200 + len(stream), 0x18, memoryview(adus[1]), 0.5)
+    assert [bytes(f) for f in out] == [adus[1]]
+    assert reasm.counters["gaps"] == 1 and reasm.buffered_bytes == 0
+    # A SYN on a reused 4-tuple restarts the flow without counting a gap
+    reasm.feed(key, "modbus", 200 + len(stream) + len(adus[1]), 0x18, memoryview(adus[2][:4]), 0.6)
+    assert reasm.buffered_bytes == 4
+    assert reasm.feed(key, "modbus", 5000, 0x02, b"", 0.7) == []
+    assert reasm.buffered_bytes == 0
+    out = reasm.feed(key, "modbus", 5001, 0x18, memoryview(adus[0]), 0.8)
+    assert [bytes(f) for f in out] == [adus[0]] and reasm.counters["gaps"] == 1
+
+
+def test_reassembly_evicts_idle_flows_and_respects_memory_cap():
+    reasm = StreamReassembler(max_total_bytes=10, idle_timeout=5.0)
+    partial = memoryview(b"\x68\x0e\x00\x00")  # first bytes of a 16-byte IEC 104 APDU
+    for i in range(4):
+        reasm.feed(flow_key(1, 1000 + i, 2, 2404), "iec104", 0, 0x18, partial, 0.0)
+    assert reasm.buffered_bytes <= 10
+    assert reasm.counters["evicted_pressure"] >= 1
+    reasm.feed(flow_key(9, 9, 2, 2404), "iec104", 0, 0x18, partial, 10.0)
+    assert len(reasm) == 1 and reasm.counters["evicted_idle"] >= 1
+
+
+def _ber(tag: int, value: bytes) -> bytes:
+    n = len(value)
+    return bytes([tag]) + (bytes([n]) if n < 128 else b"\x82" + struct.pack("!H", n)) + value
+
+
+def _goose(st_num: int, sq_num: int, state: bool) -> bytes:
+    pdu = _ber(0x80, b"IED1LD0/LLN0$GO$trip") + _ber(0x85, struct.pack("!I", st_num)) + _ber(0x86, struct.pack("!I", sq_num))
+    pdu += _ber(0xAB, _ber(0x83, b"\x01" if state else b"\x00") + _ber(0x87, b"\x08" + struct.pack("!f", 49.5)))
+    body = _ber(0x61, pdu)
+    eth = bytes.fromhex("010ccd010001") + bytes.fromhex("001122334455") + struct.pack("!HHH", 0x8100, 0x8000, 0x88B8)
+    return eth + struct.pack("!HHHH", 0x3001, 8 + len(body), 0, 0) + body
+
+
+def _sv(smp_cnt: int) -> bytes:
+    asdu = _ber(0x30, _ber(0x80, b"MU01") + _ber(0x82, struct.pack("!H", smp_cnt)) + _ber(0x85, b"\x01") + _ber(0x87, bytes(64)))
+    body = _ber(0x60, _ber(0x80, b"\x01") + _ber(0xA2, asdu))
+    eth = bytes.fromhex("010ccd040001") + bytes.fromhex("00aabbccddee") + struct.pack("!H", 0x88BA)
+    return eth + struct.pack("!HHHH", 0x4001, 8 + len(body), 0, 0) + body
+
+
+def test_goose_emits_state_changes_and_sv_is_summarised():
+    producer = _ListProducer()
+    collector = OTCollector("test", producer)
+    for sq in range(3):
+        collector._handle_packet(100.0 + sq, _goose(1, sq, False))
+    collector._handle_packet(103.0, _goose(2, 0, True))
+    collector._handle_packet(103.5, _goose(2, 5, True))  # sqNum jump
+    goose = [f.to_dict() for f in producer.frames()]
+    assert [(g["protocol"], g["src_ip"], g["value"]) for g in goose] == [
+        ("goose", "00:11:22:33:44:55", "0,49.5"), ("goose", "00:11:22:33:44:55", "1,49.5")]
+    assert goose[0]["session_id"] == "IED1LD0/LLN0$GO$trip" and goose[0]["addr"] == 0x3001
+    assert collector.goose.counters["sq_errors"] == 1
+
+    producer.messages.clear()
+    for i in range(8000):
+        if i != 100:  # one lost sample
+            collector._handle_packet(200.0 + i / 4000, _sv(i % 4000))
+    collector.flush_summaries()
+    summaries = [f.to_dict() for f in producer.frames()]
+    assert [s["func_code"] for s in summaries] == ["summary", "summary"]
+    assert summaries[0]["value"].startswith("samples=3999;lost=1;reordered=0;unsynced=0")
+    assert sum(int(s["value"].split(";")[0].split("=")[1]) for s in summaries) == 7999
+    assert producer.messages[0][0] == "sv"
+
+
+def test_binary_wire_format_round_trips_and_is_negotiated():
+    from datetime import datetime, timezone
+    when = datetime(2024, 5, 1, 12, 0, 0, 123456, tzinfo=timezone.utc)
+    frames = [
+        OTProtocolFrame("modbus", "10.10.0.2", "10.10.0.10", "3", 40001, "1234", "10.10.0.2->10.10.0.10", when, 1.5),
+        OTProtocolFrame("iec104", "fd00::2", "fd00::10", "STARTDT_ACT", None, None, "fd00::2->fd00::10", when),
+        OTProtocolFrame("goose", "00:11:22:33:44:55", "01:0c:cd:01:00:01", "goose", 0x3001, "1,49.5", "IED1LD0/LLN0$GO$trip", when),
+    ]
+    data = encode_frames(frames)
+    assert decode_frames(data) == frames
+    assert len(data) < sum(len(f.to_json()) for f in frames) / 3
+    # Truncated or corrupt batches only ever raise ValueError
+    for cut in range(1, len(data)):
+        with pytest.raises(ValueError):
+            decode_frames(data[:cut])
+    with pytest.raises(ValueError):
+        decode_frames(bytes((data[0], 0xFF, 0xFF, 0x7F)) + data[2:])
+
+    producer = _ListProducer()
+    OTCollector("test", producer)._handle_packet(0.0, _packet(40000, 502, MODBUS_WRITE))
+    OTCollector("test", producer, wire_format="json")._handle_packet(0.0, _packet(40000, 502, MODBUS_WRITE))
+    (_k, binary, headers), (_k, text, no_headers) = producer.messages
+    assert headers == [("content-type", b"application/vnd.ot-frame.v1")] and no_headers is None
+    assert json.loads(text)["value"] == "1234"
+    assert decode_frame_message(binary, headers) == decode_frame_message(text, no_headers)
+
+
+def test_trusted_frames_match_validated_frames():
+    from datetime import datetime, timezone
+    when = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    args = ("modbus", "10.10.0.2", "10.10.0.10", "6", 100, "1234", "10.10.0.2->10.10.0.10", when, 0.5)
+    trusted = OTProtocolFrame.trusted(*args)
+    assert trusted == OTProtocolFrame(*args) and hash(trusted) == hash(OTProtocolFrame(*args))
+    assert trusted.to_dict() == OTProtocolFrame(*args).to_dict()
+    session = "".join(["10.10.0.2->", "10.10.0.10"])
+    assert OTProtocolFrame.trusted(*args[:6], session, when).session_id is trusted.session_id
+    with pytest.raises(ValueError):
+        OTProtocolFrame("modbus", "not-an-ip", "10.10.0.10", "6", None, None, "s", when)
+
+
+def test_summarizer_absorbs_polling_and_forwards_writes_new_shapes_and_timing():
+    from datetime import datetime, timezone
+    from ot_collector.ot_tracking_agent import OTTrackingAgent
+    from ot_collector.summarizer import FlowSummarizer
+    from schemas import OTFlowSummary
+
+    def poll(ts, fc="3"):
+        when = datetime.fromtimestamp(ts, timezone.utc)
+        return [OTProtocolFrame.trusted("modbus", "10.10.0.2", "10.10.0.10", fc, 100 + i, str(i), "10.10.0.2->10.10.0.10", when, 2.0)
+                for i in range(10)]
+
+    summarizer = FlowSummarizer(interval=10.0)
+    forwarded, summaries = [], []
+    for i in range(100):
+        ts = 1000.0 + i * 0.5
+        out, closed = summarizer.observe(poll(ts), ts)
+        forwarded += out
+        summaries += closed
+    assert len(forwarded) == 10  # only the first sighting of the shape
+    out, closed = summarizer.observe(poll(1050.0, fc="16"), 1050.0)
+    assert len(out) == 10 and summarizer.counters["forwarded_writes"] == 1
+    summaries += closed
+    out, closed = summarizer.observe(poll(1052.0), 1052.0)  # 2.5 s after a 0.5 s cadence
+    assert len(out) == 10 and summarizer.counters["forwarded_timing"] == 1
+    summaries += closed
+    summaries += summarizer.flush(1052.0, force=True)
+    assert sum(s.count for s in summaries) == 99 and sum(s.frames for s in summaries) == 990
+    first = summaries[0]
+    assert (first.func_code, first.addr_start, first.addr_end) == ("3", 100, 109)
+    assert first.interval_mean_ms == pytest.approx(500.0) and first.latency_mean_ms == pytest.approx(2.0)
+    assert len(summaries[0].to_json()) * len(summaries) < sum(len(f.to_json()) for f in poll(0)) * 100 / 20
+
+    agent = OTTrackingAgent()
+    agent.ingest_summary(OTFlowSummary.from_json(first.to_json()))
+    stats = agent.asset_manager.flow("10.10.0.2", "10.10.0.10", "modbus")
+    assert stats.typical_period_seconds() == pytest.approx(0.5) and set(stats.addresses) == set(range(100, 110))
+
+
+class _FlakyProducer(_ListProducer):
+    def __init__(self):
+        super().__init__()
+        self.up = True
+
+    def produce(self, key, value, headers=None):
+        if not self.up:
+            raise BufferError("Local: Queue full")
+        super().produce(key, value, headers)
+
+
+def test_buffering_producer_spills_to_disk_and_replays_in_order(tmp_path):
+    from ot_collector.safety_controls import BufferingProducer
+    from ot_collector.spill import SpillQueue
+
+    inner = _FlakyProducer()
+    producer = BufferingProducer(inner, max_buffer=10, spill_dir=str(tmp_path / "spill"),
+                                 spill_segment_bytes=4096, spill_max_bytes=1 << 20, replay_rate=100.0)
+    producer.produce("modbus", b"0")
+    inner.up = False
+    for i in range(1, 500):
+        producer.produce("modbus", b"%d" % i)
+    assert len(producer.buffer) == 10 and len(producer.spill) == 489
+    inner.up = True
+    producer.produce("modbus", b"500")
+    assert 0 < producer.counters["replayed"] <= 100  # rate-limited
+    producer.spill.close()
+
+    # Restart: committed position survives, the rest is replayed in order
+    producer = BufferingProducer(inner, spill_dir=str(tmp_path / "spill"), spill_segment_bytes=4096,
+                                 spill_max_bytes=1 << 20, replay_rate=1e9)
+    pending = len(producer.spill)
+    assert pending > 0
+    producer.flush()
+    assert len(producer.spill) == 0
+    values = [int(v) for _k, v, _h in inner.messages]
+    assert values[len(values) - pending:] == sorted(values[len(values) - pending:])
+    assert sorted(set(values)) == list(range(501))
+
+    # Failed deliveries go back in front of held data; close drains everything it can
+    inner = _FlakyProducer()
+    inner.on_failed = None
+    producer = BufferingProducer(inner, max_buffer=100, replay_rate=1.0)
+    inner.up = False
+    for i in range(3, 6):
+        producer.produce("modbus", b"%d" % i)
+    for i in range(3):
+        inner.on_failed("modbus", b"%d" % i, None)
+    inner.up = True
+    inner.messages.clear()
+    producer.close(timeout=1.0)
+    assert [v for _k, v, _h in inner.messages] == [b"0", b"1", b"2", b"3", b"4", b"5"]
+    assert producer.counters["requeued"] == 3 and producer.backlog() == 0
+
+    inner = _FlakyProducer()
+    producer = BufferingProducer(inner, max_buffer=100)
+    inner.up = False
+    producer.produce("modbus", b"lost")
+    producer.close(timeout=0.2)
+    assert producer.counters["dropped"] == 1 and inner.closed
+
+    queue = SpillQueue(str(tmp_path / "bounded"), segment_bytes=4096, max_bytes=3 * 4096)
+    for i in range(1000):
+        queue.append(b"k", b"x" * 100 + b"%04d" % i, [("content-type", b"application/json")])
+    assert queue.counters["dropped"] > 0 and len(queue) == 1000 - queue.counters["dropped"]
+    assert len(list((tmp_path / "bounded").glob("*.seg"))) <= 3
+    key, value, headers = queue.read(1)[0]
+    assert key == b"k" and int(value[100:]) == queue.counters["dropped"] and headers == [("content-type", b"application/json")]
+
+
+def test_flow_stats_streaming_period_tracks_median_interval():
+    import random
+    from datetime import datetime, timedelta, timezone
+    from ot_collector.asset_manager import FlowStats
+
+    rng = random.Random(5)
+    stats = FlowStats()
+    ts = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    deltas = []
+    for i in range(3000):
+        delta = rng.choice((0.5, 0.5, 0.5, 4.0)) + rng.uniform(-0.01, 0.01)  # polling plus occasional gaps
+        deltas.append(delta)
+        ts += timedelta(seconds=delta)
+        stats.record("3", i % 10, ts)
+        if i == 2:
+            exact = sorted(deltas[:2])
+            assert stats.typical_period_seconds() == pytest.approx(exact[1], abs=1e-5)  # exact (upper median) while small
+    deltas.sort()
+    assert stats.typical_period_seconds() == pytest.approx(deltas[len(deltas) // 2], abs=0.02)
+    assert stats.last_seen == ts and stats.observations == 3000
+    assert not hasattr(stats, "timestamps")
+
+    # The median follows a change of polling rate instead of averaging all history
+    stats = FlowStats()
+    for i in range(6000):
+        ts += timedelta(seconds=1.0 if i < 5000 else 0.1)
+        stats.record("3", 0, ts)
+    assert stats.typical_period_seconds() == pytest.approx(0.1, abs=1e-5)
+
+
+def test_asset_manager_keeps_flows_in_compact_form():
+    from datetime import datetime, timezone
+    from ot_collector.asset_manager import AddressRanges, AssetManager
+
+    when = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    am = AssetManager()
+    for addr in list(range(0, 5000)) + list(range(10000, 10010)) + [70000]:
+        am.ingest(None, "10.10.0.2", None, "10.10.0.10", "modbus", "3" if addr % 2 else "16", addr, when)
+    am.ingest(None, "10.10.0.2", None, "10.10.0.10", "iec104", "STARTDT_act", None, when)
+    am.ingest("00:1a:2b:3c:4d:5e", None, "01:0c:cd:01:00:01", None, "goose", "stNum", None, when)
+    am.ingest(None, "fd00::1", None, "fd00::2", "modbus", "3", 1, when)  # IPv6 falls back to a tuple key
+
+    stats = am.flow("10.10.0.2", "10.10.0.10", "modbus")
+    assert stats.addresses.ranges() == [(0, 4999), (10000, 10009), (70000, 70000)] and len(stats.addresses) == 5011
+    assert stats.function_codes == {"3", "16"} and stats.has_function_code("16") and not stats.has_function_code("6")
+    assert am.flow("10.10.0.2", "10.10.0.10", "iec104").function_codes == {"STARTDT_act"}
+    assert sorted((src, dst, p) for src, dst, p, _ in am.iter_flows()) == [
+        ("00:1a:2b:3c:4d:5e", "01:0c:cd:01:00:01", "goose"), ("10.10.0.2", "10.10.0.10", "iec104"),
+        ("10.10.0.2", "10.10.0.10", "modbus"), ("fd00::1", "fd00::2", "modbus")]
+    assert sum(isinstance(k, int) for k in am.flows) == 3
+
+    rows = {row[:3]: row for row in am.export_baseline_rows()}
+    assert rows[("10.10.0.2", "10.10.0.10", "modbus")][4][-2:] == [10009, 70000]
+    report = am.memory_report()
+    assert report["flows"] == 4 and report["assets"] == 6 and len(report["largest_flows"]) == 4
+    assert report["bytes_per_flow"] < 2048  # a set of 5011 ints alone is ~200 KB
+
+    ranges = AddressRanges([5, 7, 6, 1, 3])
+    ranges.add_range(2, 2)
+    ranges.add_range(10, 12)
+    assert ranges.ranges() == [(1, 3), (5, 7), (10, 12)] and 11 in ranges and 4 not in ranges and 9 not in ranges
+    ranges.add_range(0, 20)
+    assert ranges.ranges() == [(0, 20)]
+
+
+def test_baseline_writer_exports_only_changes_as_versioned_batches():
+    from datetime import datetime, timedelta, timezone
+    from email_recording.db import FakeDB
+    from ot_collector.asset_manager import AssetManager
+    from ot_collector.baseline_store import INSERT_LEARNED_SQL, UPSERT_ASSET_SQL, BaselineWriter
+
+    class _DB(FakeDB):
+        fail = False
+
+        def execute_many(self, statements):
+            if self.fail:
+                raise ConnectionError("db down")
+            super().execute_many(statements)
+
+    when = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    am = AssetManager()
+    for i in range(20):
+        am.ingest(None, f"10.10.0.{i}", None, "10.10.0.200", "modbus", "3", i, when)
+    am.ingest("00:1a:2b:3c:4d:5e", None, "01:0c:cd:01:00:01", None, "goose", "stNum", None, when)
+    db = _DB()
+    db.when("max(version)", 7)
+    writer = BaselineWriter(db, am, batch_size=8)
+    assert writer.flush() == (23, 20) and writer.counters["skipped_l2"] == 1
+    flows = [p for sql, p in db.executed if sql == INSERT_LEARNED_SQL]
+    assert len(flows) == 20 and {p[0] for p in flows} == {8}
+    assert flows[0][1:] == ("10.10.0.0", "10.10.0.200", "modbus", ["3"], '[{"start": 0, "end": 0}]', None)
+
+    # Unchanged polling only refreshes the assets involved
+    db.executed.clear()
+    am.ingest(None, "10.10.0.1", None, "10.10.0.200", "modbus", "3", 1, when + timedelta(seconds=1))
+    assert writer.flush() == (2, 0) and all(sql == UPSERT_ASSET_SQL for sql, _ in db.executed)
+    assert writer.flush() == (0, 0)
+
+    # A new register is a new baseline version; a failed write is retried
+    db.executed.clear()
+    db.fail = True
+    am.ingest(None, "10.10.0.1", None, "10.10.0.200", "modbus", "3", 2, when + timedelta(seconds=2))
+    assert writer.flush() == (0, 0) and writer.counters["errors"] == 1
+    db.fail = False
+    assert writer.flush() == (2, 1)
+    (flow,) = [p for sql, p in db.executed if sql == INSERT_LEARNED_SQL]
+    assert flow[0] == 9 and flow[5] == '[{"start": 1, "end": 2}]' and writer.version == 9
+
+    # Learned versions only reach the enforced baseline through approval
+    from ot_collector.baseline_store import APPROVE_LEARNED_SQL, approve_learned_baseline
+
+    assert all("baseline_allowed" not in sql for sql, _ in db.executed)
+    db.executed.clear()
+    db.handlers.clear()
+    db.when("FROM baseline_allowed", 2)
+    assert approve_learned_baseline(db, learned_version=8) == 3
+    assert db.executed == [(APPROVE_LEARNED_SQL, (3, 8))]
+
+
+def test_compiled_baseline_loads_latest_version_in_pages_and_swaps():
+    import ipaddress
+    from datetime import datetime, timezone
+    from email_recording.db import FakeDB
+    from ot_collector.baseline_store import BaselineReloader, load_latest_baseline
+    from ot_collector.ot_tracking_agent import OTTrackingAgent
+
+    table = [  # (src, dst, protocol, function_codes, address_ranges, period, version)
+        ("10.10.0.2", "10.10.0.10", "modbus", ["3"], [{"start": 0, "end": 9}], 1.0, 1),
+        ("10.10.0.2", "10.10.0.10", "modbus", ["3", "16"], '[{"start": 0, "end": 9}, {"start": 100, "end": 100}]', 1.0, 2),
+        ("10.10.0.3", "10.10.0.10", "dnp3", ["1"], None, None, 1),
+    ] + [(f"10.20.0.{i}", "10.10.0.10", "modbus", ["4"], [], 2.0, 1) for i in range(5)]
+
+    class _DB(FakeDB):
+        def query_rows(self, sql, params=None):
+            *last, limit = params
+            order = lambda r: (ipaddress.ip_address(r[0]), ipaddress.ip_address(r[1]), r[2])
+            after = order(tuple(last))
+            latest = {}
+            for row in sorted(table, key=lambda r: (order(r), -r[6])):
+                if order(row) > after:
+                    latest.setdefault(order(row), row)
+            return list(latest.values())[:limit]
+
+        def query_value(self, sql, params=None):
+            return max(r[6] for r in table)
+
+    db = _DB()
+    baseline = load_latest_baseline(db, page_size=3)
+    assert len(baseline) == 7 and baseline.version == 2
+    flow = baseline.lookup("10.10.0.2", "10.10.0.10", "modbus")
+    assert flow.allows_function("16") and not flow.allows_function("6") and not flow.allows_function("nope")
+    assert flow.allows_address(100) and flow.allows_address(9) and not flow.allows_address(50)
+    assert baseline.lookup("10.10.0.10", "10.10.0.2", "modbus") is None
+
+    agent = OTTrackingAgent()
+    agent.load_baseline([("10.10.0.2", "10.10.0.10", "modbus", ["3"])])
+    when = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    write = OTProtocolFrame(protocol="modbus", src_ip="10.10.0.2", dst_ip="10.10.0.10", func_code="16", addr=100,
+                            value="1", session_id="s", timestamp=when)
+    assert any(a.rule == "UnknownFunctionCodeRule" for a in agent.ingest_frame(write))
+    reloader = BaselineReloader(db, agent)
+    assert reloader.reload() and agent.baseline.version == 2 and not reloader.reload()
+    assert not any(a.rule == "UnknownFunctionCodeRule" for a in agent.ingest_frame(write))
+
+
+def test_agent_dispatches_rules_by_protocol_and_times_them():
+    from datetime import datetime, timezone
+    from ot_collector.metrics import agent_metrics
+    from ot_collector.ot_tracking_agent import Alert, OTTrackingAgent, Rule
+
+    class Iec104Only(Rule):
+        name = "Iec104Only"
+        protocols = frozenset({"iec104"})
+
+        def evaluate(self, frame, agent):
+            return Alert("low", self.name, "seen", {})
+
+    agent = OTTrackingAgent()
+    agent.add_rule(Iec104Only())
+    when = datetime(2024, 5, 1, tzinfo=timezone.utc)
+
+    def frame(protocol, func_code, src="10.10.0.2", dst="10.10.0.10"):
+        return OTProtocolFrame(protocol=protocol, src_ip=src, dst_ip=dst, func_code=func_code, addr=None,
+                               value=None, session_id="s", timestamp=when)
+
+    agent.ingest_frame(frame("modbus", "3"))
+    agent.ingest_frame(frame("modbus", "16"))
+    agent.ingest_frame(frame("goose", "stNum", "00:1a:2b:3c:4d:5e", "01:0c:cd:01:00:01"))
+    assert [a.rule for a in agent.ingest_frame(frame("iec104", "100"))] == ["Iec104Only"]
+    calls = {name: s.calls for name, s in agent.rule_stats.items()}
+    assert calls == {"NewMasterRule": 2, "UnknownFunctionCodeRule": 4, "OffScheduleWriteRule": 1,
+                     "OutOfRangeValueRule": 4, "UnauthorizedZonalFlowRule": 4, "Iec104Only": 1}
+    assert agent.rule_stats["NewMasterRule"].hits == 1 and agent.rule_stats["Iec104Only"].latency.count == 1
+    assert [r.name for r, _ in agent._rules_for("goose", "stNum")] == [
+        "UnknownFunctionCodeRule", "OutOfRangeValueRule", "UnauthorizedZonalFlowRule"]
+
+    text = agent_metrics(agent).render()
+    assert 'ot_agent_rule_evaluations_total{rule="OffScheduleWriteRule"} 1' in text
+    assert 'ot_agent_rule_seconds_count{rule="UnknownFunctionCodeRule"} 4' in text
+
+    # A write long after steady 1 s polling is off schedule; one in step with it is not
+    from datetime import timedelta
+
+    hmi, plc = "10.10.0.7", "10.10.0.11"
+    for i in range(20):
+        agent.ingest_frame(OTProtocolFrame("modbus", hmi, plc, "3", 0, None, "s", when + timedelta(seconds=i)))
+    on_time = OTProtocolFrame("modbus", hmi, plc, "6", 0, "1", "s", when + timedelta(seconds=20))
+    assert not [a for a in agent.ingest_frame(on_time) if a.rule == "OffScheduleWriteRule"]
+    late = OTProtocolFrame("modbus", hmi, plc, "6", 0, "1", "s", when + timedelta(seconds=620))
+    [alert] = [a for a in agent.ingest_frame(late) if a.rule == "OffScheduleWriteRule"]
+    assert alert.details["delta_s"] == pytest.approx(600.0) and alert.details["period_s"] == pytest.approx(1.0)
+
+
+def test_zone_lookup_prefers_most_specific_cidr():
+    from ot_collector.ot_tracking_agent import OTTrackingAgent
+    from ot_collector.zones import ZoneTable
+
+    agent = OTTrackingAgent()
+    agent.load_zones({"zones": [
+        {"name": "IT", "cidrs": ["10.0.0.0/8", "172.16.0.0/12", "2001:db8::/32"]},
+        {"name": "OT", "cidrs": ["10.10.0.0/16", "2001:db8:10::/48"]},
+        {"name": "CELL", "cidrs": ["10.10.5.0/24"]},
+    ]}, [{"src_zone": "IT", "dst_zone": "OT"}])
+    assert agent.zone_of("10.1.2.3") == "IT"
+    assert agent.zone_of("10.10.0.7") == "OT"  # not shadowed by 10.0.0.0/8
+    assert agent.zone_of("10.10.5.200") == "CELL" and agent.zone_of("10.10.6.1") == "OT"
+    assert agent.zone_of("10.255.255.255") == "IT" and agent.zone_of("11.0.0.0") is None
+    assert agent.zone_of("2001:db8:10::1") == "OT" and agent.zone_of("2001:db8:11::1") == "IT"
+    assert agent.zone_of("00:11:22:33:44:55") is None and agent.zone_of("192.168.1.1") is None
+
+    table = ZoneTable({"A": ["0.0.0.0/0", "192.168.0.0/16"], "B": ["192.168.0.0/16", "192.168.1.1/32"]})
+    assert table.lookup("192.168.0.1") == "A" and table.lookup("192.168.1.1") == "B" and table.lookup("8.8.8.8") == "A"
+
+
+def test_metrics_endpoint_exports_collector_counters_and_latency():
+    import urllib.request
+    from ot_collector.metrics import MetricsServer, collector_metrics
+
+    collector = OTCollector("test", _ListProducer())
+    collector._handle_packet(0.0, _packet(40000, 502, MODBUS_WRITE))
+    collector._handle_packet(0.0, _packet(51000, 443, b"x" * 64))
+    server = MetricsServer(collector_metrics(collector), port=0).start()
+    try:
+        body = urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=5).read().decode()
+    finally:
+        server.stop()
+    assert 'ot_collector_packets_total{result="filtered"} 1' in body
+    assert 'ot_collector_protocol_frames_total{protocol="modbus"} 1' in body
+    assert 'ot_collector_dissect_seconds_count{protocol="modbus"} 1' in body
+    assert 'ot_collector_dissect_seconds_bucket{le="+Inf",protocol="modbus"} 1' in body
+    assert 'ot_collector_frames_total{outcome="emitted"} 1' in body
+
+
+def _write_pcap(path, packets):
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        for ts, buf in packets:
+            f.write(struct.pack("<IIII", int(ts), round(ts % 1 * 1e6), len(buf), len(buf)) + buf)
+
+
+def _write_pcapng(path, packets):
+    def block(btype, body):
+        body += b"\x00" * (-len(body) % 4)
+        return struct.pack("<II", btype, len(body) + 12) + body + struct.pack("<I", len(body) + 12)
+
+    out = block(0x0A0D0D0A, struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1))
+    out += block(1, struct.pack("<HHI", 1, 0, 65535) + struct.pack("<HHB3x", 9, 1, 9) + struct.pack("<HH", 0, 0))  # ns resolution
+    for ts, buf in packets:
+        ticks = round(ts * 1e9)
+        out += block(6, struct.pack("<IIIII", 0, ticks >> 32, ticks & 0xFFFFFFFF, len(buf), len(buf)) + buf)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def test_offline_ingestion_uses_capture_timestamps(tmp_path):
+    import functools
+    import gzip
+    from datetime import datetime, timezone
+    from ot_collector.offline import find_captures, ingest_many
+    from ot_collector.pcapfile import CaptureFile
+
+    packets = [(1700000000.25 + i, _packet(40000, 502, MODBUS_WRITE, seq=1 + i * len(MODBUS_WRITE))) for i in range(3)]
+    _write_pcap(tmp_path / "a.pcap", packets)
+    _write_pcapng(tmp_path / "b.pcapng", packets)
+    with open(tmp_path / "a.pcap", "rb") as f, gzip.open(tmp_path / "c.pcap.gz", "wb") as gz:
+        gz.write(f.read())
+    (tmp_path / "notes.txt").write_text("not a capture")
+
+    for name in ("a.pcap", "b.pcapng", "c.pcap.gz"):
+        with CaptureFile(str(tmp_path / name)) as cap:
+            read = [(ts, bytes(buf)) for ts, buf in cap.packets()]
+        assert [buf for _ts, buf in read] == [buf for _ts, buf in packets]
+        assert [ts for ts, _buf in read] == pytest.approx([ts for ts, _buf in packets], abs=1e-6)
+
+    producer = _ListProducer()
+    OTCollector("test", producer).run_pcap(str(tmp_path / "b.pcapng"))
+    stamps = [f.timestamp for f in producer.frames()]
+    assert len(stamps) == 3 and stamps[0] == datetime.fromtimestamp(1700000000.25, timezone.utc)
+
+    paths = find_captures(str(tmp_path))
+    assert len(paths) == 3
+    reports = list(ingest_many(paths, functools.partial(_ListProducer), workers=2))
+    assert sorted(r["path"] for r in reports) == paths
+    assert all(r["packets"] == 3 and r["frames_emitted"] == 3 and r["pkts_per_s"] > 0 for r in reports)
+
+    # The producer is closed even when a capture cannot be read
+    producers = []
+
+    def factory():
+        producers.append(_ListProducer())
+        return producers[-1]
+
+    (tmp_path / "bad.pcap").write_bytes(b"garbage")
+    [report] = ingest_many([str(tmp_path / "bad.pcap")], factory, workers=1)
+    assert "error" in report and producers[0].closed
+
+
+def test_collector_pool_spills_per_worker_and_exports_worker_metrics(tmp_path):
+    import re
+    from ot_collector.metrics import pool_metrics
+    from ot_collector.workers import CollectorPool
+
+    packets = [(1.0 + i, _packet(40000 + i, 502, MODBUS_WRITE)) for i in range(8)]
+    _write_pcap(tmp_path / "a.pcap", packets)
+    pool = CollectorPool(2, "test", _ListProducer, pcap_path=str(tmp_path / "a.pcap"), report_interval=0.1,
+                         spill_dir=str(tmp_path / "spill"))
+    totals = pool.run()
+    assert totals["packets"] == 16 and totals["ot_packets"] == 8
+    assert sorted(os.listdir(tmp_path / "spill")) == ["worker-0", "worker-1"]
+
+    # Same families as a single collector, one series per worker
+    text = pool_metrics(pool).render()
+    assert text.count("# TYPE ot_collector_protocol_packets_total counter") == 1
+    modbus = re.findall(r'^ot_collector_protocol_packets_total\{protocol="modbus",worker="(\d)"\} (\d+)$', text, re.M)
+    assert sorted(w for w, _n in modbus) == ["0", "1"] and sum(int(n) for _w, n in modbus) == 8
+    assert 'ot_collector_dissect_seconds_count{protocol="modbus",worker="0"}' in text
+
+
+def test_producer_batches_keeps_key_order_and_accounts_deliveries():
+    broker = LocalBroker(partitions=4)
+    client = LocalProducerClient(broker, {"linger.ms": 10_000, "batch.size": 1000, "queue.buffering.max.messages": 200})
+    producer = KafkaProducer("local", "ot.frames", client=client, poll_interval=0.01)
+    for i in range(100):
+        producer.produce(key=("modbus", "dnp3")[i % 2], value=b"%03d" % i + b"x" * 97)
+    producer.flush()
+    assert producer.counters["delivered"] == 100 and producer.in_flight == 0
+    by_key = {}
+    for msg in broker.messages("ot.frames"):
+        by_key.setdefault(msg.key(), []).append(int(msg.value()[:3]))
+    assert by_key[b"modbus"] == list(range(0, 100, 2))
+    assert by_key[b"dnp3"] == list(range(1, 100, 2))
+    assert max(broker.batches) == 10  # batch.size reached before the long linger
+
+    broker.available = False
+    producer.produce(key="modbus", value=b"lost")
+    producer.flush()
+    assert producer.counters["failed"] == 1 and producer.in_flight == 0
+
+    full = KafkaProducer("local", "ot.frames", client=LocalProducerClient(broker, {"linger.ms": 10_000, "queue.buffering.max.messages": 2}))
+    full.produce(key="modbus", value=b"a")
+    full.produce(key="modbus", value=b"b")
+    with pytest.raises(BufferError):
+        full.produce(key="modbus", value=b"c")
+    assert full.counters["queue_full"] == 1
+    producer.close()
+    full.close()
+
+
+def _can_capture():
+    if not hasattr(socket, "AF_PACKET"):
+        return False
+    try:
+        socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0).close()
+        return True
+    except OSError:
+        return False
+
+
+def test_live_capture_ring_size_is_configurable(monkeypatch):
+    rings = []
+
+    class _Ring:
+        def __init__(self, interface, **kwargs):
+            self.block_count, self.block_size = kwargs["block_count"], 1 << 22
+            rings.append(self)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def packets(self, stop):
+            return iter(())
+
+        def stats(self):
+            return {}
+
+    monkeypatch.setattr(collector_mod, "TPacketV3Ring", _Ring)
+    OTCollector("eth0", _ListProducer()).run_live()
+    OTCollector("eth0", _ListProducer(), ring_bytes=(256 << 20) // 8).run_live()
+    OTCollector("eth0", _ListProducer(), ring_bytes=1 << 20).run_live()
+    assert [r.block_count for r in rings] == [64, 8, 2]
+
+
+@pytest.mark.skipif(not _can_capture(), reason="needs Linux AF_PACKET and CAP_NET_RAW")
+def test_tpacket_v3_ring_captures_filtered_loopback_traffic():
+    import time
+    from ot_collector.capture import TPacketV3Ring
+
+    ring = TPacketV3Ring("lo", block_size=1 << 16, block_count=4, retire_tov_ms=10, bpf_ports=(20000,), stats_interval=0)
+    with ring, socket.socket() as srv, socket.socket() as other:
+        try:
+            srv.bind(("127.0.0.1", 20000))
+        except OSError:
+            pytest.skip("port 20000 in use")
+        other.bind(("127.0.0.1", 0))
+        srv.listen()
+        other.listen()
+        with socket.create_connection(srv.getsockname()) as c1, socket.create_connection(other.getsockname()) as c2:
+            c1.sendall(b"\x05\x64dnp3")
+            c2.sendall(b"filtered")
+            with socket.socket(socket.AF_PACKET, socket.SOCK_RAW) as tx:
+                tx.bind(("lo", 0))
+                tx.send(_goose(1, 0, True))
+            deadline = time.monotonic() + 0.5
+            seen = [bytes(buf) for _ts, buf in ring.packets(stop=lambda: time.monotonic() > deadline, timeout_ms=20)]
+    assert seen, "no packets captured"
+    assert all(prefilter(buf, {20000: "dnp3"}) is not None for buf in seen)
+    assert any(buf.endswith(b"\x05\x64dnp3") for buf in seen)
+    assert any(prefilter(buf).protocol == "goose" for buf in seen)
+    assert ring.stats()["drops"] == 0
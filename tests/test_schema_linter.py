@@ -0,0 +1,106 @@
+import json
+
+from email_recording import schema_linter
+from email_recording.db import FakeDB
+
+
+class _Cursor:
+    """psycopg-style cursor answering from a FakeDB's handlers."""
+
+    def __init__(self, db: FakeDB):
+        self.db = db
+        self.sql = ""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self.sql = sql
+        self.db.execute(sql, params)
+
+    def fetchall(self):
+        return self.db.query_rows(self.sql)
+
+    def fetchone(self):
+        return self.db.query_row(self.sql)
+
+
+class _Conn:
+    def __init__(self, db: FakeDB):
+        self.db = db
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def cursor(self):
+        return _Cursor(self.db)
+
+
+class _Psycopg:
+    def __init__(self, dbs):
+        self.dbs = dbs
+
+    def connect(self, dsn):
+        db = self.dbs[dsn]
+        if isinstance(db, Exception):
+            raise db
+        return _Conn(db)
+
+
+def _db(fingerprint, columns):
+    db = FakeDB()
+    db.when("md5(", (fingerprint,))
+    db.when("information_schema.columns", [("public", "users", c) for c in columns])
+    return db
+
+
+def _schema_queries(db):
+    return sum("information_schema.columns" in sql for sql, _ in db.executed)
+
+
+def test_disallowed_regex_reports_most_specific_pattern():
+    assert schema_linter.DISALLOWED_RE.search("user_password_hash").group(0) == "password"
+    assert schema_linter.DISALLOWED_RE.search("oauth_access_token").group(0) == "access_token"
+    assert schema_linter.DISALLOWED_RE.search("email_normalized_hash") is None
+    violations = schema_linter.check_columns([("public.t", "ssn_last4"), ("public.t", "id")], {})
+    assert violations == ["Disallowed PII column detected: public.t.ssn_last4 matches pattern 'ssn'"]
+
+
+def test_lint_many_uses_cache_relints_on_change_and_survives_failures(tmp_path, monkeypatch, capsys):
+    cache_path = str(tmp_path / "cache.json")
+    a, b = _db("f1", ["id", "phone_number"]), _db("f2", ["id"])
+    dbs = {"postgresql://a": a, "postgresql://b": b, "postgresql://down": ConnectionError("refused")}
+    monkeypatch.setattr(schema_linter, "psycopg", _Psycopg(dbs))
+    monkeypatch.delenv("ALLOWLIST_JSON", raising=False)
+
+    # One unreachable database does not stop the others; it is reported as an error
+    assert schema_linter.lint_many(list(dbs), cache_path=cache_path, workers=3) == 2
+    report = json.loads(capsys.readouterr().out)
+    by_id = {d["database"]: d for d in report["databases"]}
+    assert by_id[schema_linter._dsn_id("postgresql://down")]["error"] == "refused"
+    assert by_id[schema_linter._dsn_id("postgresql://a")]["violation_count"] == 1
+    assert len(report["violations"]) == 1 and "phone_number" in report["violations"][0]
+    assert _schema_queries(a) == 1 and _schema_queries(b) == 1
+    assert "postgresql://" not in open(cache_path).read()  # cache keyed by digest, no credentials
+
+    # Unchanged fingerprints: schemas are not fetched again, cached violations still reported
+    del dbs["postgresql://down"]
+    assert schema_linter.lint_many(list(dbs), cache_path=cache_path) == 1
+    report = json.loads(capsys.readouterr().out)
+    assert all(d["skipped"] for d in report["databases"]) and len(report["violations"]) == 1
+    assert _schema_queries(a) == 1 and _schema_queries(b) == 1
+
+    # A DDL change (new fingerprint) re-lints only that database
+    a.when("md5(", ("f1-altered",))
+    a.when("information_schema.columns", [("public", "users", "id")])
+    assert schema_linter.lint_many(list(dbs), cache_path=cache_path) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert {d["database"]: d["skipped"] for d in report["databases"]} == {
+        schema_linter._dsn_id("postgresql://a"): False, schema_linter._dsn_id("postgresql://b"): True}
+    assert _schema_queries(a) == 2 and _schema_queries(b) == 1 and report["violations"] == []